@@ -6,7 +6,10 @@ import streamlit as st
 # 各UIコンポーネント（部品）を定義したファイルから、それぞれの表示用関数をインポートします。
 from components.home import show_home
 from components.search_result import show_search_results
-from components.common import show_search_bar
+from components.common import show_search_bar, show_metrics_panel
+from config import METRICS_ADMIN_PANEL  # 管理者用の計測結果パネルを表示するかどうか
+from utils.metrics import timer, maybe_dump  # 処理時間の計測
+from utils.api_client import get_suggestion_index  # キーワードの候補の索引
 
 # --- ページ全体の初期設定 ---
 # st.set_page_configは、アプリの基本的な見た目や挙動を設定する関数です。
@@ -67,6 +70,8 @@ def main():
     """
     # 最初に、カスタマイズしたCSSファイルを読み込みます。
     load_css("styles/main.css")
+    # キーワードの候補の索引を用意します。初回だけ裏側のスレッドで保存済みのファイルの読み込みを始め、待たずに戻ります。
+    get_suggestion_index()
 
     # URLのクエリパラメータ（例: ?term=rock&search_type=ジャンル）を取得します。
     query_params = st.query_params
@@ -88,6 +93,8 @@ def main():
         st.session_state.search_type = search_type  # 検索タイプ
         st.session_state.search_term_backup = term  # 検索結果画面で表示するためのキーワード
         st.session_state.pop("filtered_results", None)  # 前回の検索結果が残っていれば削除
+        st.session_state.pop("filter_index", None)  # 前回の検索結果の索引も削除
+        st.session_state.pop("sorted_views", None)  # 前回の検索結果のソート結果も削除
         st.session_state.page = "search"  # 表示するページを「検索結果画面」に設定
 
         # URLからクエリパラメータを削除します。これにより、ユーザーがリロードしても同じ検索が繰り返されるのを防ぎます。
@@ -104,6 +111,8 @@ def main():
     show_header()  # サイドバーにヘッダーを表示
     st.sidebar.divider()  # サイドバーに区切り線を表示
     show_search_bar()  # サイドバーに検索バーを表示
+    if METRICS_ADMIN_PANEL:
+        show_metrics_panel()  # サイドバーに計測結果のパネルを表示（計測が有効な場合のみ）
 
     # --- ページの内容を切り替える処理 ---
     # 現在のページ状態に応じて、表示する関数を呼び分けます。
@@ -124,4 +133,12 @@ def main():
 # このファイルが直接実行された場合にのみ、main()関数を呼び出します。
 # (他のファイルからインポートされた場合には実行されません)
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # 再実行1回分の時間を、最後に表示したページごとに計測します（計測が無効な場合は何もしません）。
+    # st.rerun() による中断も、中断するまでの時間として記録されます。
+    with timer("app_rerun_seconds") as timing:
+        try:
+            main()
+        finally:
+            timing.set(page=st.session_state.get("page", "home"))
+    # 一定間隔ごとに、計測結果をPrometheus形式のファイルに書き出します。
+    maybe_dump()
\ No newline at end of file
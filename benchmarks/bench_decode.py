@@ -0,0 +1,157 @@
+# benchmarks/bench_decode.py
+"""
+iTunes APIのレスポンスの読み込み方による、処理時間とメモリの確保量を比較するマイクロベンチマーク。
+
+記録した50件・200件のレスポンスの本文を、次の3つの方法で読み込む。
+  json:       これまでの方法。本文全体を json.loads で全件・全項目の辞書にする（response.json() と同じ）
+  json+proj:  json.loads の後で、RESULT_FIELDS の項目だけを取り出す
+  stream:     ResultStreamDecoder に本文を --chunk バイトずつ渡し、1件ずつ読み込みながら項目を取り出す（現在の方法）
+それぞれについて、1回あたりの処理時間の中央値と、tracemalloc で計った読み込み中の最大確保量(peak)・読み込み後に残る量(kept)を表示する。
+あわせて、本文をgzipで圧縮した場合の転送量と、展開にかかる時間も表示する。
+
+レスポンスは --archive で指定したアーカイブ（bench_load の --record などで記録したもの）から読み込む。
+省略した場合は、モックiTunesサーバーから取得したレスポンスを一時的なアーカイブに記録して使う。
+
+実行方法（プロジェクトのルートディレクトリで）:
+    python -m benchmarks.bench_decode --repeat 200
+    python -m benchmarks.bench_decode --archive .cache/itunes_archive.sqlite3 --term YOASOBI
+"""
+
+import argparse
+import gc
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.mock_itunes import start_mock_server
+from config import RESULT_FIELDS
+from utils import api_client
+from utils.json_stream import ResultStreamDecoder
+from utils.records import FIELD_MAP
+from utils.response_archive import ResponseArchive, ArchiveMiss, MODE_RECORD, MODE_REPLAY
+from utils.response_cache import ResponseCache, MemoryLRUBackend
+
+SIZES = (50, 200)
+
+
+def _record_payloads(path: str, term: str, entity: str, padding: int) -> None:
+    """モックサーバーから50件・200件のレスポンスを取得し、アーカイブに記録する。"""
+    server, url = start_mock_server(padding=padding, seed=0)
+    api_client.ITUNES_API_BASE = url
+    api_client.set_response_cache(ResponseCache(MemoryLRUBackend(64 * 1024 * 1024)))
+    api_client.set_rate_limiter(None)
+    api_client.set_suggestion_index(None)
+    api_client.set_artwork_cache(None)
+    api_client.set_response_archive(ResponseArchive(path, MODE_RECORD))
+    try:
+        api_client.search_music_batch([(term, entity, size) for size in SIZES])
+    finally:
+        # 裏側のスレッドでの記録が終わるのを待ってから止める。
+        api_client.shutdown()
+        server.shutdown()
+
+
+def _load_payloads(path: str, term: str, entity: str) -> dict:
+    """アーカイブから、件数ごとのレスポンスの本文を読み込む。記録されていない件数は読み飛ばす。"""
+    archive = ResponseArchive(path, MODE_REPLAY)
+    try:
+        payloads = {}
+        for size in SIZES:
+            params = {"term": term, "entity": entity, "limit": size, "country": api_client.DEFAULT_COUNTRY}
+            try:
+                status, body, _ = archive.lookup(params)
+            except ArchiveMiss:
+                print(f"{term!r} ({entity}) の{size}件以上のレスポンスが記録されていないため、読み飛ばします。")
+                continue
+            if status != 200:
+                print(f"{term!r} ({entity}) の{size}件のレスポンスはエラー({status})として記録されているため、読み飛ばします。")
+                continue
+            payloads[size] = body
+    finally:
+        archive.close()
+    if not payloads:
+        raise SystemExit("比較に使えるレスポンスがありません。--term と --entity を確認するか、--archive を省略してください。")
+    return payloads
+
+
+def _decode_json(body: bytes, fields: tuple, chunk: int) -> list:
+    return json.loads(body).get("results", [])
+
+
+def _decode_json_projected(body: bytes, fields: tuple, chunk: int) -> list:
+    return [{name: item[name] for name in fields if name in item} for item in json.loads(body).get("results", [])]
+
+
+def _decode_stream(body: bytes, fields: tuple, chunk: int) -> list:
+    decoder = ResultStreamDecoder(fields)
+    for start in range(0, len(body), chunk):
+        decoder.feed(body[start:start + chunk])
+    return decoder.finish()
+
+
+METHODS = (("json", _decode_json), ("json+proj", _decode_json_projected), ("stream", _decode_stream))
+
+
+def _time(func, *args, repeat: int) -> float:
+    """func を repeat 回実行し、1回あたりの処理時間の中央値(秒)を返す。"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _allocations(func, *args) -> tuple:
+    """func を1回実行し、(実行中の最大確保量, 実行後に残った量) をバイト数で返す。"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = func(*args)
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak - before, kept - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", metavar="PATH", help="レスポンスを読み込むアーカイブ（省略するとモックサーバーから記録する）")
+    parser.add_argument("--term", default="YOASOBI", help="アーカイブから読み込むレスポンスの検索キーワード")
+    parser.add_argument("--entity", default="song", help="アーカイブから読み込むレスポンスの entity")
+    parser.add_argument("--payload", type=int, default=400, help="モックサーバーが1件ごとに加える説明文の文字数")
+    parser.add_argument("--chunk", type=int, default=64 * 1024, help="stream で一度に渡す本文のバイト数（httpxが1回に受け取る量の上限と同じ）")
+    parser.add_argument("--repeat", type=int, default=200, help="処理時間の計測で繰り返す回数")
+    args = parser.parse_args()
+
+    if args.archive:
+        payloads = _load_payloads(args.archive, args.term, args.entity)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "archive.sqlite3")
+            _record_payloads(path, args.term, args.entity, args.payload)
+            payloads = _load_payloads(path, args.term, args.entity)
+
+    # アプリと同じく、RESULT_FIELDS に設定のない entity では FIELD_MAP の全ての項目を残す。
+    fields = RESULT_FIELDS.get(args.entity, tuple(FIELD_MAP))
+    print(f"entity={args.entity} fields={len(fields)} chunk={args.chunk} repeat={args.repeat}")
+    print(f"{'results':>7} {'method':<10} {'time(ms)':>9} {'peak(KiB)':>10} {'kept(KiB)':>10}")
+    for size, body in payloads.items():
+        for name, func in METHODS:
+            elapsed = _time(func, body, fields, args.chunk, repeat=args.repeat)
+            peak, kept = _allocations(func, body, fields, args.chunk)
+            print(f"{size:>7} {name:<10} {elapsed * 1000:9.3f} {peak / 1024:10.1f} {kept / 1024:10.1f}")
+        compressed = gzip.compress(body, 6)
+        inflate = _time(gzip.decompress, compressed, repeat=args.repeat)
+        print(
+            f"{size:>7} transfer: identity={len(body) / 1024:.1f}KiB gzip={len(compressed) / 1024:.1f}KiB "
+            f"({len(compressed) / len(body):.0%}) inflate={inflate * 1000:.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
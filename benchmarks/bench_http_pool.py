@@ -0,0 +1,76 @@
+# benchmarks/bench_http_pool.py
+"""
+接続を毎回作り直す従来方式と、共有クライアント（接続プール）方式のリクエスト遅延を比較するベンチマーク。
+
+実行方法（プロジェクトのルートディレクトリで）:
+    python -m benchmarks.bench_http_pool --requests 200 --latency 0.005
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.mock_itunes import start_mock_server
+from utils import api_client
+
+
+def _summarize(label: str, samples: list) -> None:
+    """計測結果(秒)のリストから、平均・中央値・p95をミリ秒で表示する。"""
+    ordered = sorted(samples)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(
+        f"{label:<8} n={len(samples):<5} "
+        f"mean={statistics.mean(samples) * 1000:7.2f}ms "
+        f"p50={statistics.median(samples) * 1000:7.2f}ms "
+        f"p95={p95 * 1000:7.2f}ms"
+    )
+
+
+async def _cold_fetch(url: str, term: str) -> list:
+    """従来の実装と同じく、リクエストごとに新しいクライアント（新しい接続）を作って検索する。"""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url, params={"term": term, "entity": "song", "limit": 50})
+        response.raise_for_status()
+        return response.json().get("results", [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="各方式で送るリクエスト数")
+    parser.add_argument("--latency", type=float, default=0.0, help="モックサーバーの応答遅延(秒)")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(latency=args.latency)
+    api_client.ITUNES_API_BASE = url
+    # 接続方式の違いだけを比較するため、レート制限は無効にする。
+    api_client.set_rate_limiter(None)
+    try:
+        # 従来方式: リクエストごとにイベントループとクライアントを新しく作る。
+        cold = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            asyncio.run(_cold_fetch(url, f"term{i}"))
+            cold.append(time.perf_counter() - start)
+
+        # 共有方式: 常駐ループと接続プールを使い回す。最初の1回で接続を確立しておく。
+        # レスポンスキャッシュの影響を受けないよう、キャッシュより下の通信処理を直接呼び出す。
+        api_client._run_async(api_client._request_music, "warmup", "song", 50, "JP")
+        pooled = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            api_client._run_async(api_client._request_music, f"term{i}", "song", 50, "JP")
+            pooled.append(time.perf_counter() - start)
+
+        _summarize("cold", cold)
+        _summarize("pooled", pooled)
+        print(f"speedup (mean): {statistics.mean(cold) / statistics.mean(pooled):.2f}x")
+    finally:
+        api_client.shutdown()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
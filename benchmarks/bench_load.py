@@ -0,0 +1,252 @@
+# benchmarks/bench_load.py
+"""
+多数の利用者が同時にアプリを操作した時の、再実行時間・APIへの送信数・セッションごとのメモリ使用量を計測する負荷ベンチマーク。
+
+各セッションは AppTest でアプリ(app.py)を実行し、次の操作を順番に行う。
+  home:   ホーム画面を開く
+  search: サイドバーのフォームからキーワードで検索する
+  filter: 検索結果をキーワードで絞り込む
+  sort:   並び順を「50音」に切り替える
+  play:   1曲目の再生ボタンを押す
+  genre:  ジャンルカードのリンク（?search_type=ジャンル&term=...）から検索結果を開く
+これを --sessions 個のセッションで --concurrency 個ずつ同時に実行し、操作ごとと全体の再実行時間の p50/p95/p99 を表示する。
+データはモックiTunesサーバーから取得し、応答時間・エラーの割合・レート制限・レスポンスの大きさを引数で変えられる。
+--record でモックサーバーのレスポンスをアーカイブに記録しておけば、--replay で同じレスポンス（応答時間も記録した時のもの）を再生して、
+毎回同じ条件で計測できる。
+メモリ使用量は、同時実行の計測の後に、別に作成したセッションで操作を一通り行って計測する（tracemallocの負担が時間の計測に入らないようにするため）。
+
+実行方法（プロジェクトのルートディレクトリで）:
+    python -m benchmarks.bench_load --sessions 40 --concurrency 8 --latency 0.05 --error-rate 0.01
+"""
+
+import argparse
+import contextlib
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+from streamlit.testing.v1.util import patch_config_options
+
+from benchmarks.mock_itunes import start_mock_server
+from config import GENRES
+from utils import api_client
+from utils.response_archive import ResponseArchive, MODE_RECORD, MODE_REPLAY, LATENCY_RECORDED
+from utils.response_cache import ResponseCache, MemoryLRUBackend
+
+# 検索に使うキーワード。セッションごとに順番に割り当て、同じキーワードを検索するセッション同士でキャッシュと集約が効くようにする。
+SEARCH_TERMS = ["YOASOBI", "Ado", "back number", "King Gnu", "Official髭男dism", "Vaundy", "Aimer", "LiSA"]
+
+STEPS = ("home", "search", "filter", "sort", "play", "genre")
+
+
+@contextlib.contextmanager
+def _concurrent_app_tests():
+    """
+    AppTest を複数のスレッドから同時に実行できるようにする。
+
+    AppTest は実行のたびにプロセス全体で1つの Runtime._instance と設定(global.appTest)を差し替え、終わると元に戻す。
+    そのまま同時に実行すると、先に終わったセッションが実行中の他のセッションの Runtime を消してしまうため、
+    全てのセッションで1つの Runtime を共有し、AppTest からの差し替えは使われない場所に向ける。
+    また、AppTest は実行のたびにスクリプトをコンパイルし直すが、複数のスレッドで同時にコンパイルすると
+    Pythonのバージョンによっては SystemError になるため、本番のサーバーと同じくコンパイル結果を全てのセッションで共有する。
+    """
+    shared_runtime = MagicMock(spec=Runtime)
+    shared_runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared_runtime.cache_storage_manager = MemoryCacheStorageManager()
+    shared_script_cache = ScriptCache()
+    originals = (app_test.Runtime, app_test.ScriptCache, local_script_runner.ScriptCache)
+    app_test.Runtime = type("Runtime", (), {"_instance": None})
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared_script_cache
+    Runtime._instance = shared_runtime
+    try:
+        # 外側で設定しておけば、各実行が終了時に戻す値も True になる。
+        with patch_config_options({"global.appTest": True}):
+            yield
+    finally:
+        app_test.Runtime, app_test.ScriptCache, local_script_runner.ScriptCache = originals
+        Runtime._instance = None
+
+
+def _run_session(index: int) -> dict:
+    """
+    1つのセッションで操作を一通り行い、操作ごとの再実行時間(秒)を返す。
+
+    Returns:
+        dict: 操作の名前 -> 再実行時間(秒)。飛ばした操作はNone。"app" キーには操作後の AppTest を入れる（メモリの計測で使う）。
+    """
+    at = AppTest.from_file("app.py", default_timeout=60)
+    term = SEARCH_TERMS[index % len(SEARCH_TERMS)]
+    genre = GENRES[index % len(GENRES)]["term"]
+
+    def search():
+        at.text_input(key="search_term").set_value(term)
+        next(button for button in at.sidebar.button if button.label == "検索").click()
+
+    def sort():
+        radio = next((radio for radio in at.radio if radio.label == "並び順タイプ"), None)
+        if radio is None:
+            return False
+        radio.set_value("50音")
+
+    def play():
+        button = next((button for button in at.button if (button.key or "").startswith("play_")), None)
+        if button is None:
+            return False
+        button.click()
+
+    def genre_link():
+        at.query_params["term"] = genre
+        at.query_params["search_type"] = "ジャンル"
+
+    actions = {
+        "home": lambda: None,
+        "search": search,
+        "filter": lambda: at.text_input(key="filter_keyword_sidebar").set_value("Track 1"),
+        "sort": sort,
+        "play": play,
+        "genre": genre_link,
+    }
+    timings = {}
+    for step in STEPS:
+        # 検索に失敗して結果が表示されなかった場合など、操作する部品がなければその操作は飛ばす。
+        if actions[step]() is False:
+            timings[step] = None
+            continue
+        start = time.perf_counter()
+        at.run()
+        timings[step] = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"session {index} {step}: {at.exception[0].message}")
+    timings["app"] = at
+    return timings
+
+
+def _percentiles(values: list) -> tuple:
+    """値のリストから (p50, p95, p99) をミリ秒で返す。"""
+    if len(values) < 2:
+        value = values[0] * 1000 if values else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def _measure_memory(sessions: int) -> float:
+    """sessions 個のセッションで操作を一通り行い、セッションを残したまま1セッションあたりの増加バイト数を返す。"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    alive = [_run_session(i)["app"] for i in range(sessions)]
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del alive
+    return (after - before) / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=40, help="実行するセッションの数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時に実行するセッションの数")
+    parser.add_argument("--latency", type=float, default=0.05, help="モックサーバーの応答時間(秒)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="モックサーバーの応答時間の揺らぎ(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="モックサーバーが500エラーを返す割合(0〜1)")
+    parser.add_argument("--throttle", type=int, default=0, help="モックサーバーが1分あたりに受け付けるリクエスト数(0なら制限なし)")
+    parser.add_argument("--payload", type=int, default=400, help="1件ごとに加える説明文の文字数（レスポンスの大きさ）")
+    parser.add_argument("--memory-sessions", type=int, default=10, help="メモリ使用量の計測に使うセッションの数(0なら計測しない)")
+    parser.add_argument("--app-rate-limit", action="store_true", help="アプリ側のレート制限を有効にしたまま計測する")
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument("--record", metavar="PATH", help="モックサーバーのレスポンスを、このアーカイブに記録する")
+    archive_group.add_argument("--replay", metavar="PATH", help="このアーカイブに記録したレスポンスを再生する（モックサーバーには送信しない）")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(
+        args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_per_minute=args.throttle,
+        padding=args.payload,
+        seed=0,
+    )
+    api_client.ITUNES_API_BASE = url
+    # 毎回空のキャッシュから始め、ディスクの状態に結果が左右されないようにする。
+    api_client.set_response_cache(ResponseCache(MemoryLRUBackend(256 * 1024 * 1024)))
+    if not args.app_rate_limit:
+        api_client.set_rate_limiter(None)
+    # モックの結果を候補としてファイルに保存せず、実在しないアートワークをダウンロードしない。
+    api_client.set_suggestion_index(None)
+    api_client.set_artwork_cache(None)
+    # ホーム画面のカルーセルはランダムにジャンルを選ぶため、記録と再生で同じジャンルが選ばれるよう乱数の種を固定する。
+    random.seed(0)
+    if args.record:
+        api_client.set_response_archive(ResponseArchive(args.record, MODE_RECORD))
+    elif args.replay:
+        api_client.set_response_archive(ResponseArchive(args.replay, MODE_REPLAY, latency=LATENCY_RECORDED))
+    else:
+        api_client.set_response_archive(None)
+    try:
+        with _concurrent_app_tests():
+            _run(args, server)
+    finally:
+        api_client.shutdown()
+        server.shutdown()
+
+
+def _run(args, server) -> None:
+    """セッションを同時に実行し、再実行時間・送信数・メモリ使用量を表示する。"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(_run_session, range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    print(f"sessions={args.sessions} concurrency={args.concurrency} elapsed={elapsed:.1f}s")
+    print(f"{'step':<8} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'skipped':>8}")
+    for step in STEPS:
+        timings = [result[step] for result in results]
+        p50, p95, p99 = _percentiles([t for t in timings if t is not None])
+        print(f"{step:<8} {p50:9.1f} {p95:9.1f} {p99:9.1f} {timings.count(None):8d}")
+    p50, p95, p99 = _percentiles([result[step] for result in results for step in STEPS if result[step] is not None])
+    print(f"{'all':<8} {p50:9.1f} {p95:9.1f} {p99:9.1f}")
+
+    upstream = server.stats_snapshot()
+    coalescing = api_client.get_coalescing_stats()
+    cache = api_client.get_cache_stats()
+    print(
+        f"outbound requests: {upstream['requests']} ({upstream['requests'] / args.sessions:.1f}/session) "
+        f"ok={upstream['ok']} errors={upstream['errors']} throttled={upstream['throttled']} "
+        f"received={upstream['bytes'] / 1024:.0f}KiB"
+    )
+    print(
+        f"cache: hits={cache['hits']} misses={cache['misses']} hit_ratio={cache['hit_ratio']:.2f} "
+        f"coalesced={coalescing['coalesced']}"
+    )
+    resilience = api_client.get_resilience_stats()
+    circuits = ", ".join(f"{entity}={stats['state']}(opened {stats['opened']})" for entity, stats in resilience["circuits"].items())
+    print(
+        f"hedge: sent={resilience['hedge']['sent']} won={resilience['hedge']['won']} "
+        f"skipped={resilience['hedge']['skipped']} stale_served={resilience['stale_served']} circuits: {circuits or '-'}"
+    )
+    archive = api_client.get_response_archive()
+    if archive is not None:
+        stats = archive.stats()
+        print(
+            f"archive: mode={stats['mode']} entries={stats['entries']} recorded={stats['recorded']} "
+            f"replayed={stats['replayed']} misses={stats['misses']} size={stats['bytes'] / 1024:.0f}KiB"
+        )
+
+    if args.memory_sessions > 0:
+        per_session = _measure_memory(args.memory_sessions)
+        print(f"memory per session: {per_session / 1024:.1f}KiB (over {args.memory_sessions} sessions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_rerun.py
+"""
+ボタン操作のたびに再実行される範囲（アプリ全体 / フラグメントだけ）ごとに、再実行にかかる時間と作り直す要素数を比較するベンチマーク。
+
+- app:      アプリ全体の再実行。フラグメント化する前は、◀/▶や詳細の開閉のたびにこれが実行されていた
+            （再生ボタンはサイドバーの音楽コントローラーを更新するため、現在もアプリ全体を再実行する）。
+- fragment: フラグメント（カルーセル1つ、検索結果の1行、音楽コントローラー）だけの再実行。
+            フラグメントの中のボタン操作では、これだけが実行・再送信される。
+
+Streamlitのテスト用ランナー(AppTest)はフラグメントだけの再実行に対応していないため、
+フラグメントの計測では、そのフラグメントだけを描画するスクリプトを実行して代わりとする。
+データはモックiTunesサーバーから取得し、計測前に一度実行してキャッシュを温めておく。
+
+実行方法（プロジェクトのルートディレクトリで）:
+    python -m benchmarks.bench_rerun --runs 20
+"""
+
+import argparse
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.mock_itunes import start_mock_server
+from utils import api_client
+from utils.response_cache import ResponseCache, MemoryLRUBackend
+
+
+def _count_elements(node) -> int:
+    """AppTestの要素ツリーに含まれる要素の数を数える。"""
+    children = getattr(node, "children", None)
+    if children is None:
+        return 1
+    return sum(_count_elements(child) for child in children.values())
+
+
+def _measure(label: str, at: AppTest, runs: int) -> float:
+    """AppTestを runs 回再実行し、1回あたりの時間(中央値)と要素数を表示して返す。"""
+    at.run()  # 計測前に一度実行して、キャッシュとセッション状態を作っておく
+    if at.exception:
+        raise RuntimeError(f"{label}: {at.exception[0].message}")
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+    median_ms = statistics.median(timings) * 1000
+    print(f"{label:<28} median={median_ms:7.1f}ms elements={_count_elements(at._tree):4d}")
+    return median_ms
+
+
+# --- フラグメントだけを描画するスクリプト（AppTest.from_function で実行する） ---
+def _carousel_script():
+    from components.home import carousel_snapshot, show_carousel
+    mvs, _ = carousel_snapshot.get()
+    show_carousel("### ミュージックビデオ", mvs, "mv", key_prefix="mv")
+
+
+def _song_row_script():
+    import streamlit as st
+    from components.search_result import _display_song_item
+    _display_song_item(st.session_state["filtered_results"][0])
+
+
+def _controller_script():
+    import streamlit as st
+    from components.common import _music_controller
+    with st.sidebar:
+        _music_controller()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="計測する再実行の回数")
+    args = parser.parse_args()
+
+    server, url = start_mock_server()
+    api_client.ITUNES_API_BASE = url
+    # 計測が通信やディスクの速度に左右されないよう、メモリ上のキャッシュを使い、レート制限を外す。
+    api_client.set_response_cache(ResponseCache(MemoryLRUBackend(64 * 1024 * 1024)))
+    api_client.set_rate_limiter(None)
+    # モックの結果をキーワードの候補としてファイルに保存しないよう、候補の索引を使わない。
+    api_client.set_suggestion_index(None)
+    # モックのアートワークのURLは実在しないため、アートワークをダウンロード・保存しない。
+    api_client.set_artwork_cache(None)
+    try:
+        # --- ホーム画面: ◀/▶ を押した時 ---
+        home = AppTest.from_file("app.py", default_timeout=30)
+        app_home = _measure("home: app rerun", home, args.runs)
+        carousel = AppTest.from_function(_carousel_script, default_timeout=30)
+        fragment_carousel = _measure("home: carousel fragment", carousel, args.runs)
+
+        # --- 検索結果画面: 詳細の開閉などの行の中の操作 ---
+        search = AppTest.from_file("app.py", default_timeout=30)
+        search.query_params["term"] = "rock"
+        search.query_params["search_type"] = "ジャンル"
+        app_search = _measure("search: app rerun", search, args.runs)
+        row = AppTest.from_function(_song_row_script, default_timeout=30)
+        row.session_state["filtered_results"] = search.session_state["filtered_results"]
+        fragment_row = _measure("search: song row fragment", row, args.runs)
+
+        # --- 音楽コントローラー ---
+        controller = AppTest.from_function(_controller_script, default_timeout=30)
+        controller.session_state["now_playing"] = search.session_state["filtered_results"][0]
+        _measure("sidebar: controller fragment", controller, args.runs)
+
+        print(f"carousel navigation: {app_home / fragment_carousel:.1f}x faster")
+        print(f"song row interaction: {app_search / fragment_row:.1f}x faster")
+    finally:
+        api_client.shutdown()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_session_memory.py
+"""
+セッションごとに保存する検索結果のメモリ使用量を、変換前（APIの辞書のまま）と変換後（共有レコード）で比較するベンチマーク。
+
+各セッションは、レスポンスキャッシュから受け取った同じ検索結果を st.session_state に保存する、という状況を再現する。
+- raw:     キャッシュのJSONを読み込んだ辞書のリストを、そのままセッションに保存する（従来の方式）
+- records: utils.records.project_results() で変換したレコードのリストを保存する（レコードはプロセス内で共有される）
+
+実行方法（プロジェクトのルートディレクトリで）:
+    python -m benchmarks.bench_session_memory --sessions 100 --results 50
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from benchmarks.mock_itunes import _make_result
+from utils.records import project_results, pool_size
+
+
+def _measure(label: str, payload: bytes, sessions: int, convert) -> float:
+    """sessions個分のセッション状態を作成し、1セッションあたりの増加バイト数を表示して返す。"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    # 各セッションがキャッシュから結果を受け取り、自分のsession_stateに保存する。
+    session_states = []
+    for _ in range(sessions):
+        results = json.loads(payload)["results"]
+        session_states.append({"filtered_results": convert(results)})
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_session = (after - before) / sessions
+    # 共有レコードはどこからも参照されなくなると消えるため、セッション状態が残っているうちに数える。
+    # 全てのセッションで同じレコードを共有していれば、結果の件数と同じになる（raw では0）。
+    print(
+        f"{label:<8} sessions={sessions:<5} total={(after - before) / 1024:9.1f}KiB per_session={per_session:9.0f}B "
+        f"shared_records={pool_size()}"
+    )
+    # 計測が終わるまでセッション状態が解放されないよう、ここで参照を外す。
+    del session_states
+    return per_session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="同時に存在するセッション数")
+    parser.add_argument("--results", type=int, default=50, help="1回の検索で保存する結果の件数")
+    args = parser.parse_args()
+
+    results = [_make_result("YOASOBI", "song", i) for i in range(args.results)]
+    payload = json.dumps({"resultCount": len(results), "results": results}).encode("utf-8")
+
+    raw = _measure("raw", payload, args.sessions, lambda items: items)
+    records = _measure("records", payload, args.sessions, project_results)
+    print(f"reduction: {raw / records:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/mock_itunes.py
+"""
+ベンチマーク用に、iTunes Search APIの代わりとなるローカルHTTPサーバーを提供するモジュール。
+
+本物のAPIはレート制限やネットワークの揺らぎがあるため、性能を正確に比較できない。
+このサーバーはiTunes APIと同じ形式のJSONを返すので、
+utils.api_client.ITUNES_API_BASE をこのサーバーのURLに差し替えれば、アプリ側のコードを変えずに計測できる。
+応答時間（とその揺らぎ）、エラーの割合、レート制限、レスポンスの大きさを指定して、本物のAPIに近い状況も再現できる。
+"""
+
+import gzip
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _make_result(term: str, entity: str, index: int, padding: int = 0) -> dict:
+    """
+    検索キーワードと番号から、iTunes APIの1件分の結果に似せた辞書を作成する。
+    padding を指定すると、その文字数の説明文(longDescription)を加えてレスポンスを大きくする。
+    """
+    # 組み込みの hash() は実行ごとに値が変わるため、実行をまたいで同じIDになるよう crc32 から作る。
+    track_id = zlib.crc32(f"{term}\n{entity}\n{index}".encode("utf-8")) % 10**9
+    result = {
+        "wrapperType": "track",
+        "kind": "music-video" if entity == "musicVideo" else "song",
+        "trackId": track_id,
+        "collectionId": track_id + 1,
+        "artistName": f"{term} Artist {index % 7}",
+        "trackName": f"{term} Track {index}",
+        "collectionName": f"{term} Album {index % 5}",
+        "artworkUrl100": f"https://example.com/{track_id}/100x100bb.jpg",
+        "previewUrl": f"https://example.com/{track_id}/preview.m4a",
+        "trackViewUrl": f"https://example.com/track/{track_id}",
+        "collectionViewUrl": f"https://example.com/album/{track_id + 1}",
+        "trackPrice": 255.0,
+        "country": "JPN",
+        "currency": "JPY",
+        "primaryGenreName": "J-Pop",
+    }
+    if padding:
+        result["longDescription"] = ("lorem ipsum " * (padding // 12 + 1))[:padding]
+    return result
+
+
+def start_mock_server(
+    latency: float = 0.0,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    *,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    throttle_per_minute: int = 0,
+    total_results: int | None = None,
+    padding: int = 0,
+    seed: int | None = None,
+    compress: bool = True,
+):
+    """
+    目的: モックのiTunes APIサーバーを別スレッドで起動する。
+    役割: 起動したサーバーと、ITUNES_API_BASEに設定すべきURLを返す。
+         終了時は返されたサーバーの shutdown() を呼び出す。
+         受け付けたリクエスト数などは、サーバーの stats_snapshot() で取得できる。
+
+    Args:
+        latency (float): 各レスポンスを返す前に待つ秒数。上流APIの応答時間を模擬する。
+        host (str): 待ち受けるホスト。
+        port (int): 待ち受けるポート。0なら空いているポートが自動で選ばれる。
+        jitter (float): 応答時間の揺らぎ(秒)。各レスポンスで 0〜jitter 秒をランダムに latency に加える。
+        error_rate (float): 500エラーを返す割合(0〜1)。
+        throttle_per_minute (int): 1分あたりに受け付けるリクエスト数。超えた分には本物のAPIと同じく403を返す。0なら制限しない。
+        total_results (int | None): キーワードごとの結果の総数。offset がこれを超えると空の結果を返す。Noneなら上限なし。
+        padding (int): 1件ごとに加える説明文の文字数。レスポンスの大きさを本物のAPIに近づける。
+        seed (int | None): エラーと応答時間の揺らぎに使う乱数の種。指定すると毎回同じ順番で発生する。
+        compress (bool): Trueなら、クライアントが Accept-Encoding で gzip を受け付ける場合に本文をgzipで圧縮して返す（本物のAPIと同じ）。
+
+    Returns:
+        tuple: (ThreadingHTTPServer, str) サーバーと検索エンドポイントのURL。
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    stats = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0, "bytes": 0}
+    # レート制限の1分ごとの窓: [窓の開始時刻, 窓の中で受け付けたリクエスト数]
+    window = [time.monotonic(), 0]
+
+    def admit() -> str:
+        """リクエストを受け付けるかを決め、"ok" / "throttled" / "error" のいずれかを返す。"""
+        with lock:
+            stats["requests"] += 1
+            if throttle_per_minute > 0:
+                now = time.monotonic()
+                if now - window[0] >= 60:
+                    window[0], window[1] = now, 0
+                if window[1] >= throttle_per_minute:
+                    stats["throttled"] += 1
+                    return "throttled"
+                window[1] += 1
+            if error_rate and rng.random() < error_rate:
+                stats["errors"] += 1
+                return "error"
+            stats["ok"] += 1
+            return "ok"
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1にしないと、レスポンスごとに接続が切断されKeep-Aliveの効果を測定できない。
+        protocol_version = "HTTP/1.1"
+        # ヘッダーと本文が別パケットになるため、Nagleアルゴリズムを切って不要な待ち時間をなくす。
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            term = query.get("term", [""])[0]
+            entity = query.get("entity", ["song"])[0]
+            limit = int(query.get("limit", ["50"])[0])
+            offset = int(query.get("offset", ["0"])[0])
+            outcome = admit()
+            if latency or jitter:
+                with lock:
+                    delay = latency + (rng.uniform(0, jitter) if jitter else 0.0)
+                time.sleep(delay)
+            if outcome == "throttled":
+                self._send(403, b"")
+                return
+            if outcome == "error":
+                self._send(500, b'{"errorMessage": "Internal Server Error"}')
+                return
+            end = offset + limit if total_results is None else min(offset + limit, total_results)
+            results = [_make_result(term, entity, i, padding) for i in range(offset, end)]
+            self._send(200, json.dumps({"resultCount": len(results), "results": results}).encode("utf-8"))
+
+        def _send(self, status: int, body: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            if compress and body and "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body, 6)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # クライアントがレスポンスを待たずに切断した場合（使われなかったヘッジリクエストのキャンセルなど）。
+                return
+            with lock:
+                stats["bytes"] += len(body)
+
+        def log_message(self, format, *args):
+            # アクセスログを出すと計測結果が読みにくくなるため、出力しない。
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # 既定の待ち受けキュー(5)では、同時接続が多いと接続が取りこぼされ、再送待ちで1秒ほど遅れてしまう。
+        request_queue_size = 128
+
+        def stats_snapshot(self) -> dict:
+            """受け付けたリクエスト数、成功・エラー・レート制限の数、送信したバイト数を返す。"""
+            with lock:
+                return dict(stats)
+
+    server = Server((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mock-itunes", daemon=True)
+    thread.start()
+    url = f"http://{server.server_address[0]}:{server.server_address[1]}/search"
+    return server, url
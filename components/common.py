@@ -9,6 +9,13 @@
 
 # Streamlitライブラリを 'st' という名前でインポートします。
 import streamlit as st
+from utils import api_client  # キャッシュやリクエスト集約の統計情報を取得するために使用
+from utils.metrics import get_metrics  # 処理時間の計測結果
+from utils.records import pool_size  # プロセス内で共有しているレコードの数
+from utils.session_store import get_global_session_stats  # 全セッションのセッションストアの統計情報
+from components.home import get_home_snapshot_stats, refresh_home_data  # ホーム画面のデータの更新状況
+from utils.helpers import normalize_query  # キーワードの候補と検索キーワードを比べるために使用
+from utils.typeahead import KIND_ARTIST  # キーワードの候補の種類
 
 
 def show_music_controller():
@@ -19,20 +26,29 @@ def show_music_controller():
     # サイドバーに区切り線を追加して、他のUIと視覚的に分離します。
     st.sidebar.divider()
 
+    # フラグメントの中では st.sidebar を直接使えないため、with st.sidebar の中で呼び出します。
+    with st.sidebar:
+        _music_controller()
+
+
+# @st.fragment により、コントローラーの中の操作ではコントローラーだけが再実行・再送信されます。
+@st.fragment
+def _music_controller():
+    """音楽コントローラーの本体。サイドバーの中から呼び出されます。"""
     # st.session_stateから "now_playing" というキーで現在再生中の曲情報を取得します。
     # .get()を使うことで、キーが存在しなくてもエラーにならず、Noneが返ります。
     now_playing = st.session_state.get("now_playing")
 
     # もし再生中の曲がなければ、メッセージを表示して処理を終了します。
     if not now_playing:
-        st.sidebar.caption("再生中の曲はありません")
+        st.caption("再生中の曲はありません")
         return
 
-    # 曲情報（辞書）から、曲名、アーティスト名、プレビューURLを取り出します。
-    # .get()の第二引数には、キーが存在しなかった場合のデフォルト値を設定できます。
-    track_name = now_playing.get("trackName", "タイトルなし")
-    artist_name = now_playing.get("artistName", "アーティスト不明")
-    preview_url = now_playing.get("previewUrl")
+    # 曲情報（レコード）から、曲名、アーティスト名、プレビューURLを取り出します。
+    # 値が空の場合は、「or」の後ろに書いたデフォルト値が使われます。
+    track_name = now_playing.track_name or "タイトルなし"
+    artist_name = now_playing.artist_name or "アーティスト不明"
+    preview_url = now_playing.preview_url
 
     # st.session_stateから自動再生フラグを取得します。
     # "再生"ボタンが押された直後はTrueになり、音声が自動で再生されます。
@@ -42,21 +58,21 @@ def show_music_controller():
         st.session_state.autoplay = False
 
     # 曲名とアーティスト名をサイドバーに表示します。
-    st.sidebar.caption(f"{track_name} / {artist_name}")
+    st.caption(f"{track_name} / {artist_name}")
 
     # プレビューURLが存在すれば、音声プレイヤー(st.audio)を表示します。
     if preview_url:
-        st.sidebar.audio(preview_url, format="audio/mp4", autoplay=should_autoplay)
+        st.audio(preview_url, format="audio/mp4", autoplay=should_autoplay)
     else:
         # プレビューURLがない場合は、警告メッセージを表示します。
-        st.sidebar.warning("プレビューがありません")
+        st.warning("プレビューがありません")
 
 
 def show_search_bar():
     """
     目的: サイドバーに検索機能を提供します。
     役割: 現在表示しているページに応じて、検索バーの機能や表示を動的に切り替えます。
-         ホーム画面では「楽曲検索」、検索結果画面では「結果内絞り込み」の機能を提供します。
+         ホーム画面では「楽曲検索」、検索結果画面では「結果内絞り込み」と、検索したキーワードで始まる名前の候補を提供します。
     """
 
     # --- 内部で使う補助関数を定義 ---
@@ -65,12 +81,24 @@ def show_search_bar():
         st.session_state.search_term = ""
         # 関連するセッション情報も削除して、状態をリセットします。
         st.session_state.pop("filtered_results", None)
+        st.session_state.pop("filter_index", None)
+        st.session_state.pop("sorted_views", None)
         st.session_state.pop("search_term_backup", None)
 
     def clear_filter_keyword():
         """結果内絞り込みのキーワードをクリアするための関数"""
         st.session_state.filter_keyword_sidebar = ""
 
+    def search_suggestion(name, search_type):
+        """キーワードの候補が押された時に、その名前で新しく検索し直すための関数"""
+        st.session_state.search_term = name
+        st.session_state.search_term_backup = name
+        st.session_state.search_type = search_type
+        st.session_state.pop("filtered_results", None)
+        st.session_state.pop("filter_index", None)
+        st.session_state.pop("sorted_views", None)
+        st.session_state.page = "search"
+
     # 現在のページ情報をセッションから取得します。
     page = st.session_state.get("page", "home")
 
@@ -100,6 +128,8 @@ def show_search_bar():
                 if st.session_state.get("search_term"):
                     st.session_state.search_term_backup = st.session_state.search_term
                     st.session_state.pop("filtered_results", None)  # 古い検索結果をクリア
+                    st.session_state.pop("filter_index", None)  # 古い検索結果の索引もクリア
+                    st.session_state.pop("sorted_views", None)  # 古い検索結果のソート結果もクリア
                     st.session_state.page = "search"  # ページを検索結果画面に切り替え
                     st.rerun()  # ページを再読み込みして画面を更新
 
@@ -117,5 +147,86 @@ def show_search_bar():
         )
         st.sidebar.button("クリア", on_click=clear_filter_keyword, use_container_width=True)
 
+        # 検索したキーワードで始まるアーティスト名・曲名を、キーワードの候補として表示します。
+        # 候補はこれまでに取得した結果の索引から探すため、APIへの通信は発生しません。
+        term = st.session_state.get("search_term_backup") or ""
+        suggestions = [
+            (name, kind) for name, kind in api_client.suggest_terms(term, limit=6)
+            if normalize_query(name) != normalize_query(term)
+        ][:5]
+        if suggestions:
+            st.sidebar.markdown("#### キーワードの候補")
+            for name, kind in suggestions:
+                search_type = "アーティスト名" if kind == KIND_ARTIST else "曲名"
+                st.sidebar.button(
+                    f"{name}（{search_type}）", key=f"typeahead_{kind}_{name}", on_click=search_suggestion,
+                    args=(name, search_type), use_container_width=True
+                )
+
     # ページの種別に関わらず、最後に必ず音楽コントローラーを表示します。
-    show_music_controller()
\ No newline at end of file
+    show_music_controller()
+
+
+def show_metrics_panel():
+    """
+    目的: サイドバーに、処理時間の計測結果を確認するための管理者用パネルを表示します。
+    役割: APIの取得・キャッシュの確認・並べ替え・再実行の時間（回数、平均、分位点）とカウンター、
+         キャッシュやリクエスト集約、キーワードの正規化、セッションストア、共有レコードの数、ホーム画面のデータの更新状況などの統計情報を表示し、Prometheus形式のテキストをダウンロードできるようにします。
+         計測が無効（METRICS_ENABLED = False）の場合は何も表示しません。
+    """
+    registry = get_metrics()
+    if registry is None:
+        return
+    summary = registry.summary()
+    with st.sidebar.expander("メトリクス（管理者用）"):
+        # 時間は見やすいようにミリ秒に換算して表示します。
+        st.dataframe(
+            [
+                {
+                    "名前": row["name"],
+                    "ラベル": ", ".join(f"{name}={value}" for name, value in row["labels"].items()),
+                    "回数": row["count"],
+                    "平均(ms)": round(row["mean"] * 1000, 1),
+                    "p50(ms)": round(row["p50"] * 1000, 1),
+                    "p95(ms)": round(row["p95"] * 1000, 1),
+                    "p99(ms)": round(row["p99"] * 1000, 1),
+                }
+                for row in summary["histograms"]
+            ],
+            hide_index=True,
+        )
+        # カウンターとゲージ（サーキットブレーカーの状態など）は、どちらも現在の値を表示します。
+        if summary["counters"] or summary["gauges"]:
+            st.dataframe(
+                [
+                    {
+                        "名前": row["name"],
+                        "ラベル": ", ".join(f"{name}={value}" for name, value in row["labels"].items()),
+                        "値": row["value"],
+                    }
+                    for row in summary["counters"] + summary["gauges"]
+                ],
+                hide_index=True,
+            )
+        st.json(
+            {
+                "cache": api_client.get_cache_stats(),
+                "coalescing": api_client.get_coalescing_stats(),
+                "query_normalization": api_client.get_query_normalization_stats(),
+                "rate_limiter": api_client.get_rate_limiter_stats(),
+                "resilience": api_client.get_resilience_stats(),
+                "records": {"shared": pool_size()},
+                "session_store": get_global_session_stats(),
+                "home_snapshots": get_home_snapshot_stats(),
+            },
+            expanded=False,
+        )
+        # ホーム画面のデータ（カルーセル・ジャンルのアートワーク）を、更新間隔を待たずに裏側で作り直します。
+        st.button("ホーム画面のデータを更新", on_click=refresh_home_data, use_container_width=True)
+        st.download_button(
+            "Prometheus形式でダウンロード",
+            registry.render_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain",
+            use_container_width=True,
+        )
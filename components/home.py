@@ -3,22 +3,30 @@
 # --- モジュールのインポート ---
 import streamlit as st
 import random  # ランダムに要素を選択するために使用
-from config import GENRES, CAROUSEL_ITEM_LIMIT  # 設定ファイルから定数をインポート
-from utils.api_client import search_genres_concurrently, search_music  # API通信用の関数をインポート
+from config import (  # 設定ファイルから定数をインポート
+    GENRES,
+    CAROUSEL_ITEM_LIMIT,
+    CAROUSEL_FIXED_TERMS,
+    CAROUSEL_REFRESH_INTERVAL,
+    GENRE_ARTWORK_REFRESH_INTERVAL,
+    HOME_REFRESH_RETRY_INTERVAL,
+)
+from utils.api_client import search_genres_concurrently, search_music_batch, ApiError, PRIORITY_BACKGROUND  # API通信用の関数をインポート
+from utils.api_client import artwork_image, artwork_css_url  # アートワークの縮小画像のキャッシュ
+from utils.background_refresh import RefreshingSnapshot  # 裏側でデータを更新する仕組み
+from utils.session_store import get_session_store  # 上限付きのセッションストア
 
 # --- 定数の定義 ---
 # カルーセルで1ページあたりに表示するアイテムの数
 ITEMS_PER_PAGE = 4
 
 
-# --- データ取得関数 (キャッシュ機能付き) ---
-@st.cache_data
+# --- データ取得関数 ---
 def fetch_genre_artworks(genres):
     """
     目的: 各ジャンルの代表的なアートワーク（ジャケット画像）を効率的に取得する。
-    役割: @st.cache_dataデコレータにより、一度取得した結果はキャッシュ（一時保存）され、
-         次回以降はAPI通信を行わずに高速で表示できる。
-         複数のジャンルを並列で検索することで、ホーム画面の表示速度を向上させる。
+    役割: 複数のジャンルを並列で検索することで、ホーム画面の表示速度を向上させる。
+         全てのジャンルで取得に失敗した場合は ApiError を送出し、前回取得したアートワークが使い続けられるようにする。
     """
     artworks = {}  # ジャンル名とアートワークURLを格納する辞書
     # 複数のジャンルに対するAPIリクエストを同時に（並列で）実行する。
@@ -28,41 +36,63 @@ def fetch_genre_artworks(genres):
         genre_results = all_results[i]
         # 結果があれば、最初に見つかった曲のアートワークURLを取得する。
         if genre_results:
-            artwork_url_100 = genre_results[0].get("artworkUrl100")
+            artwork_url_100 = genre_results[0].artwork_url
             if artwork_url_100:
-                # より高解像度の画像を表示するために、URLの一部を置換する。
-                artworks[genre["term"]] = artwork_url_100.replace("100x100", "300x300")
+                # 表示する大きさの画像には、描画する時にアートワークのキャッシュを通して変換する。
+                artworks[genre["term"]] = artwork_url_100
+    if genres and not artworks:
+        raise ApiError("ジャンルのアートワークを取得できませんでした。")
     return artworks
 
 
-@st.cache_data(ttl=3600)
+def carousel_specs(search_terms):
+    """
+    目的: カルーセル用に検索する (キーワード, entity, 件数) の組を作成する。
+    役割: 各キーワードについて「MV」と「アルバム」の検索条件を作る。キャッシュウォーマーとも共有する。
+    """
+    specs = []
+    for term in search_terms:
+        specs.append((term, "musicVideo", CAROUSEL_ITEM_LIMIT))
+        specs.append((term, "album", CAROUSEL_ITEM_LIMIT))
+    return specs
+
+
 def fetch_carousel_items():
     """
     目的: ホーム画面のカルーセルに表示するミュージックビデオとアルバムのデータを取得する。
-    役割: @st.cache_data(ttl=3600)により、結果は1時間(3600秒)キャッシュされる。
-         様々なキーワードで検索し、ランダム性を持たせることで、アクセスするたびに違うコンテンツを表示する。
+    役割: 様々なキーワードで検索し、ランダム性を持たせることで、更新のたびに違うコンテンツを表示する。
+         全ての検索が通信エラーだった場合は ApiError を送出し、前回のデータが使い続けられるようにする。
     """
     search_terms = []
     # 設定ファイルにあるジャンルからランダムにいくつか選び、検索キーワードに追加する。
     selected_genres = random.sample(GENRES, min(len(GENRES), 5))
     search_terms.extend([g['term'] for g in selected_genres])
     # 固定の検索キーワードも追加する。
-    search_terms.extend(["J-Pop", "Rock", "Anime", "最新"])
+    search_terms.extend(CAROUSEL_FIXED_TERMS)
+
+    # 各キーワードについて「MV」と「アルバム」の検索条件を作り、一括検索APIで並列に取得する。
+    # 1件ずつ順番に検索すると (キーワード数 × 2) 回分の通信時間がかかってしまう。
+    specs = carousel_specs(search_terms)
+    # ユーザーの検索を優先させるため、裏側での取得として低い優先度で送信する。
+    batch_results = search_music_batch(specs, priority=PRIORITY_BACKGROUND)
+    if not any(query.ok for query in batch_results):
+        raise ApiError(batch_results[0].error)
 
     all_mv_results = []
     all_album_results = []
-    # 各キーワードでMVとアルバムを検索し、結果をリストに蓄積する。
-    for term in search_terms:
-        mv_results = search_music(term, entity="musicVideo", limit=10)
-        # プレビューURLが存在するMVのみを追加する。
-        all_mv_results.extend([item for item in mv_results if item.get("previewUrl")])
-        album_results = search_music(term, entity="album", limit=10)
-        all_album_results.extend(album_results)
+    # 結果は検索条件と同じ順番で返ってくるため、条件と組にして振り分ける。
+    # 失敗したクエリの結果は空のリストになっているので、そのまま読み飛ばされる。
+    for (_, entity, _), query in zip(specs, batch_results):
+        if entity == "musicVideo":
+            # プレビューURLが存在するMVのみを追加する。
+            all_mv_results.extend([item for item in query.results if item.preview_url])
+        else:
+            all_album_results.extend(query.results)
 
     # 取得したデータには重複が含まれる可能性があるため、IDを使って重複を除去する。
-    unique_mvs = list({item["trackId"]: item for item in all_mv_results}.values()) if all_mv_results else []
+    unique_mvs = list({item.track_id: item for item in all_mv_results}.values()) if all_mv_results else []
     unique_albums = list(
-        {item["collectionId"]: item for item in all_album_results}.values()) if all_album_results else []
+        {item.collection_id: item for item in all_album_results}.values()) if all_album_results else []
 
     # 結果をシャッフルして、表示のランダム性を高める。
     random.shuffle(unique_mvs)
@@ -76,6 +106,41 @@ def fetch_carousel_items():
     return final_mvs, final_albums
 
 
+# --- ホーム画面のデータのスナップショット ---
+# 全ての利用者（セッション）で共有する。一度取得したデータは待ち時間なしで返し、
+# 更新間隔を過ぎたら裏側のスレッドで作り直す。作り直しに失敗した場合は前回のデータを使い続ける。
+# これにより、キャッシュの期限切れ直後に訪れた利用者だけが取得処理を待たされることがなくなる。
+carousel_snapshot = RefreshingSnapshot(
+    fetch_carousel_items,
+    refresh_interval=CAROUSEL_REFRESH_INTERVAL,
+    retry_interval=HOME_REFRESH_RETRY_INTERVAL,
+    name="carousel",
+)
+genre_artwork_snapshot = RefreshingSnapshot(
+    lambda: fetch_genre_artworks(GENRES),
+    refresh_interval=GENRE_ARTWORK_REFRESH_INTERVAL,
+    retry_interval=HOME_REFRESH_RETRY_INTERVAL,
+    name="genre_artworks",
+)
+
+
+def get_home_snapshot_stats() -> list:
+    """
+    目的: ホーム画面のデータの更新状況を確認するための統計情報を返す。
+    役割: カルーセルとジャンルのアートワークのスナップショットごとに、作成からの経過秒数・更新や失敗の回数などを返す。
+    """
+    return [carousel_snapshot.stats(), genre_artwork_snapshot.stats()]
+
+
+def refresh_home_data():
+    """
+    目的: ホーム画面のデータを、更新間隔を待たずに作り直す。
+    役割: 次にホーム画面が表示された時に裏側での作り直しが始まるようにする。作り直しが終わるまでは今のデータを表示する。
+    """
+    carousel_snapshot.invalidate()
+    genre_artwork_snapshot.invalidate()
+
+
 # --- UI表示用の内部関数 ---
 def _display_carousel_item(item, item_type):
     """
@@ -84,27 +149,29 @@ def _display_carousel_item(item, item_type):
     """
     if item_type == "mv":
         # --- ミュージックビデオの表示処理 ---
-        artwork_url = item.get("artworkUrl100", "").replace("100x100", "300x300")
-        track_name = item.get("trackName", "タイトル不明")
-        artist_name = item.get("artistName", "アーティスト不明")
-        preview_url = item.get("previewUrl")
+        # カード用の300pxの縮小画像（まだ保存されていなければAppleの300pxの画像）を表示する。
+        artwork_url = artwork_image(item.artwork_url, 300)
+        track_name = item.track_name or "タイトル不明"
+        artist_name = item.artist_name or "アーティスト不明"
+        preview_url = item.preview_url
 
         st.image(artwork_url, use_container_width=True)
         st.markdown(f"**{track_name}**")
         st.caption(artist_name)
 
         # 「プレビュー再生」ボタンが押された時の処理
-        if st.button("プレビュー再生", key=f"play_mv_{item['trackId']}", use_container_width=True):
+        if st.button("プレビュー再生", key=f"play_mv_{item.track_id}", use_container_width=True):
             # セッションにプレビューURLを保存し、ページを再実行してビデオ表示画面に切り替える。
+            # 画面全体が切り替わるため、カルーセルだけでなくアプリ全体を再実行する。
             st.session_state.preview_mv_url = preview_url
-            st.rerun()
+            st.rerun(scope="app")
 
     elif item_type == "album":
         # --- アルバムの表示処理 ---
-        artwork_url = item.get("artworkUrl100", "").replace("100x100", "300x300")
-        collection_name = item.get("collectionName", "アルバム不明")
-        artist_name = item.get("artistName", "アーティスト不明")
-        collection_view_url = item.get("collectionViewUrl")
+        artwork_url = artwork_image(item.artwork_url, 300)
+        collection_name = item.collection_name or "アルバム不明"
+        artist_name = item.artist_name or "アーティスト不明"
+        collection_view_url = item.collection_view_url
 
         st.image(artwork_url, use_container_width=True)
         st.markdown(f"**{collection_name}**")
@@ -117,10 +184,14 @@ def _display_carousel_item(item, item_type):
 
 
 # --- カルーセル全体のUIを表示する関数 ---
+# @st.fragment により、カルーセルの中のボタン操作（◀/▶）ではこのカルーセルだけが再実行・再送信される。
+# CSSの読み込みやサイドバー、もう一方のカルーセルは作り直されない。
+@st.fragment
 def show_carousel(title, items, item_type, key_prefix):
     """
     目的: 左右のナビゲーションボタン付きのカルーセルUIを生成する。
     役割: MVやアルバムのリストを受け取り、ページネーションを管理しながらアイテムを表示する。
+         ページの切り替えはこのカルーセルの中だけで完結するため、アプリ全体は再実行しない。
     """
     st.markdown(title)
     if not items:
@@ -129,20 +200,19 @@ def show_carousel(title, items, item_type, key_prefix):
             f"注目の{('ミュージックビデオ' if item_type == 'mv' else 'アルバム')}の取得に失敗しました。時間をおいて再度お試しください。")
         return
 
-    # st.session_stateを使い、カルーセルの現在のページ番号を管理する。
+    # セッションストアを使い、カルーセルの現在のページ番号を管理する。
     # key_prefixにより、MV用とアルバム用で別々のページ番号を保持できる。
-    session_key = f"{key_prefix}_carousel_page"
-    if session_key not in st.session_state:
-        st.session_state[session_key] = 0
+    # ストアの上限により破棄されていた場合は、最初のページ(0)から表示する。
+    store = get_session_store()
+    current_page = store.get("carousel_page", key_prefix, 0)
 
     # アイテムの総数から、総ページ数を計算する。
     total_pages = (len(items) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
-    current_page = st.session_state.get(session_key, 0)
 
     # 何らかの理由で現在のページ番号が不正な値になった場合に0にリセットする。
     if current_page >= total_pages:
         current_page = 0
-        st.session_state[session_key] = 0
+        store.set("carousel_page", key_prefix, 0)
 
     # st.columnsを使って、UIを「戻るボタン」「アイテム表示」「次へボタン」の3列に分割する。
     col_nav_prev, col_items, col_nav_next = st.columns([1, 10, 1])
@@ -151,8 +221,8 @@ def show_carousel(title, items, item_type, key_prefix):
     with col_nav_prev:
         # 最初のページではボタンを無効化(disabled)する。
         if st.button("◀", key=f"{key_prefix}_prev", use_container_width=True, disabled=(current_page == 0)):
-            st.session_state[session_key] -= 1
-            st.rerun()  # ページを再読み込みして表示を更新する。
+            store.set("carousel_page", key_prefix, current_page - 1)
+            st.rerun(scope="fragment")  # このカルーセルだけを再実行して表示を更新する。
 
     # アイテム表示の列
     with col_items:
@@ -177,10 +247,10 @@ def show_carousel(title, items, item_type, key_prefix):
         if st.button("▶", key=f"{key_prefix}_next", use_container_width=True,
                      disabled=(current_page >= total_pages - 1)):
             # ▼▼▼【修正箇所】▼▼▼
-            # ページ番号を管理する正しいキー `session_key` をインクリメントする。
-            st.session_state[session_key] += 1
+            # セッションストアに保存しているページ番号をインクリメントする。
+            store.set("carousel_page", key_prefix, current_page + 1)
             # ▲▲▲【修正箇所】▲▲▲
-            st.rerun()
+            st.rerun(scope="fragment")
 
 
 # --- ホーム画面全体の表示を管理するメイン関数 ---
@@ -207,8 +277,13 @@ def show_home():
         st.markdown("## 注目コンテンツ")
 
         # st.spinner を使うと、中の処理が終わるまでスピナー（くるくる回るアイコン）が表示される。
+        # スピナーが実際に表示されるのは、サーバー起動後に一度もデータを取得できていない時だけ。
         with st.spinner("注目のミュージックビデオとアルバムを読み込み中..."):
-            mvs, albums = fetch_carousel_items()
+            try:
+                mvs, albums = carousel_snapshot.get()
+            except ApiError:
+                # 取得に失敗した場合は空のまま表示し、カルーセル側で警告メッセージを出す。
+                mvs, albums = [], []
 
         # 取得したデータを使ってカルーセルを表示する。
         show_carousel("### ミュージックビデオ", mvs, "mv", key_prefix="mv")
@@ -218,13 +293,17 @@ def show_home():
         st.markdown("---")  # 太い区切り線
 
         st.markdown("## ジャンルから探す")
-        genre_artworks = fetch_genre_artworks(GENRES)
+        try:
+            genre_artworks = genre_artwork_snapshot.get()
+        except ApiError:
+            # アートワークが取得できなくても、ジャンルカード自体は表示する。
+            genre_artworks = {}
         # st.columns(4)で、表示領域を4つの列に分割する。
         cols = st.columns(4)
         for i, genre in enumerate(GENRES):
             # i % 4 の結果 (0, 1, 2, 3) を使って、各ジャンルを4つの列に順番に配置する。
             with cols[i % 4]:
-                artwork_url = genre_artworks.get(genre["term"], "")
+                artwork_url = artwork_css_url(genre_artworks.get(genre["term"], ""), 300)
                 # HTMLとCSSを直接記述して、ジャンルカードを作成する。
                 # 背景画像にアートワークを設定し、クリックするとそのジャンルの検索結果ページに飛ぶようにする。
                 st.markdown(
@@ -8,8 +8,19 @@ APIから取得した楽曲リストを表示し、絞り込み、ソート、
 
 # --- モジュールのインポート ---
 import streamlit as st
-from utils.api_client import search_music, search_mv_for_term  # API通信用の関数
-from utils.helpers import sort_results  # ソート処理用のヘルパー関数
+from config import RESULTS_PAGE_SIZE, SEARCH_PAGE_SIZE  # 一度に表示する楽曲数、1回の通信で取得する楽曲数
+from utils.api_client import (  # API通信用の関数
+    search_songs_with_mvs,
+    search_first_mv,
+    has_next_page,
+    did_you_mean,
+    artwork_image,
+    ApiError,
+)
+from utils.helpers import SortedViews, normalize_query  # 並び順ごとのソート結果、検索キーワードの正規化
+from utils.session_store import get_session_store  # 上限付きのセッションストア
+from utils.search_index import ResultIndex  # 結果内絞り込み用の索引
+from utils.typeahead import KIND_ARTIST  # キーワードの候補の種類
 
 
 # --- 検索結果をフィルタリングする関数 ---
@@ -19,86 +30,112 @@ def filter_results_by_type(results, term, search_type):
     役割: 検索の精度を高める。例えば「Apple」でアーティスト検索した際に、
          曲名に「Apple」が含まれる曲が結果から除外される。
     """
-    term_lower = term.lower()  # 検索キーワードを小文字に変換（大文字・小文字を区別しないため）
+    # 検索キーワードと比較する名前を正規化する（全角・半角、大文字・小文字、空白の違いを区別しないため）。
+    # キーワードと名前の両方を正規化して比べるため、「ＹＯＡＳＯＢＩ」で検索しても結果が除外されない。
+    term_normalized = normalize_query(term)
     if search_type == "曲名":
-        return [item for item in results if term_lower in item.get("trackName", "").lower()]
+        return [item for item in results if term_normalized in normalize_query(item.track_name)]
     elif search_type == "アーティスト名":
-        return [item for item in results if term_lower in item.get("artistName", "").lower()]
+        return [item for item in results if term_normalized in normalize_query(item.artist_name)]
     else:
         # ジャンル検索などの場合はフィルタリングせず、全ての結果を返す。
         return results
 
 
 # --- 個々の楽曲アイテムを表示するための内部関数 ---
+# @st.fragment により、行の中の操作（詳細の開閉など）ではこの行だけが再実行・再送信され、
+# 他の行やサイドバーは作り直されない。
+@st.fragment
 def _display_song_item(item):
     """
     目的: 検索結果リストの中の一つの楽曲アイテムを描画する。
-    役割: 曲名、アーティスト名、アートワーク、再生ボタン、詳細情報（Expander内）を表示する。
+    役割: 曲名、アーティスト名、アートワーク、再生ボタン、詳細情報（トグルで開閉）を表示する。
          詳細情報が開かれたタイミングで、関連MVを検索・表示する。
     """
-    # 楽曲情報がない場合に備え、.get()で安全に値を取得する。
-    track_name = item.get('trackName', 'タイトルなし')
-    artist_name = item.get('artistName', 'アーティスト不明')
-    preview_url = item.get("previewUrl")
+    # 楽曲情報が空の場合に備え、「or」でデフォルト値を指定する。
+    track_name = item.track_name or 'タイトルなし'
+    artist_name = item.artist_name or 'アーティスト不明'
+    preview_url = item.preview_url
 
     def handle_play_button():
         """「再生」ボタンが押された時の処理をまとめた関数"""
         st.session_state.now_playing = item  # 現在再生中の曲としてセッションに保存
         st.session_state.autoplay = True  # 音楽コントローラーで自動再生をトリガーするフラグ
+        # 音楽コントローラーはこの行の外（サイドバー）にあり、行だけの再実行では更新されない。
+        # Streamlitは他のフラグメントだけを指定して再実行できないため、ここはアプリ全体を再実行する。
+        st.rerun(scope="app")
 
     # st.container()で、この楽曲アイテムに関連するUI要素をグループ化する。
     with st.container():
         # [アートワーク, 曲情報, 再生ボタン] の3列レイアウトを作成
         cols_item = st.columns([1, 4, 1])
         with cols_item[0]:
-            st.image(item.get("artworkUrl100"), width=80)
+            st.image(artwork_image(item.artwork_url, 80), width=80)
         with cols_item[1]:
             st.markdown(f"**{track_name}**")
             st.caption(artist_name)
         with cols_item[2]:
             # プレビューURLがある場合のみ再生ボタンを表示する。
             if preview_url:
-                st.button("再生️", key=f"play_{item['trackId']}", on_click=handle_play_button)
+                # st.rerun() はコールバック(on_click)の中では使えないため、ボタンの戻り値で判定する。
+                if st.button("再生️", key=f"play_{item.track_id}"):
+                    handle_play_button()
 
-        # st.expander()で、クリックすると開閉する詳細情報セクションを作成する。
-        with st.expander(" 詳細"):
+        # 詳細情報セクションは、トグルがONになっている行だけ描画する。
+        # st.expander()は閉じていても中身が毎回実行されるため、全ての行でMV検索が走ってしまう。
+        # トグルの状態はサーバー側で分かるので、ユーザーが開いた行だけを処理できる。
+        if not st.toggle("詳細", key=f"details_{item.track_id}"):
+            return
+
+        with st.container(border=True):
             col1, col2 = st.columns([1, 2])
             with col1:
-                # より高解像度のアートワークを表示
-                st.image(item.get("artworkUrl100").replace("100x100", "300x300"), width=150)
+                # 詳細用の150pxのアートワークを表示
+                st.image(artwork_image(item.artwork_url, 150), width=150)
                 if preview_url:
-                    st.button("再生", key=f"play_{item['trackId']}_detail", on_click=handle_play_button,
-                              use_container_width=True)
+                    if st.button("再生", key=f"play_{item.track_id}_detail", use_container_width=True):
+                        handle_play_button()
             with col2:
                 # 楽曲のテキスト情報を表示
                 st.markdown(f"### {track_name}")
                 st.markdown(f"**アーティスト**: {artist_name}")
-                st.markdown(f"**アルバム**: {item.get('collectionName', '不明')}")
-                if item.get("trackPrice"):
-                    st.markdown(f"**価格**: ¥{int(item.get('trackPrice'))}")
-                if item.get("trackViewUrl"):
-                    st.markdown(f"[Apple Musicで見る]({item.get('trackViewUrl')})", unsafe_allow_html=True)
+                st.markdown(f"**アルバム**: {item.collection_name or '不明'}")
+                if item.track_price:
+                    st.markdown(f"**価格**: ¥{int(item.track_price)}")
+                if item.track_view_url:
+                    st.markdown(f"[Apple Musicで見る]({item.track_view_url})", unsafe_allow_html=True)
 
             # --- MVのオンデマンド取得と表示 ---
             st.divider()
             st.markdown("#### ミュージックビデオ")
-            # 各楽曲ごとにMVデータをセッションに保存するためのユニークなキーを定義
-            mv_key = f"mv_data_{item['trackId']}"
-            # セッションにMVデータがまだ保存されていない場合（＝初めてExpanderが開かれた時）
-            if mv_key not in st.session_state:
+            # 各楽曲のMVデータは、件数とメモリ量の上限付きのセッションストアに、トラックIDをキーとして保存する。
+            # 上限を超えると長く開かれていない曲のデータから捨てられ、次に開いた時に再検索される。
+            store = get_session_store()
+            # 検索時にまとめて取得・照合済みのMVがあれば、それを使う（追加の通信は発生しない）。
+            mv_index = st.session_state.get("mv_index", {})
+            if item.track_id in mv_index:
+                matching_mv = mv_index[item.track_id]
+            # 照合で見つからず、セッションストアにMVデータもまだ保存されていない場合（＝初めて詳細が開かれた時）
+            elif ("mv", item.track_id) not in store:
                 with st.spinner("ミュージックビデオを検索中..."):
                     # 曲名とアーティスト名を組み合わせて、より精度の高い検索キーワードを作成
                     mv_term = f"{track_name} {artist_name}"
-                    matching_mv = search_mv_for_term(mv_term)
-                    # 検索結果（見つからなかった場合はNone）をセッションに保存
-                    st.session_state[mv_key] = matching_mv
+                    try:
+                        # 検索結果はレスポンスキャッシュに保存されるため、他のユーザーが開いた曲なら通信は発生しない。
+                        matching_mv = search_first_mv(mv_term)
+                    except ApiError:
+                        # 通信エラーの場合はセッションに保存せず、次に開いた時に再検索する。
+                        st.caption("ミュージックビデオの検索に失敗しました。")
+                        return
+                    # 検索結果（見つからなかった場合はNone）をセッションストアに保存
+                    store.set("mv", item.track_id, matching_mv)
             else:
-                # 既にデータがあれば、API検索は行わずセッションから読み込む。
-                matching_mv = st.session_state[mv_key]
+                # 既にデータがあれば、API検索は行わずセッションストアから読み込む。
+                matching_mv = store.get("mv", item.track_id)
 
             # MVが見つかった場合
             if matching_mv:
-                mv_preview_url = matching_mv.get("previewUrl")
+                mv_preview_url = matching_mv.preview_url
                 if mv_preview_url:
                     st.video(mv_preview_url)  # ビデオプレーヤーで表示
                 else:
@@ -107,27 +144,47 @@ def _display_song_item(item):
                 st.caption("ミュージックビデオは見つかりませんでした。")
 
 
+# --- 検索結果と絞り込み用の索引・ソート結果を保存・取得する関数 ---
+def _store_results(songs):
+    """
+    目的: 表示する楽曲リストをセッションに保存する。
+    役割: 同時に結果内絞り込み用の索引と、並び順ごとのソート結果の置き場を作り、
+         キーワードの入力や並び順の切り替えのたびに使い回せるようにする。
+    """
+    st.session_state["filtered_results"] = songs
+    st.session_state["filter_index"] = ResultIndex(songs)
+    st.session_state["sorted_views"] = SortedViews(songs)
+
+
+def _get_derived(state_key, factory, results):
+    """保存済みの索引（またはソート結果）を返す。別の楽曲リストのものであれば作り直す。"""
+    derived = st.session_state.get(state_key)
+    if derived is None or derived.items is not results:
+        derived = factory(results)
+        st.session_state[state_key] = derived
+    return derived
+
+
 # --- 楽曲リスト全体を表示する関数 ---
 def display_music_list(results):
     """
     目的: フィルタリングおよびソート済みの楽曲リストを画面に描画する。
     役割: 検索結果のヘッダー（タイトル）、絞り込み、ソートオプションを表示し、
          リスト内の各楽曲を _display_song_item を使ってループ表示する。
+         描画するのは先頭から RESULTS_PAGE_SIZE 件ずつで、残りは「さらに表示」ボタンで追加する。
+         これにより、結果の件数が多くても再描画のたびに作るUI要素の数は表示中の分だけで済む。
+         絞り込み中は、絞り込んだ結果を別の表示件数でページに分け、APIから続きのページを取得するかどうかは
+         絞り込む前の取得済みの件数で判断する（絞り込みで件数が減っても、取得済みの楽曲を飛ばして通信しない）。
     """
     term = st.session_state.get("search_term_backup", "")
     st.subheader(f'"{term}" の検索結果')
 
     # サイドバーの絞り込みキーワードで、表示する楽曲をさらにフィルタリングする。
+    # 検索結果を保存した時に作った索引を引くだけなので、1文字入力するたびに全件を調べ直すことはない。
     songs_to_display = results
     filter_keyword_from_state = st.session_state.get("filter_keyword_sidebar", "")
     if filter_keyword_from_state:
-        keyword_lower = filter_keyword_from_state.lower()
-        songs_to_display = [
-            item for item in songs_to_display
-            if keyword_lower in item.get("trackName", "").lower() or \
-               keyword_lower in item.get("artistName", "").lower() or \
-               keyword_lower in item.get("collectionName", "").lower()
-        ]
+        songs_to_display = _get_derived("filter_index", ResultIndex, results).search(filter_keyword_from_state)
 
     # 絞り込みの結果、表示する曲がなくなった場合のメッセージ
     if not songs_to_display:
@@ -142,12 +199,130 @@ def display_music_list(results):
         order = st.radio("順序", ["昇順", "降順"], horizontal=True)
 
     # 選択されたオプションに基づいて、ヘルパー関数でリストをソートする。
-    sorted_results = sort_results(songs_to_display, sort_mode, order)
+    # 並び順ごとのソート結果は一度作れば使い回されるため、ラジオボタンの切り替えではソートし直さない。
+    sorted_results = _get_derived("sorted_views", SortedViews, results).get(sort_mode, order)
+    if songs_to_display is not results:
+        # 絞り込み中は、全体のソート結果から一致した楽曲だけを取り出す（順番はそのまま保たれる）。
+        matched = {id(item) for item in songs_to_display}
+        sorted_results = [item for item in sorted_results if id(item) in matched]
+
+    has_more_pages = st.session_state.get("search_next_page") is not None
+    if songs_to_display is not results:
+        _display_filtered_page(sorted_results, filter_keyword_from_state, has_more_pages)
+        return
 
-    # ソートされたリストをループ処理し、各楽曲を表示する。
-    for item in sorted_results:
+    # 表示中の件数をセッションから取得し、その分だけを描画する（新しい検索のたびに先頭のページに戻る）。
+    visible_count = st.session_state.get("results_visible_count", RESULTS_PAGE_SIZE)
+    for item in sorted_results[:visible_count]:
         _display_song_item(item)
 
+    # まだ表示していない楽曲が残っている場合、またはAPIから続きのページを取得できる場合は、「さらに表示」ボタンを表示する。
+    if len(sorted_results) > visible_count or has_more_pages:
+        def show_more():
+            """「さらに表示」ボタンが押された時に、表示する件数を1ページ分増やす関数"""
+            new_count = visible_count + RESULTS_PAGE_SIZE
+            st.session_state.results_visible_count = new_count
+            # 取得済みの楽曲では足りなくなる場合は、次の再描画で続きのページを取得する。
+            if new_count >= len(sorted_results) and has_more_pages:
+                st.session_state.search_fetch_next = True
+
+        if has_more_pages:
+            st.caption(f"{min(visible_count, len(sorted_results))}件を表示しています（続きがあります）")
+        else:
+            st.caption(f"{len(sorted_results)}件中 {visible_count}件を表示しています")
+        st.button("さらに表示", on_click=show_more, use_container_width=True)
+
+
+def _display_filtered_page(matched_results, keyword, has_more_pages):
+    """
+    目的: 絞り込み中の楽曲リストを、絞り込みのキーワードごとの表示件数で描画する。
+    役割: 表示件数は絞り込まない時の表示件数とは別に保存し、キーワードが変わったら先頭のページに戻す。
+         取得済みの楽曲で一致するものを全て表示した後、続きのページがある場合だけ、APIから続きを取得するボタンを表示する。
+    """
+    visible_keyword, visible_count = st.session_state.get("filter_visible", (None, RESULTS_PAGE_SIZE))
+    if visible_keyword != keyword:
+        visible_count = RESULTS_PAGE_SIZE
+    for item in matched_results[:visible_count]:
+        _display_song_item(item)
+
+    if len(matched_results) > visible_count:
+        def show_more_matches():
+            """絞り込み中に「さらに表示」ボタンが押された時に、絞り込んだ結果の表示件数だけを1ページ分増やす関数"""
+            st.session_state.filter_visible = (keyword, visible_count + RESULTS_PAGE_SIZE)
+
+        st.caption(f"絞り込んだ{len(matched_results)}件中 {visible_count}件を表示しています")
+        st.button("さらに表示", on_click=show_more_matches, use_container_width=True)
+    elif has_more_pages:
+        def search_next_page():
+            """取得済みの楽曲を全て表示した後に、APIから続きのページを取得して、その中からも絞り込む関数"""
+            st.session_state.search_fetch_next = True
+
+        st.caption(f"取得済みの楽曲のうち{len(matched_results)}件が一致しました（続きがあります）")
+        st.button("続きの楽曲からも探す", on_click=search_next_page, use_container_width=True)
+
+
+# --- 検索結果の続きのページを取得する関数 ---
+def _load_next_page(term, search_type):
+    """
+    目的: 検索結果の続きのページをAPIから取得し、セッションの楽曲リストの末尾に追加する。
+    役割: 1ページ目の表示を速くするため、2ページ目以降は「さらに表示」で必要になった時点で取得する。
+         検索タイプによる絞り込みで1件も残らなかったページは読み飛ばし、次のページを取得する。
+    """
+    known_ids = {song.track_id for song in st.session_state.get("filtered_results", [])}
+    while st.session_state.get("search_next_page") is not None:
+        page = st.session_state["search_next_page"]
+        with st.spinner("続きの楽曲を取得中..."):
+            song_query, mv_index = search_songs_with_mvs(term, offset=page * SEARCH_PAGE_SIZE)
+        if not song_query.ok:
+            # ページ番号はそのまま残し、次に「さらに表示」が押された時に再取得する。
+            st.caption("続きの楽曲の取得に失敗しました。時間をおいて再度お試しください。")
+            return
+        st.session_state["search_next_page"] = page + 1 if has_next_page(song_query, page) else None
+        # ページの境目で結果が入れ替わっていた場合に備え、既に表示している楽曲は除く。
+        new_songs = [
+            song for song in filter_results_by_type(song_query.results, term, search_type)
+            if song.track_id not in known_ids
+        ]
+        if not new_songs:
+            continue
+        _store_results(st.session_state.get("filtered_results", []) + new_songs)
+        st.session_state["mv_index"] = {
+            **st.session_state.get("mv_index", {}),
+            **{song.track_id: mv_index[song.track_id] for song in new_songs if song.track_id in mv_index},
+        }
+        return
+
+
+# --- 「もしかして」の候補を表示する関数 ---
+def _start_search(term, search_type):
+    """候補のボタンが押された時に、その名前で新しく検索し直すための関数"""
+    st.session_state.search_term = term
+    st.session_state.search_term_backup = term
+    st.session_state.search_type = search_type
+    # 古い検索結果と、その索引・ソート結果を削除して、次の再描画で検索が実行されるようにする。
+    st.session_state.pop("filtered_results", None)
+    st.session_state.pop("filter_index", None)
+    st.session_state.pop("sorted_views", None)
+
+
+def _show_did_you_mean(term):
+    """
+    目的: 検索結果が空だった場合に、「もしかして」の候補を表示する。
+    役割: これまでに取得したアーティスト名・曲名の索引から候補を探すため、APIへの通信は発生しない。
+         打ち間違えたキーワードでも、正しく入力できた先頭部分から候補を見つけられる。
+    """
+    suggestions = [
+        (name, kind) for name, kind in did_you_mean(term)
+        if normalize_query(name) != normalize_query(term)
+    ]
+    if not suggestions:
+        return
+    st.markdown("#### もしかして")
+    for name, kind in suggestions:
+        search_type = "アーティスト名" if kind == KIND_ARTIST else "曲名"
+        st.button(f"{name}（{search_type}）", key=f"suggest_{kind}_{name}", on_click=_start_search,
+                  args=(name, search_type))
+
 
 # --- 検索結果ページ全体の表示を管理するメイン関数 ---
 def show_search_results():
@@ -165,14 +340,37 @@ def show_search_results():
     # セッションにフィルタリング済みの検索結果が保存されていない場合（＝新しい検索が実行された直後）
     if "filtered_results" not in st.session_state:
         with st.spinner(f'"{term}" を検索中...'):
-            # APIを叩いて楽曲を検索する。
-            song_results = search_music(term, entity="song")
-            # 検索タイプに応じて結果をフィルタリングする。
-            filtered_songs = filter_results_by_type(song_results, term, search_type)
-            # 処理後の結果をセッションに保存する。これにより、ソート順変更などの再描画時にAPI検索が再実行されるのを防ぐ。
-            st.session_state["filtered_results"] = filtered_songs
+            # APIを叩いて楽曲を検索する。関連MVも同時に取得し、楽曲と照合した結果(trackId→MV)を受け取る。
+            song_query, mv_index = search_songs_with_mvs(term)
+
+        # 通信エラーの場合は結果をセッションに保存せず、次の再描画で再検索できるようにする。
+        # （エラーはAPIクライアント側で短時間だけキャッシュされるため、再描画のたびに通信が発生することはない）
+        if not song_query.ok:
+            st.error("楽曲の検索に失敗しました。時間をおいて再度お試しください。")
+            return
+
+        # 検索タイプに応じて結果をフィルタリングする。
+        filtered_songs = filter_results_by_type(song_query.results, term, search_type)
+        # 新しい検索結果は先頭のページから表示する。
+        st.session_state["results_visible_count"] = RESULTS_PAGE_SIZE
+        st.session_state.pop("filter_visible", None)
+        # 続きのページがあれば、その番号を保存しておく（「さらに表示」で必要になった時に取得する）。
+        st.session_state["search_next_page"] = 1 if has_next_page(song_query, 0) else None
+        st.session_state.pop("search_fetch_next", None)
+        # 処理後の結果をセッションに保存する。これにより、ソート順変更などの再描画時にAPI検索が再実行されるのを防ぐ。
+        _store_results(filtered_songs)
+        st.session_state["mv_index"] = {
+            song.track_id: mv_index[song.track_id] for song in filtered_songs if song.track_id in mv_index
+        }
+
+    # 「さらに表示」で取得済みの楽曲を表示しきった場合は、続きのページを取得して末尾に追加する。
+    if st.session_state.pop("search_fetch_next", False):
+        _load_next_page(term, search_type)
 
     # セッションから表示すべき楽曲リストを取得する。
     filtered = st.session_state.get("filtered_results", [])
     # 楽曲リスト表示関数を呼び出す。
-    display_music_list(filtered)
\ No newline at end of file
+    display_music_list(filtered)
+    # 該当する楽曲がなかった場合は、キーワードの候補を表示する。
+    if not filtered and term:
+        _show_did_you_mean(term)
\ No newline at end of file
@@ -21,4 +21,151 @@ GENRES = [
 
 # --- ホーム画面のカルーセルで一度に取得するアイテム数の上限 ---
 # この値を変更することで、APIから取得するミュージックビデオやアルバムの数を調整できます。
-CAROUSEL_ITEM_LIMIT = 10
\ No newline at end of file
+CAROUSEL_ITEM_LIMIT = 10
+
+# --- ホーム画面のカルーセルで、ランダムに選んだジャンルに加えて毎回検索するキーワード ---
+CAROUSEL_FIXED_TERMS = ["J-Pop", "Rock", "Anime", "最新"]
+
+# --- 検索結果画面で一度に表示する楽曲数 ---
+# 最初はこの件数だけを表示し、「さらに表示」ボタンが押されるたびに同じ件数ずつ追加で表示する。
+RESULTS_PAGE_SIZE = 20
+
+# --- iTunes APIとのHTTP通信設定 ---
+# 全てのリクエストで共有するHTTPクライアントの設定値。
+# 接続を使い回す（Keep-Alive）ことで、検索のたびにTCP/TLSの接続確立を行うコストを省く。
+HTTP_TIMEOUT = 10.0  # 1リクエストあたりのタイムアウト秒数
+HTTP_MAX_CONNECTIONS = 20  # 同時に開いておける接続数の上限
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10  # 再利用のために保持しておくアイドル接続数の上限
+HTTP_KEEPALIVE_EXPIRY = 30.0  # アイドル接続を保持しておく秒数
+# HTTP/2を使う場合はTrueにする。利用には追加ライブラリ(h2)が必要: pip install "httpx[http2]"
+HTTP2_ENABLED = False
+# レスポンスの本文を圧縮して受け取る形式。転送量と受信にかかる時間を減らす。
+# httpxが展開できる形式だけを指定すること（"br" には brotli、"zstd" には zstandard の追加ライブラリが必要）。
+HTTP_ACCEPT_ENCODING = "gzip, deflate"
+
+# 一括検索(search_music_batch)で同時に実行するリクエスト数の上限
+BATCH_MAX_CONCURRENCY = 8
+
+# 検索結果の楽曲と照合するために、まとめて取得するミュージックビデオの件数（APIの上限は200件）
+MV_JOIN_FETCH_LIMIT = 200
+
+# --- 検索結果のページ分割 ---
+# 楽曲の検索結果は SEARCH_PAGE_SIZE 件ずつ取得し、「さらに表示」で表示しきれなくなった時点で次のページを取得する。
+SEARCH_PAGE_SIZE = 50  # 1回の通信で取得する件数
+SEARCH_MAX_RESULTS = 200  # 1つのキーワードで取得する件数の上限（iTunes APIが返せる上限は200件）
+
+# --- iTunes APIのレスポンスから残す項目 ---
+# レスポンスは届いた分から1件ずつ読み込み、entityごとにここに並べた項目だけを残す（キャッシュにもこの項目だけが保存される）。
+# 画面やキーワードの候補で使う項目を増やす場合は、ここにも追加すること（utils/records.py の FIELD_MAP を参照）。
+# ここにないentityでは、FIELD_MAP の全ての項目を残す。
+RESULT_FIELDS = {
+    "song": (
+        "trackId", "collectionId", "trackName", "artistName", "collectionName", "artworkUrl100",
+        "previewUrl", "trackViewUrl", "collectionViewUrl", "trackPrice",
+    ),
+    "musicVideo": (
+        "trackId", "collectionId", "trackName", "artistName", "collectionName", "artworkUrl100",
+        "previewUrl", "trackViewUrl", "collectionViewUrl", "trackPrice",
+    ),
+    # アルバムには曲名・試聴URLなどがないため、アルバムの項目だけを残す。
+    "album": ("collectionId", "artistName", "collectionName", "artworkUrl100", "collectionViewUrl"),
+}
+
+# --- APIレスポンスキャッシュの設定 ---
+# キャッシュの保存先。"memory"はプロセス内メモリ、"sqlite"はディスク上のファイル。
+# "sqlite"にすると、複数のStreamlitワーカープロセスで同じキャッシュを共有でき、再起動後もキャッシュが残る。
+CACHE_BACKEND = "sqlite"
+CACHE_PATH = ".cache/itunes_responses.sqlite3"  # "sqlite"の場合の保存先ファイル
+CACHE_MAX_BYTES = 64 * 1024 * 1024  # キャッシュに保存するデータ量の上限(バイト)
+CACHE_DEFAULT_TTL = 3600  # 有効期限(秒)。下のCACHE_TTLSに設定のない種類に使われる
+# 検索対象の種類(entity)ごとの有効期限(秒)
+CACHE_TTLS = {
+    "song": 6 * 3600,
+    "musicVideo": 12 * 3600,
+    "album": 12 * 3600,
+}
+# 通信は成功したが該当する結果がなかった場合の有効期限(秒)
+CACHE_EMPTY_TTL = 600
+# タイムアウトや5xxなどのエラーの有効期限(秒)。この間は同じ検索をAPIに再送せず、期限が切れたら再び問い合わせる。
+CACHE_ERROR_TTL = 30
+# 有効期限が切れた結果を、APIの障害時の代わりとして残しておく秒数。
+# APIがエラーを返した時やサーキットブレーカーが開いている時は、この期間内の古い結果を表示する。
+# エラーの時は古い結果を CACHE_ERROR_TTL の間だけ有効にして保存し直すため、障害が続く間は古い結果の保存期間も延びる。
+CACHE_STALE_TTL = 24 * 3600
+
+# --- iTunes APIのレート制限への対策 ---
+# iTunes Search APIは1つのIPアドレスあたり毎分20回程度で制限がかかるため、プロセス全体で送信ペースを抑える。
+RATE_LIMIT_PER_MINUTE = 20  # 1分あたりに送信できるリクエスト数。0以下にすると制限しない
+RATE_LIMIT_BURST = 10  # 間を空けずに連続して送信できるリクエスト数
+RATE_LIMIT_BACKOFF_BASE = 5.0  # 403/429を受け取った時に送信を停止する秒数（初回）
+RATE_LIMIT_BACKOFF_MAX = 120.0  # 403/429が続いた時に送信を停止する秒数の上限
+RATE_LIMIT_MAX_RETRIES = 1  # 403/429を受け取ったリクエストを再送する回数
+
+# --- 検索キーワードの正規化 ---
+# 表記の違うキーワード（全角・半角、大文字・小文字、空白）を1つにまとめてキャッシュする。
+# どの表記がどのキーワードにまとめられたかを統計情報として記録する、キーワード数の上限。
+QUERY_VARIANT_STATS_MAX_KEYS = 1000
+
+# --- 検索キーワードの候補 ---
+# これまでに取得したアーティスト名・曲名から、キーワードの候補（もしかして）をAPIに問い合わせずに表示する。
+SUGGEST_INDEX_PATH = ".cache/suggestions.json"  # 候補の索引の保存先（レスポンスキャッシュと同じディレクトリ）
+# 索引に登録する名前の数の上限。上限に達したら、最も長く取得されていない名前から削除する。
+# 名前1件あたり約300〜400バイトのメモリを使う（10,000件で約3〜4MB。起動時の読み込みは裏側のスレッドで0.1秒ほど）。
+SUGGEST_MAX_NAMES = 10000
+SUGGEST_SAVE_INTERVAL = 300  # 索引をファイルに保存する間隔(秒)。プロセスの終了時にも保存する
+
+# --- ホーム画面のデータの更新間隔 ---
+# カルーセルとジャンルのアートワークは、古いデータを表示しながら裏側で作り直す。
+CAROUSEL_REFRESH_INTERVAL = 3600  # カルーセルのデータを作り直す間隔(秒)
+GENRE_ARTWORK_REFRESH_INTERVAL = 6 * 3600  # ジャンルのアートワークを作り直す間隔(秒)
+HOME_REFRESH_RETRY_INTERVAL = 60  # 作り直しに失敗した場合に、再挑戦するまでの秒数
+
+# --- セッションごとに保存するデータの上限 ---
+# 関連MVの検索結果やカルーセルのページ番号は、セッションごとのLRUストアに保存し、上限を超えたら古いものから捨てる。
+SESSION_STORE_MAX_ENTRIES = 200  # 1セッションあたりに保存する件数の上限
+SESSION_STORE_MAX_BYTES = 256 * 1024  # 1セッションあたりに保存するデータ量(見積もり)の上限(バイト)
+
+# --- アートワークの縮小画像のキャッシュ ---
+# アートワークは一度だけダウンロードし、表示枠ごとの大きさに縮小してディスクに保存しておく。
+# 保存先は Streamlit の静的ファイル配信(.streamlit/config.toml の enableStaticServing)で配信される static/ の下に置く。
+ARTWORK_CACHE_DIR = "static/artwork"
+ARTWORK_STATIC_URL = "app/static/artwork"  # 上記のディレクトリを配信するURL（ページからの相対パス）
+ARTWORK_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 保存する縮小画像の合計サイズの上限(バイト)
+ARTWORK_SIZES = (80, 150, 300)  # 作成する縮小画像の大きさ(px)。検索結果の行: 80、詳細: 150、カード: 300
+ARTWORK_JPEG_QUALITY = 85  # 縮小画像のJPEGの画質
+ARTWORK_RETRY_INTERVAL = 300  # ダウンロードに失敗した画像を、再びダウンロードするまでの秒数
+# 同時にダウンロードする画像の数の上限。検索と同じ接続プール(HTTP_MAX_CONNECTIONS)を使うため、検索の接続を使い切らないよう少なくする。
+ARTWORK_DOWNLOAD_CONCURRENCY = 4
+
+# --- 処理時間の計測 ---
+# APIの取得、キャッシュの確認、並べ替え、アプリ全体の再実行にかかった時間と回数を記録する。
+# 無効にしている場合、計測箇所はほとんど負担にならない。
+METRICS_ENABLED = False
+METRICS_ADMIN_PANEL = False  # Trueならサイドバーに計測結果のパネルを表示する（METRICS_ENABLED がTrueの場合のみ）
+METRICS_DUMP_PATH = ".cache/metrics.prom"  # 計測結果をPrometheusのテキスト形式で書き出すファイル。空文字なら書き出さない
+METRICS_DUMP_INTERVAL = 60  # ファイルに書き出す間隔(秒)。プロセスの終了時にも書き出す
+
+# --- iTunes APIのレスポンスの記録と再生 ---
+# "record" にすると、APIへのリクエストとレスポンスの組を全てアーカイブに記録する。
+# "replay" にすると、ネットワークに接続せず、アーカイブに記録したレスポンスを返す（ベンチマークや、APIに接続できない環境で使う）。
+ITUNES_ARCHIVE_MODE = "off"  # "off" / "record" / "replay"
+ITUNES_ARCHIVE_PATH = ".cache/itunes_archive.sqlite3"  # アーカイブの保存先
+ITUNES_REPLAY_MATCH = "normalized"  # 再生時の照合方式。"exact"（完全一致）または "normalized"（キーワードを正規化し、件数は要求以上）
+ITUNES_REPLAY_LATENCY = 0.0  # 再生時にレスポンスを返すまでに待つ秒数。"recorded" なら記録した時の応答時間だけ待つ
+
+# --- 応答の遅れ・障害への対策 ---
+# ヘッジリクエスト: 最初のリクエストが直近の応答時間の p95 を過ぎても返ってこなければ、同じリクエストをもう1つ送り、
+# 先に返ってきた方を使う。ごく一部の遅いリクエストに画面全体が待たされるのを防ぐ。
+# 追加の送信はレート制限の送信枠がすぐに使える場合だけ行うため、APIへの送信ペースの上限は変わらない。
+HEDGE_ENABLED = True
+HEDGE_QUANTILE = 0.95  # ヘッジを送るまでの待ち時間に使う、直近の応答時間の分位点
+HEDGE_MIN_DELAY = 0.3  # ヘッジを送るまでの待ち時間の下限(秒)。速い応答の揺らぎで無駄に送らないようにする
+HEDGE_DEFAULT_DELAY = 2.0  # 応答時間の記録が HEDGE_MIN_SAMPLES 件に満たない間の待ち時間(秒)
+HEDGE_MIN_SAMPLES = 20  # 分位点を使うのに必要な応答時間の記録数
+HEDGE_WINDOW = 200  # 分位点の計算に使う、直近の応答時間の記録数（entityごと）
+# サーキットブレーカー: entityごとに、直近の失敗の割合が閾値を超えたらしばらくAPIへの送信を止め、
+# 応答を待たずにキャッシュの古い結果（なければエラー）を返す。
+CIRCUIT_FAILURE_RATIO = 0.5  # 送信を止める失敗の割合(0〜1)
+CIRCUIT_MIN_REQUESTS = 10  # 失敗の割合を判定するのに必要な、直近のリクエスト数
+CIRCUIT_WINDOW_SECONDS = 60  # 失敗の割合を数える期間(秒)
+CIRCUIT_OPEN_SECONDS = 30  # 送信を止めてから、試しに1件送信するまでの秒数
@@ -9,103 +9,1081 @@ iTunes Search APIとの全ての通信を専門に担当するモジュール。
 """
 
 # --- モジュールのインポート ---
-import streamlit as st
 import httpx  # 高速な非同期HTTPリクエストを実現するためのライブラリ
 import asyncio # 非同期処理（複数の処理を同時に進める仕組み）を扱うためのライブラリ
+import json  # キャッシュのキーを作成するために使用
+import atexit  # プロセス終了時に後片付けの処理を登録するためのライブラリ
+import threading  # バックグラウンドでイベントループを動かすためのスレッドを扱うライブラリ
+import time  # 応答時間を計るために使用
+import functools  # キャッシュの操作をスレッドプールに渡すために使用
+import sqlite3  # アーカイブへの記録の失敗を判定するために使用
+from typing import NamedTuple
+from config import (
+    HTTP_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    HTTP_ACCEPT_ENCODING,
+    BATCH_MAX_CONCURRENCY,
+    MV_JOIN_FETCH_LIMIT,
+    SEARCH_PAGE_SIZE,
+    SEARCH_MAX_RESULTS,
+    RESULT_FIELDS,
+    CACHE_BACKEND,
+    CACHE_PATH,
+    CACHE_MAX_BYTES,
+    CACHE_DEFAULT_TTL,
+    CACHE_TTLS,
+    CACHE_EMPTY_TTL,
+    CACHE_ERROR_TTL,
+    CACHE_STALE_TTL,
+    RATE_LIMIT_PER_MINUTE,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_BACKOFF_BASE,
+    RATE_LIMIT_BACKOFF_MAX,
+    RATE_LIMIT_MAX_RETRIES,
+    QUERY_VARIANT_STATS_MAX_KEYS,
+    SUGGEST_INDEX_PATH,
+    SUGGEST_MAX_NAMES,
+    SUGGEST_SAVE_INTERVAL,
+    ARTWORK_CACHE_DIR,
+    ARTWORK_STATIC_URL,
+    ARTWORK_CACHE_MAX_BYTES,
+    ARTWORK_SIZES,
+    ARTWORK_JPEG_QUALITY,
+    ARTWORK_RETRY_INTERVAL,
+    ARTWORK_DOWNLOAD_CONCURRENCY,
+    ITUNES_ARCHIVE_MODE,
+    ITUNES_ARCHIVE_PATH,
+    ITUNES_REPLAY_MATCH,
+    ITUNES_REPLAY_LATENCY,
+    HEDGE_ENABLED,
+    HEDGE_QUANTILE,
+    HEDGE_MIN_DELAY,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW,
+    CIRCUIT_FAILURE_RATIO,
+    CIRCUIT_MIN_REQUESTS,
+    CIRCUIT_WINDOW_SECONDS,
+    CIRCUIT_OPEN_SECONDS,
+)
+from utils.helpers import build_mv_index, clean_query, normalize_query
+from utils.response_cache import ResponseCache, create_backend
+from utils.rate_limiter import RateLimiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from utils.typeahead import SuggestionIndex
+from utils.artwork_cache import ArtworkCache
+from utils.response_archive import ResponseArchive
+from utils.resilience import LatencyTracker, CircuitBreaker, STATE_VALUES
+from utils.records import Track, FIELD_MAP, project_results
+from utils.json_stream import ResultStreamDecoder
+from utils.metrics import timer, inc, gauge
 
 # --- 定数の定義 ---
 # iTunes APIのベースURL。変更されることがないため、大文字のスネークケースで定数として定義する。
 ITUNES_API_BASE = "https://itunes.apple.com/search"
+# 検索対象国のデフォルト値。
+DEFAULT_COUNTRY = "JP"
+
+# --- プロセス全体で共有する通信リソース ---
+# Streamlitは利用者ごと・再実行ごとに別スレッドでスクリプトを動かすため、
+# イベントループとHTTPクライアントをここで一つだけ用意し、全てのスレッドから使い回す。
+_loop: asyncio.AbstractEventLoop | None = None  # バックグラウンドで動き続けるイベントループ
+_loop_thread: threading.Thread | None = None  # 上記のループを動かしているスレッド
+_client: httpx.AsyncClient | None = None  # 接続プールを持つ共有HTTPクライアント
+_lock = threading.Lock()  # ループの起動・停止が複数スレッドから同時に行われないようにするロック
+
+# --- 重複リクエストの集約（シングルフライト）用の状態 ---
+# 実行中のリクエストを「正規化した検索条件」をキーにして保持する。
+# 全てのコルーチンは1つのループスレッド上で動くため、この辞書へのアクセスにロックは不要。
+_inflight: dict[tuple, asyncio.Task] = {}
+_coalescing_stats = {
+    "requests": 0,   # _fetch_musicが呼ばれた回数
+    "issued": 0,     # 実際にAPIへ送信したリクエスト数
+    "coalesced": 0,  # 実行中の同一リクエストに相乗りし、送信を省略できた回数
+}
+
+# --- 検索キーワードの正規化の統計 ---
+# 正規化後のキーワードごとに、まとめられた元の表記を記録する。統計は別スレッドからも読まれるためロックで保護する。
+_query_variants: dict[str, set] = {}
+_query_stats = {
+    "lookups": 0,  # _fetch_musicが呼ばれた回数
+    "folded": 0,   # 元の表記と正規化後のキーワードが異なっていた回数
+}
+_query_stats_lock = threading.Lock()
+
+# --- レスポンスキャッシュ ---
+# 初回利用時に config.py の設定に従って作成する。set_response_cache() で差し替えることもできる。
+_response_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+# --- キーワードの候補 ---
+# APIから取得したアーティスト名・曲名の索引。初回利用時に作成し、保存先のファイルは裏側のスレッドで読み込む。
+_suggestion_index: SuggestionIndex | None = None
+_suggestion_index_configured = False  # Trueなら _suggestion_index の値（Noneなら索引を使わない）をそのまま使う
+# 索引の作成を1回だけにするためのロック。ファイルの読み込み中は持たないため、キャッシュの取得を待たせない。
+_suggestion_lock = threading.Lock()
+
+# --- アートワークの縮小画像のキャッシュ ---
+# 初めて使われる時に ARTWORK_CACHE_DIR に作成する。
+_artwork_cache: ArtworkCache | None = None
+_artwork_cache_configured = False  # Trueなら _artwork_cache の値（Noneならキャッシュを使わない）をそのまま使う
+# ダウンロード中のアートワークのURL -> ダウンロードのタスク。同じ画像を同時に何度もダウンロードしないようにする。
+# ループ上でのみ読み書きするため、ロックは不要。
+_artwork_pending: dict[str, asyncio.Task] = {}
+# ダウンロードに失敗したアートワークのURL -> 失敗した時刻(ループの時計)。ARTWORK_RETRY_INTERVAL 秒の間は再び取得しない。
+_artwork_failed: dict[str, float] = {}
+# 同時にダウンロードする画像の数を制限するセマフォ。ループに紐づくため、ループ上で初めて使われる時に作成する。
+_artwork_semaphore: asyncio.Semaphore | None = None
+
+# --- レスポンスの記録と再生 ---
+# ITUNES_ARCHIVE_MODE が "record" / "replay" の場合に、初めて使われる時に作成する。
+_response_archive: ResponseArchive | None = None
+_response_archive_configured = False  # Trueなら _response_archive の値（Noneなら記録も再生もしない）をそのまま使う
+
+# --- 応答の遅れ・障害への対策 ---
+# entity -> 直近の応答時間。ヘッジリクエストを送るまでの待ち時間を決めるのに使う。
+_latency_trackers: dict[str, LatencyTracker] = {}
+# entity -> サーキットブレーカー。いずれもループ上でのみ読み書きするため、ロックは不要。
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+_hedge_stats = {
+    "sent": 0,  # 最初のリクエストが遅く、同じリクエストをもう1つ送った回数
+    "won": 0,   # 後から送ったリクエストの方が先に返ってきた回数
+    "skipped": 0,  # 送ろうとしたが、レート制限の送信枠がすぐに使えなかったため送らなかった回数
+}
+_stale_stats = {"served": 0}  # APIから取得できず、キャッシュの期限切れの結果を代わりに返した回数
+
+# APIへの送信を止めている間に返すエラーの内容
+CIRCUIT_OPEN_MESSAGE = "iTunes APIで障害が続いているため、一時的に問い合わせを止めています。"
+
+# --- レート制限 ---
+# APIへの送信ペースをプロセス全体で制限するリミッター。ループ上で初めて使われる時に作成する。
+_rate_limiter: RateLimiter | None = None
+_rate_limiter_configured = False  # Trueなら _rate_limiter の値（Noneなら制限なし）をそのまま使う
+
+
+def _http2_available() -> bool:
+    """HTTP/2通信に必要な追加ライブラリ(h2)がインストールされているかを確認する。"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    目的: 全てのAPI通信を実行する、長寿命のイベントループを取得する。
+    役割: 初回呼び出し時にだけ専用スレッドを起動し、その中でイベントループを動かし続ける。
+         以降の呼び出しでは同じループを返すため、リクエストごとのループ生成・破棄のコストがなくなる。
+    """
+    global _loop, _loop_thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            # daemon=Trueにすることで、このスレッドがプロセスの終了を妨げないようにする。
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="itunes-api-loop", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+async def _get_client() -> httpx.AsyncClient:
+    """
+    目的: 接続プール付きの共有HTTPクライアントを取得する。
+    役割: クライアントはイベントループに紐づくため、必ずバックグラウンドのループ上で作成する。
+         一度作成したクライアントは接続を保持し続け、次のリクエストで再利用される。
+    """
+    global _client
+    # このコルーチンは単一のループスレッド上でしか動かないため、ロックなしで安全に初期化できる。
+    if _client is None or _client.is_closed:
+        http2 = HTTP2_ENABLED and _http2_available()
+        if HTTP2_ENABLED and not http2:
+            print("Warning: h2 is not installed. Falling back to HTTP/1.1.")
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            http2=http2,
+            # 本文を圧縮して受け取る。展開は受け取りながら行われる(aiter_bytes)。
+            headers={"Accept-Encoding": HTTP_ACCEPT_ENCODING},
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
 
 
 def _run_async(async_func, *args, **kwargs):
     """
     目的: 非同期処理（async defで定義された関数）をStreamlitの同期的な処理フローから安全に呼び出すための補助関数。
-    役割: Streamlitの実行環境で非同期処理を実行しようとすると発生しがちな「イベントループ」関連のエラーを回避する。
-         既にイベントループが動いている場合はそれに乗り、動いていなければ新しく作って実行する。
+    役割: コルーチンを共有のバックグラウンドループに投入し、結果が返ってくるまで呼び出し元のスレッドで待つ。
+         どのスクリプトスレッドから呼ばれても同じループ・同じ接続プールが使われる。
+    """
+    future = asyncio.run_coroutine_threadsafe(async_func(*args, **kwargs), _get_loop())
+    return future.result()
+
+
+def shutdown():
+    """
+    目的: 共有HTTPクライアントとバックグラウンドのイベントループを安全に停止する。
+    役割: 保持している接続を閉じてからループとスレッドを終了させる。
+         プロセス終了時に自動で呼ばれるほか、テストやベンチマークから明示的に呼び出すこともできる。
+    """
+    global _loop, _loop_thread, _client, _rate_limiter, _rate_limiter_configured, _artwork_semaphore
+    with _lock:
+        loop, thread, client = _loop, _loop_thread, _client
+        _loop, _loop_thread, _client = None, None, None
+        # セマフォも停止するループに紐づくため、次回起動時に作り直す。
+        _artwork_semaphore = None
+        # リミッターは停止するループに紐づいた待ち状態を持つため、次回起動時に作り直す。
+        _rate_limiter, _rate_limiter_configured = None, False
+    # 候補の索引に保存していない変更があれば、次回の起動時に引き継げるよう保存する。
+    index = _suggestion_index
+    if index is not None and index.stats()["dirty"]:
+        _save_suggestions(index)
+    if loop is None or loop.is_closed():
+        return
+    if client is not None and not client.is_closed:
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        except Exception as e:
+            print(f"HTTPクライアントの終了処理でエラーが発生しました: {e}")
+    try:
+        # スレッドプールで実行中の保存（候補の索引、アーカイブへの記録、アートワーク）が終わるのを待つ。
+        asyncio.run_coroutine_threadsafe(loop.shutdown_default_executor(), loop).result(timeout=5)
+    except Exception as e:
+        print(f"スレッドプールの終了処理でエラーが発生しました: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+    if thread is not None:
+        thread.join(timeout=5)
+    loop.close()
+
+
+# Pythonプロセスが終了する際に、自動でshutdown()が呼ばれるように登録する。
+atexit.register(shutdown)
+
+
+def _get_rate_limiter() -> RateLimiter | None:
+    """
+    プロセス全体で共有するレートリミッターを返す。
+    RATE_LIMIT_PER_MINUTE が0以下の場合、または set_rate_limiter(None) された場合はNone（制限なし）を返す。
+    """
+    global _rate_limiter, _rate_limiter_configured
+    if not _rate_limiter_configured:
+        if RATE_LIMIT_PER_MINUTE > 0:
+            _rate_limiter = RateLimiter(
+                RATE_LIMIT_PER_MINUTE,
+                RATE_LIMIT_BURST,
+                backoff_base=RATE_LIMIT_BACKOFF_BASE,
+                backoff_max=RATE_LIMIT_BACKOFF_MAX,
+            )
+        _rate_limiter_configured = True
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: RateLimiter | None) -> None:
+    """レートリミッターを差し替える。Noneを渡すと制限なしになる（ベンチマークなどで利用する）。"""
+    global _rate_limiter, _rate_limiter_configured
+    _rate_limiter, _rate_limiter_configured = limiter, True
+
+
+def get_rate_limiter_stats() -> dict:
+    """
+    目的: レート制限の状況を確認するための統計情報を返す。
+    役割: 待ち行列の長さ、待ち時間の平均・最大、403/429を受け取った回数などを辞書で返す。
+    """
+    limiter = _rate_limiter
+    return limiter.stats() if limiter is not None else {"enabled": False}
+
+
+def get_suggestion_index() -> SuggestionIndex | None:
+    """
+    目的: キーワードの候補の索引を取得する。
+    役割: 初回呼び出し時に空の索引を作成し、SUGGEST_INDEX_PATH に保存されている内容を裏側のスレッドで読み込む。
+         読み込みが終わるまでは、それまでに登録された名前だけから候補を返す。
+         ファイルの読み込みでイベントループやスクリプトのスレッドを止めないよう、呼び出し元では待たない。
+         set_suggestion_index(None) された場合はNone（索引を使わない）を返す。
+    """
+    global _suggestion_index, _suggestion_index_configured
+    with _suggestion_lock:
+        if _suggestion_index_configured:
+            return _suggestion_index
+        index = _suggestion_index = SuggestionIndex(SUGGEST_MAX_NAMES)
+        _suggestion_index_configured = True
+    threading.Thread(target=_load_suggestions, args=(index,), name="suggestion-index-loader", daemon=True).start()
+    return index
+
+
+def set_suggestion_index(index: SuggestionIndex | None) -> None:
+    """候補の索引を差し替える。Noneを渡すと索引への登録と保存を行わない（ベンチマークなどで使う）。"""
+    global _suggestion_index, _suggestion_index_configured
+    with _suggestion_lock:
+        _suggestion_index, _suggestion_index_configured = index, True
+
+
+def suggest_terms(prefix: str, limit: int = 8) -> list:
+    """
+    目的: 入力中のキーワードで始まるアーティスト名・曲名を、APIに問い合わせずに返す。
+    役割: これまでに取得した検索結果から作った索引を引くだけなので、すぐに結果が返る。
+
+    Returns:
+        list: (名前, 種類) のタプルのリスト。種類は "artist" または "track"。
+    """
+    index = get_suggestion_index()
+    return index.suggest(prefix, limit) if index is not None else []
+
+
+def did_you_mean(term: str, limit: int = 5) -> list:
+    """
+    目的: 検索結果が空だった時に表示する「もしかして」の候補を返す。
+    役割: キーワードで始まる名前がなければ、末尾から1文字ずつ削ったキーワードで探す（打ち間違いへの対応）。
+
+    Returns:
+        list: (名前, 種類) のタプルのリスト。
+    """
+    index = get_suggestion_index()
+    return index.did_you_mean(term, limit) if index is not None else []
+
+
+def _index_suggestions(results: list) -> None:
+    """APIから取得した結果を候補の索引に登録し、保存の時刻を過ぎていれば裏側のスレッドで保存する。"""
+    index = get_suggestion_index()
+    if index is None:
+        return
+    index.add_results(results)
+    if index.claim_save(SUGGEST_SAVE_INTERVAL):
+        # ファイルの書き込みでイベントループを止めないよう、スレッドプールで保存する。
+        asyncio.get_running_loop().run_in_executor(None, _save_suggestions, index)
+
+
+def _load_suggestions(index: SuggestionIndex) -> None:
+    """保存されている候補の索引をファイルから読み込む。失敗しても検索には影響しないため、ログを出すだけにする。"""
+    try:
+        index.load(SUGGEST_INDEX_PATH)
+    except Exception as e:
+        print(f"キーワードの候補の読み込みに失敗しました: {e}")
+
+
+def _save_suggestions(index: SuggestionIndex) -> None:
+    """候補の索引をファイルに保存する。失敗しても検索には影響しないため、ログを出すだけにする。"""
+    try:
+        index.save(SUGGEST_INDEX_PATH)
+    except OSError as e:
+        print(f"キーワードの候補の保存に失敗しました: {e}")
+
+
+def get_artwork_cache() -> ArtworkCache | None:
+    """
+    目的: アートワークの縮小画像のキャッシュを取得する。
+    役割: 初回呼び出し時に ARTWORK_CACHE_DIR に作成し、保存済みのファイルを読み込む。
+         set_artwork_cache(None) された場合、または作成できなかった場合はNone（キャッシュを使わない）を返す。
+    """
+    global _artwork_cache, _artwork_cache_configured
+    with _cache_lock:
+        if not _artwork_cache_configured:
+            try:
+                _artwork_cache = ArtworkCache(
+                    ARTWORK_CACHE_DIR, ARTWORK_CACHE_MAX_BYTES, ARTWORK_SIZES, quality=ARTWORK_JPEG_QUALITY
+                )
+            except OSError as e:
+                print(f"アートワークのキャッシュを作成できませんでした: {e}")
+                _artwork_cache = None
+            _artwork_cache_configured = True
+        return _artwork_cache
+
+
+def set_artwork_cache(cache: ArtworkCache | None) -> None:
+    """アートワークのキャッシュを差し替える。Noneを渡すとキャッシュを使わない（ベンチマークなどで使う）。"""
+    global _artwork_cache, _artwork_cache_configured
+    with _cache_lock:
+        _artwork_cache, _artwork_cache_configured = cache, True
+
+
+def artwork_source_url(url: str, size: int) -> str:
+    """
+    iTunes APIのアートワークのURL（artworkUrl100 など）を、指定した大きさの画像のURLに書き換える。
+    AppleのサーバーはURLの "100x100" の部分で指定された大きさの画像を返す。
+    """
+    return url.replace("100x100", f"{size}x{size}")
+
+
+def _cached_artwork(cache: ArtworkCache | None, url: str, size: int) -> str | None:
+    """
+    縮小画像が保存済みならそのファイル名を返す。
+    まだなら裏側でダウンロードを始めてNoneを返す（呼び出し元はAppleのURLで代わりに表示する）。
+    """
+    if not url or cache is None:
+        return None
+    name = cache.lookup(url, size)
+    if name is None:
+        loop = _get_loop()
+        loop.call_soon_threadsafe(_schedule_artwork_download, loop, url)
+    return name
+
+
+def _schedule_artwork_download(loop: asyncio.AbstractEventLoop, url: str) -> None:
+    """ループ上で呼ばれ、そのURLのダウンロードが始まっていなければ始める。"""
+    failed_at = _artwork_failed.get(url)
+    if failed_at is not None and loop.time() - failed_at < ARTWORK_RETRY_INTERVAL:
+        return
+    if url not in _artwork_pending:
+        _artwork_pending[url] = loop.create_task(_download_artwork(url))
+
+
+def artwork_image(url: str, size: int) -> str | None:
+    """
+    目的: st.image に渡すアートワークの画像を返す。
+    役割: 縮小画像が保存済みならそのファイルのパスを、まだなら指定した大きさのAppleのURLを返す。
+         初めて表示する画像は裏側でダウンロードしておき、次回の表示からはディスクの縮小画像を使う。
+
+    Args:
+        url (str): iTunes APIのアートワークのURL（artworkUrl100 など）。
+        size (int): 表示する大きさ(px)。ARTWORK_SIZES のいずれか。
+
+    Returns:
+        str | None: ファイルのパスまたはURL。url が空ならNone。
+    """
+    cache = get_artwork_cache()
+    name = _cached_artwork(cache, url, size)
+    if name is not None:
+        return cache.path(name)
+    return artwork_source_url(url, size) if url else None
+
+
+def artwork_css_url(url: str, size: int) -> str:
+    """
+    目的: CSSの背景画像(url(...))などHTMLの中で使うアートワークのURLを返す。
+    役割: 縮小画像が保存済みなら静的ファイル配信のURLを、まだなら指定した大きさのAppleのURLを返す。
+    """
+    name = _cached_artwork(get_artwork_cache(), url, size)
+    if name is not None:
+        return f"{ARTWORK_STATIC_URL}/{name}"
+    return artwork_source_url(url, size) if url else ""
+
+
+async def _download_artwork(url: str) -> None:
+    """
+    アートワークを一番大きい大きさで一度だけダウンロードし、全ての大きさの縮小画像を保存する。
+    画像の取得はiTunes APIへのリクエストではないため、レート制限の対象にしない。
+    失敗しても表示はAppleのURLで続けられるため、ログを出して ARTWORK_RETRY_INTERVAL 秒後に再挑戦する。
+    検索と同じ接続プールを使うため、同時にダウンロードする数は ARTWORK_DOWNLOAD_CONCURRENCY までに制限する。
+    """
+    global _artwork_semaphore
+    cache = _artwork_cache
+    if cache is None:
+        _artwork_pending.pop(url, None)
+        return
+    if _artwork_semaphore is None:
+        _artwork_semaphore = asyncio.Semaphore(max(1, ARTWORK_DOWNLOAD_CONCURRENCY))
+    try:
+        async with _artwork_semaphore:
+            client = await _get_client()
+            response = await client.get(artwork_source_url(url, max(cache.sizes)))
+        response.raise_for_status()
+        # 画像の縮小とファイルの書き込みでイベントループを止めないよう、スレッドプールで行う。
+        await asyncio.get_running_loop().run_in_executor(None, cache.store, url, response.content)
+        _artwork_failed.pop(url, None)
+    except Exception as e:
+        print(f"アートワークの取得に失敗しました: {url} ({e})")
+        now = asyncio.get_running_loop().time()
+        if len(_artwork_failed) >= 1024:
+            # 再挑戦の時刻を過ぎたものを取り除き、失敗の記録が増え続けないようにする。
+            for failed_url in [u for u, t in _artwork_failed.items() if now - t >= ARTWORK_RETRY_INTERVAL]:
+                del _artwork_failed[failed_url]
+        _artwork_failed[url] = now
+    finally:
+        _artwork_pending.pop(url, None)
+
+
+def get_response_archive() -> ResponseArchive | None:
+    """
+    目的: レスポンスの記録・再生に使うアーカイブを取得する。
+    役割: 初回呼び出し時に ITUNES_ARCHIVE_MODE に従って作成する。"off" の場合はNone（記録も再生もしない）を返す。
+    """
+    global _response_archive, _response_archive_configured
+    with _cache_lock:
+        if not _response_archive_configured:
+            if ITUNES_ARCHIVE_MODE != "off":
+                _response_archive = ResponseArchive(
+                    ITUNES_ARCHIVE_PATH, ITUNES_ARCHIVE_MODE, match=ITUNES_REPLAY_MATCH, latency=ITUNES_REPLAY_LATENCY
+                )
+            _response_archive_configured = True
+        return _response_archive
+
+
+def set_response_archive(archive: ResponseArchive | None) -> None:
+    """アーカイブを差し替える。Noneを渡すと記録も再生もしない（ベンチマークを再生モードで実行する時などに使う）。"""
+    global _response_archive, _response_archive_configured
+    with _cache_lock:
+        _response_archive, _response_archive_configured = archive, True
+
+
+def _record_exchange(archive: ResponseArchive, params: dict, status: int, body: bytes, latency: float) -> None:
+    """リクエストとレスポンスの組をアーカイブに記録する。失敗しても検索には影響しないため、ログを出すだけにする。"""
+    try:
+        archive.record(params, status, body, latency)
+    except sqlite3.Error as e:
+        print(f"レスポンスの記録に失敗しました: {e}")
+
+
+async def _send_search(
+    params: dict, archive: ResponseArchive | None, limiter: RateLimiter | None = None
+) -> httpx.Response:
+    """
+    目的: iTunes APIに検索リクエストを1回送り、レスポンスを返す。
+    役割: 再生モードではネットワークに接続せず、アーカイブに記録したレスポンスを同じ形(httpx.Response)で返す。
+         記録モードでは、受け取ったレスポンスを裏側のスレッドでアーカイブに記録する。
+         どちらのモードでも、呼び出し元はレスポンスを通常の通信と同じように扱える。
+         ネットワークに送る場合は、応答が遅ければヘッジリクエストを送る(_get_hedged)。limiter はその送信枠に使う。
+         返すレスポンスは本文をまだ読み込んでいない（ストリーミングの）状態のため、呼び出し元は使い終わったら必ず aclose() する。
+    """
+    if archive is not None and archive.replaying:
+        # 見つからなければ ArchiveMiss が送出され、通信エラーと同じように扱われる。
+        # SQLiteからの読み込みでイベントループを止めないよう、スレッドプールで検索する。
+        status, body, recorded_latency = await asyncio.get_running_loop().run_in_executor(
+            None, archive.lookup, params
+        )
+        delay = archive.replay_delay(recorded_latency)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return httpx.Response(
+            status,
+            content=body,
+            headers={"Content-Type": "application/json; charset=utf-8"},
+            request=httpx.Request("GET", ITUNES_API_BASE, params=params),
+        )
+    # 接続プールを持つ共有クライアントを取得する（接続は使い回される）。
+    client = await _get_client()
+    started = time.perf_counter()
+    # `await`キーワードで、APIからのレスポンスが返ってくるまで処理を待つ。
+    response = await _get_hedged(client, params, limiter)
+    if archive is not None:
+        # 記録には本文全体が必要なため、ここで読み込んでおく（読み込んだ本文は、後の aiter_bytes() でもそのまま使われる）。
+        await response.aread()
+        # SQLiteへの書き込みでイベントループを止めないよう、スレッドプールで記録する。
+        asyncio.get_running_loop().run_in_executor(
+            None, _record_exchange, archive, params, response.status_code, response.content,
+            time.perf_counter() - started,
+        )
+    return response
+
+
+async def _open_search_stream(client: httpx.AsyncClient, params: dict) -> httpx.Response:
+    """検索リクエストを送り、ヘッダーを受け取った時点でレスポンスを返す。本文は呼び出し元が少しずつ読み込む。"""
+    request = client.build_request("GET", ITUNES_API_BASE, params=params)
+    return await client.send(request, stream=True)
+
+
+async def _read_results(response: httpx.Response, entity: str) -> list:
+    """
+    目的: レスポンスの本文を届いた分から読み込み、entity ごとに必要な項目だけを残した結果のリストを返す。
+    役割: 本文全体を1つの大きな辞書にしてから使う項目を選ぶ代わりに、1件ずつ読み込んでは RESULT_FIELDS の項目だけを取り出す。
+         圧縮されたレスポンスは、受け取りながら展開される(aiter_bytes)。
+    """
+    decoder = ResultStreamDecoder(RESULT_FIELDS.get(entity, tuple(FIELD_MAP)))
+    async for chunk in response.aiter_bytes():
+        decoder.feed(chunk)
+    return decoder.finish()
+
+
+def _hedge_delay(tracker: LatencyTracker) -> float:
+    """ヘッジリクエストを送るまでの待ち時間(秒)を、直近の応答時間の分位点から決める。"""
+    if len(tracker) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, tracker.quantile(HEDGE_QUANTILE))
+
+
+async def _first_response(tasks: list) -> tuple:
     """
+    複数の同じリクエストのうち、先に返ってきたレスポンスの (番号, レスポンス) を返す。
+    5xxや例外で終わったものは、他のリクエストがまだ実行中であればその結果を待つ。
+    全て失敗した場合は、最後の5xxのレスポンスを返すか、最初の例外を送出する。
+    使わなかったレスポンスは呼び出し元(_get_hedged)で閉じる。
+    """
+    pending = set(tasks)
+    fallback = None  # (番号, 5xxのレスポンス)
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in sorted(done, key=tasks.index):
+            if task.exception() is not None:
+                error = error or task.exception()
+            elif task.result().status_code >= 500:
+                fallback = (tasks.index(task), task.result())
+            else:
+                return tasks.index(task), task.result()
+    if fallback is not None:
+        return fallback
+    raise error
+
+
+async def _get_hedged(client: httpx.AsyncClient, params: dict, limiter: RateLimiter | None) -> httpx.Response:
+    """
+    目的: ごく一部の遅いリクエストに画面全体が待たされないよう、遅い時だけ同じリクエストをもう1つ送る（ヘッジリクエスト）。
+    役割: 最初のリクエストが、同じ entity の直近の応答時間の p95(HEDGE_QUANTILE)を過ぎても返ってこなければ、
+         同じリクエストをもう1つ送り、先に返ってきた方を使う（もう一方はキャンセルする）。
+         2つ目はレート制限の送信枠がすぐに使える場合だけ送るため、APIへの送信ペースの上限は変わらない。
+    """
+    entity = params["entity"]
+    tracker = _latency_trackers.get(entity)
+    if tracker is None:
+        tracker = _latency_trackers[entity] = LatencyTracker(HEDGE_WINDOW)
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(_open_search_stream(client, params))]
+    chosen = None
+    try:
+        if HEDGE_ENABLED:
+            done, _ = await asyncio.wait(tasks, timeout=_hedge_delay(tracker))
+            if not done:
+                if limiter is None or limiter.try_acquire():
+                    _hedge_stats["sent"] += 1
+                    inc("itunes_hedged_requests_total", entity=entity)
+                    tasks.append(asyncio.ensure_future(_open_search_stream(client, params)))
+                else:
+                    _hedge_stats["skipped"] += 1
+        index, response = await _first_response(tasks)
+        chosen = tasks[index]
+    finally:
+        # 使わなかった方のリクエストは、実行中ならキャンセルし、返ってきていれば閉じて接続を解放する。
+        for task in tasks:
+            if task is chosen:
+                continue
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None:
+                asyncio.ensure_future(task.result().aclose())
+    if index:
+        _hedge_stats["won"] += 1
+        inc("itunes_hedge_wins_total", entity=entity)
+    tracker.observe(time.perf_counter() - started)
+    return response
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    """Retry-Afterヘッダーが秒数で指定されていれば、その値を返す。"""
     try:
-        # 新しいイベントループを作成して、その中で非同期関数を実行する。
-        return asyncio.run(async_func(*args, **kwargs))
-    except RuntimeError:
-        # "RuntimeError: asyncio.run() cannot be called from a running event loop" というエラーが出た場合
-        # （つまり、既にイベントループが動いている場合）
-        loop = asyncio.get_event_loop()
-        # 既存のループを使って非同期関数を実行し、完了するまで待つ。
-        return loop.run_until_complete(async_func(*args, **kwargs))
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
 
 
-async def _fetch_music(term: str, entity: str = "song", limit: int = 50) -> list:
+async def _request_music(
+    term: str, entity: str, limit: int, country: str, priority: int = PRIORITY_INTERACTIVE, offset: int = 0
+) -> list:
     """
     目的: iTunes APIに実際にリクエストを送信し、検索結果を取得する非同期関数。
-    役割: httpxライブラリを使い、指定されたキーワードでAPIに問い合わせる。
+    役割: レートリミッターから送信枠を受け取ってから、共有のHTTPクライアントでAPIに問い合わせる。
+         403/429（レート制限）が返ってきた場合は、リミッターに伝えて送信を一時停止させ、
+         RATE_LIMIT_MAX_RETRIES 回まで送信枠を受け取り直して再送する。
          'async'で定義されているため、APIからの応答を待つ間に他の処理をブロックしない。
+         offset を指定すると、検索結果の (offset + 1) 件目から limit 件を取得する。
     """
     # APIに渡すパラメータ（クエリ文字列）を辞書として定義する。
     params = {
         "term": term,         # 検索キーワード
         "entity": entity,     # 検索対象の種類 (song, musicVideo, albumなど)
         "limit": limit,       # 取得する件数の上限
-        "country": "JP",      # 検索対象国を日本に設定
+        "country": country,   # 検索対象国
         "lang": "ja_jp"       # 結果の言語を日本語に設定
     }
+    if offset:
+        params["offset"] = offset  # 何件目から取得するか（2ページ目以降の取得に使う）
+    archive = get_response_archive()
+    # 再生モードではAPIに送信しないため、レート制限の送信枠を使わない。
+    limiter = None if archive is not None and archive.replaying else _get_rate_limiter()
     try:
-        # 非同期HTTPクライアントを作成し、タイムアウトを10秒に設定する。
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # `await`キーワードで、APIからのレスポンスが返ってくるまで処理を待つ。
-            response = await client.get(ITUNES_API_BASE, params=params)
-            response.raise_for_status() # HTTPステータスコードが4xxや5xxの場合、例外を発生させる。
-            # JSON形式のレスポンスを辞書に変換し、"results"キーの値（楽曲リスト）を返す。
-            return response.json().get("results", [])
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            if limiter is not None:
+                # 送信枠が空くまで待つ。優先度の高いリクエストが先に送信される。
+                await limiter.acquire(priority)
+            response = await _send_search(params, archive, limiter)
+            try:
+                if response.status_code in (403, 429) and limiter is not None:
+                    delay = limiter.on_throttled(_retry_after_seconds(response))
+                    inc("itunes_throttled_total", entity=entity)
+                    print(f"APIのレート制限を受けました。{delay:.1f}秒間送信を停止します。")
+                    if attempt < RATE_LIMIT_MAX_RETRIES:
+                        continue
+                response.raise_for_status() # HTTPステータスコードが4xxや5xxの場合、例外を発生させる。
+                if limiter is not None:
+                    limiter.on_success()
+                # JSON形式の本文を届いた分から読み込み、"results"の各要素から必要な項目だけを残したリストを返す。
+                return await _read_results(response, entity)
+            finally:
+                # 本文を読み終えた（または読まなかった）レスポンスを閉じ、接続をプールに戻す。
+                await response.aclose()
     except Exception as e:
-        # 通信エラーやタイムアウトなど、何らかの例外が発生した場合
+        # 通信エラーやタイムアウトなど、何らかの例外が発生した場合はログを出して呼び出し元に伝える。
+        # 例外をどう扱うか（空のリストにするか、エラーとして表示するか）は呼び出し元が決める。
         print(f"APIリクエストエラー: {e}")
-        # 空のリストを返すことで、アプリケーションが停止するのを防ぐ。
+        inc("itunes_request_errors_total", entity=entity, reason=type(e).__name__)
+        raise
+
+
+def _request_key(term: str, entity: str, limit: int, country: str, offset: int = 0) -> tuple:
+    """
+    検索条件を正規化し、同一リクエストの判定に使うキーを作成する。
+    iTunes APIは全角・半角、大文字・小文字や余分な空白を区別しないため、それらを揃えてから比較する。
+    offset が異なれば別のページなので、ページごとに別々にキャッシュされる。
+    """
+    return (normalize_query(term), entity, int(limit), country.upper(), int(offset))
+
+
+def _record_query_variant(raw_term: str, canonical_term: str) -> None:
+    """元の表記が、どの正規化後のキーワードにまとめられたかを記録する。"""
+    with _query_stats_lock:
+        _query_stats["lookups"] += 1
+        if raw_term != canonical_term:
+            _query_stats["folded"] += 1
+        variants = _query_variants.get(canonical_term)
+        if variants is None:
+            # 記録するキーワード数が上限に達したら、新しいキーワードは記録しない（メモリを使い続けないため）。
+            if len(_query_variants) >= QUERY_VARIANT_STATS_MAX_KEYS:
+                return
+            variants = _query_variants[canonical_term] = set()
+        variants.add(raw_term)
+
+
+def get_query_normalization_stats(top: int = 10) -> dict:
+    """
+    目的: 検索キーワードの正規化の効果を確認するための統計情報を返す。
+    役割: 呼び出し回数、表記が正規化された回数、記録しているキーワード数と元の表記の総数、
+         元の表記が多くまとめられたキーワードの上位 top 件を辞書で返す。
+    """
+    with _query_stats_lock:
+        stats = dict(_query_stats)
+        counts = {term: len(variants) for term, variants in _query_variants.items()}
+    stats["canonical_keys"] = len(counts)
+    stats["raw_variants"] = sum(counts.values())
+    stats["top_folded"] = sorted(
+        ((term, count) for term, count in counts.items() if count > 1), key=lambda pair: -pair[1]
+    )[:top]
+    return stats
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    目的: 全てのAPI検索で共有するレスポンスキャッシュを取得する。
+    役割: 初回呼び出し時に、config.py の CACHE_* の設定に従ってバックエンドを作成する。
+    """
+    global _response_cache
+    with _cache_lock:
+        if _response_cache is None:
+            backend = create_backend(CACHE_BACKEND, CACHE_MAX_BYTES, CACHE_PATH)
+            _response_cache = ResponseCache(
+                backend, ttls=CACHE_TTLS, default_ttl=CACHE_DEFAULT_TTL, stale_ttl=CACHE_STALE_TTL
+            )
+        return _response_cache
+
+
+def set_response_cache(cache: ResponseCache) -> None:
+    """レスポンスキャッシュを差し替える。ベンチマークや、別のバックエンドを使いたい場合に利用する。"""
+    global _response_cache
+    with _cache_lock:
+        _response_cache = cache
+
+
+async def _cache_call(method: str, *args, **kwargs):
+    """
+    レスポンスキャッシュの method を呼び出す。
+    SQLiteなど、待たされることのあるバックエンドではスレッドプールで実行し、イベントループを止めない
+    （ロック待ちの間も、他のセッションの検索や通信を進められるようにする）。
+    """
+    cache = get_response_cache()
+    call = functools.partial(getattr(cache, method), *args, **kwargs)
+    if not getattr(cache.backend, "blocking", True):
+        return call()
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+def _cache_key(request_key: tuple) -> str:
+    """正規化済みの検索条件から、キャッシュのキーとなる文字列を作成する。"""
+    return json.dumps(request_key, ensure_ascii=False)
+
+
+# --- 検索結果の種類 ---
+# 「結果あり」「該当なし」「通信エラー」を区別することで、エラーを「該当なし」としてキャッシュしてしまう事故を防ぐ。
+STATUS_OK = "ok"  # 1件以上の結果が得られた
+STATUS_EMPTY = "empty"  # 通信は成功したが、該当する結果がなかった
+STATUS_ERROR = "error"  # タイムアウトや5xxなどで、結果を取得できなかった
+
+
+class QueryResult(NamedTuple):
+    """1件の検索の結果。結果のリストに加えて、成功・該当なし・エラーのどれだったかを持つ。"""
+    results: list  # 検索結果（Track）のリスト（該当なし・エラー時は空）
+    status: str = STATUS_OK  # STATUS_OK / STATUS_EMPTY / STATUS_ERROR のいずれか
+    error: str | None = None  # エラーが発生した場合、その内容
+
+    @property
+    def ok(self) -> bool:
+        """エラーではなかった（結果あり、または該当なし）場合にTrueを返す。"""
+        return self.status != STATUS_ERROR
+
+
+class ApiError(Exception):
+    """APIから結果を全く取得できなかったことを、キャッシュさせずに呼び出し元へ伝えるための例外。"""
+
+
+def _result_ttl(result: QueryResult, entity: str) -> float:
+    """
+    検索結果の種類に応じたキャッシュの有効期限(秒)を返す。
+    エラーは短い期間だけキャッシュし（その間はAPIへの再送を控える）、期限が切れたら再び問い合わせる。
+    """
+    if result.status == STATUS_ERROR:
+        return CACHE_ERROR_TTL
+    if result.status == STATUS_EMPTY:
+        return CACHE_EMPTY_TTL
+    return get_response_cache().ttl_for(entity)
+
+
+async def _request_and_store(
+    term: str, entity: str, limit: int, country: str, cache_key: str, priority: int, offset: int = 0
+) -> QueryResult:
+    """
+    APIに問い合わせ、結果の種類に応じた有効期限でレスポンスキャッシュに保存する。
+    キャッシュにはAPIの辞書のまま保存し、呼び出し元には画面表示用のレコード(Track)に変換して返す。
+    entity ごとのサーキットブレーカーが開いている間はAPIに問い合わせずにすぐに失敗させる。
+    APIから取得できなかった場合は、キャッシュに期限切れの結果が残っていればそれを代わりに返す。
+    その際は期限切れの結果を CACHE_ERROR_TTL の間だけ有効として保存し直し、エラーをキャッシュした時と同じく再送を控える。
+    """
+    archive = get_response_archive()
+    # 再生モードではAPIに接続しないため、サーキットブレーカーを通さない。
+    breaker = None if archive is not None and archive.replaying else _get_circuit_breaker(entity)
+    rejected = breaker is not None and not breaker.allow()
+    if rejected:
+        inc("itunes_circuit_rejected_total", entity=entity)
+        result = QueryResult([], STATUS_ERROR, CIRCUIT_OPEN_MESSAGE)
+    else:
+        try:
+            results = await _request_music(term, entity, limit, country, priority, offset)
+            result = QueryResult(results, STATUS_OK if results else STATUS_EMPTY)
+        except Exception as e:
+            result = QueryResult([], STATUS_ERROR, str(e) or type(e).__name__)
+        except BaseException:
+            # キャンセルされた場合は結果を記録しない。試しの送信だった場合に、回路が半開のまま止まらないようにする。
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record(result.status != STATUS_ERROR)
+    if breaker is not None:
+        gauge("itunes_circuit_state", STATE_VALUES[breaker.state], entity=entity)
+    if result.status == STATUS_ERROR:
+        stale = await _cache_call("get_stale", cache_key)
+        if stale is not None and stale["status"] != STATUS_ERROR:
+            if not rejected:
+                # エラーで上書きせず、期限切れの結果を短い期間だけ有効にして保存し直す（次に取得できるまで代わりに使い続ける）。
+                # その間は同じ条件の検索をキャッシュから返し、再実行のたびにAPIへ再送しない。
+                await _cache_call("set", cache_key, stale, ttl=CACHE_ERROR_TTL)
+            _stale_stats["served"] += 1
+            inc("itunes_stale_served_total", entity=entity)
+            return QueryResult(project_results(stale["results"]), stale["status"], stale["error"])
+        if rejected:
+            # 送信していないため、エラーをキャッシュしない（回路が閉じたらすぐに問い合わせられるようにする）。
+            return result
+    if result.status == STATUS_OK:
+        # 取得したアーティスト名・曲名を、キーワードの候補として登録する。
+        _index_suggestions(result.results)
+    await _cache_call("set", cache_key, result._asdict(), ttl=_result_ttl(result, entity))
+    return result._replace(results=project_results(result.results))
+
+
+def _get_circuit_breaker(entity: str) -> CircuitBreaker:
+    """entity ごとのサーキットブレーカーを返す。初めて使われる時に CIRCUIT_* の設定で作成する。"""
+    breaker = _circuit_breakers.get(entity)
+    if breaker is None:
+        breaker = _circuit_breakers[entity] = CircuitBreaker(
+            CIRCUIT_FAILURE_RATIO, CIRCUIT_MIN_REQUESTS, CIRCUIT_WINDOW_SECONDS, CIRCUIT_OPEN_SECONDS
+        )
+    return breaker
+
+
+def get_resilience_stats() -> dict:
+    """
+    目的: ヘッジリクエストとサーキットブレーカーの効果を確認するための統計情報を返す。
+    役割: ヘッジを送った回数・後から送った方が先に返ってきた回数、期限切れの結果を返した回数、
+         entity ごとの直近の応答時間の p95 と、サーキットブレーカーの状態を辞書で返す。
+    """
+    return {
+        "hedge": dict(_hedge_stats),
+        "stale_served": _stale_stats["served"],
+        "latency_p95": {entity: tracker.quantile(0.95) for entity, tracker in list(_latency_trackers.items())},
+        "circuits": {entity: breaker.stats() for entity, breaker in list(_circuit_breakers.items())},
+    }
+
+
+async def _fetch_music(
+    term: str,
+    entity: str = "song",
+    limit: int = 50,
+    country: str = DEFAULT_COUNTRY,
+    priority: int = PRIORITY_INTERACTIVE,
+    offset: int = 0,
+) -> QueryResult:
+    """
+    目的: キャッシュを確認したうえで、必要な場合だけAPIに問い合わせる。
+    役割: まずレスポンスキャッシュを確認し、有効な結果があればそれを返す。
+         キャッシュにない場合、既に同じ条件のリクエストが実行中であれば、新たに送信せずその結果を待つ（シングルフライト）。
+         キャッシュの有効期限切れ直後に多数のセッションが同時アクセスしても、APIへの負荷が増えない。
+         通信エラーも例外ではなく、status が STATUS_ERROR の QueryResult として返す。
+         priority はレート制限で待たされる際の優先度（PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND）。
+         offset は取得を始める位置で、ページごとに別々にキャッシュ・集約される。
+         キャッシュのキーにはキーワードを正規化(normalize_query)して使うため、表記の違う同じキーワードは1つのキャッシュ・1回の送信にまとまる。
+    """
+    _coalescing_stats["requests"] += 1
+    _record_query_variant(term, normalize_query(term))
+    # APIには利用者の表記のまま（全角・半角と空白だけを整えて）問い合わせる。大文字・小文字の統一などはキーにだけ使う。
+    # 表記の違う同じキーワードが同時に検索された場合は、最初に送信した表記の結果を共有する。
+    term = clean_query(term)
+    key = _request_key(term, entity, limit, country, offset)
+    cache_key = _cache_key(key)
+    # 取得にかかった時間を、entity・ページ・取得元（キャッシュ / 相乗り / API）・結果の種類ごとに記録する。
+    with timer("itunes_fetch_seconds", entity=entity, page=offset // limit if limit else 0) as timing:
+        with timer("response_cache_lookup_seconds", entity=entity) as lookup_timing:
+            cached = await _cache_call("get", cache_key)
+            lookup_timing.set(result="miss" if cached is None else "hit")
+        if cached is not None:
+            cached["results"] = project_results(cached["results"])
+            result = QueryResult(**cached)
+            timing.set(source="cache", status=result.status)
+            return result
+
+        task = _inflight.get(key)
+        if task is not None:
+            # 実行中の同一リクエストがあるので、それに相乗りする。
+            _coalescing_stats["coalesced"] += 1
+            timing.set(source="coalesced")
+        else:
+            _coalescing_stats["issued"] += 1
+            timing.set(source="network")
+            task = asyncio.ensure_future(
+                _request_and_store(term, entity, limit, country, cache_key, priority, offset)
+            )
+            _inflight[key] = task
+            # 完了したら実行中テーブルから取り除く（次回以降は新しいリクエストとして扱う）。
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+        # shieldで包むことで、ある呼び出し元がキャンセルされても、相乗りしている他の呼び出し元には影響しない。
+        result = await asyncio.shield(task)
+        timing.set(status=result.status)
+        return result
+
+
+def get_cache_stats() -> dict:
+    """
+    目的: レスポンスキャッシュの効果を確認するための統計情報を返す。
+    役割: ヒット数・ミス数・ヒット率、保存件数・バイト数・破棄された件数などを辞書で返す。
+    """
+    return get_response_cache().stats()
+
+
+def get_coalescing_stats() -> dict:
+    """
+    目的: リクエスト集約の効果を確認するための統計情報を返す。
+    役割: 呼び出し回数、実際の送信数、集約された回数、現在実行中のリクエスト数を辞書で返す。
+    """
+    stats = dict(_coalescing_stats)
+    stats["inflight"] = len(_inflight)
+    return stats
+
+
+async def _fetch_batch(specs: list, max_concurrency: int, priority: int) -> list:
+    """
+    目的: 複数の検索条件を「並列」で一括検索する内部関数。
+    役割: セマフォで同時実行数を制限しながら全てのクエリを同時に投げ、指定された順番で結果を返す。
+         一部のクエリが失敗しても、他のクエリの結果はそのまま受け取れるように、エラーはクエリごとの status に記録される。
+    """
+    # セマフォはイベントループに紐づくため、ループ上で動くこの関数の中で作成する。
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(term: str, entity: str, limit: int, offset: int = 0) -> QueryResult:
+        async with semaphore:
+            return await _fetch_music(term, entity=entity, limit=limit, priority=priority, offset=offset)
+
+    # asyncio.gather()は、渡したタスクの順番どおりに結果を返す。
+    return await asyncio.gather(*(run_one(*spec) for spec in specs))
+
+
+def search_music_batch(
+    specs: list, max_concurrency: int = BATCH_MAX_CONCURRENCY, priority: int = PRIORITY_INTERACTIVE
+) -> list:
+    """
+    目的: 複数の (キーワード, entity, 件数) の組をまとめて検索するための公開関数。
+    役割: 1件ずつ順番に検索すると通信回数分の時間がかかるが、並列で投げることで
+         最も時間のかかったリクエスト数回分程度の時間で全ての検索を完了させる。
+
+    Args:
+        specs (list): (term, entity, limit) または (term, entity, limit, offset) のタプルのリスト。
+        max_concurrency (int): 同時に実行するリクエスト数の上限。
+        priority (int): レート制限で待たされる際の優先度。裏側での取得には PRIORITY_BACKGROUND を指定する。
+
+    Returns:
+        list: specsと同じ順番に並んだ QueryResult のリスト。
+    """
+    if not specs:
         return []
+    return _run_async(_fetch_batch, list(specs), max_concurrency, priority)
 
 
-@st.cache_data
-def search_music(term: str, entity: str = "song", limit: int = 50) -> list:
+def has_next_page(query: QueryResult, page: int, page_size: int = SEARCH_PAGE_SIZE) -> bool:
     """
-    目的: 単一のキーワードで楽曲やMVを検索するための、アプリ全体から呼び出される公開関数。
-    役割: @st.cache_dataデコレータの力で、一度検索した結果をキャッシュ（一時保存）する。
-         これにより、同じキーワードで再度検索してもAPIに問い合わせず、瞬時に結果を返すことができる。
-         APIへの不要なリクエストを減らし、アプリケーションの応答性を向上させる。
+    page ページ目の結果(query)を見て、次のページが存在しうるかを返す。
+    件数が page_size に満たないページ、またはAPIの上限(SEARCH_MAX_RESULTS件)に達したページが最後のページになる。
     """
-    # 内部的に非同期の実行ラッパーを呼び出し、API検索を実行する。
-    return _run_async(_fetch_music, term, entity=entity, limit=limit)
+    return query.status == STATUS_OK and len(query.results) >= page_size and (page + 1) * page_size < SEARCH_MAX_RESULTS
 
 
-@st.cache_data
-def search_mv_for_term(term: str) -> dict | None:
+def search_page_specs(term: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> list:
+    """検索結果画面が1回の検索で送る (キーワード, entity, 件数, 開始位置) の組を返す。キャッシュウォーマーとも共有する。"""
+    return [
+        (term, "song", limit, offset),
+        # MVは楽曲のページに関係なく毎回同じ条件で検索するため、2ページ目以降はキャッシュから返される。
+        (term, "musicVideo", MV_JOIN_FETCH_LIMIT, 0),
+    ]
+
+
+def search_songs_with_mvs(term: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> tuple:
     """
-    目的: 指定されたキーワードでミュージックビデオを検索し、最初に見つかった一件だけを返す。
-    役割: 検索結果画面の詳細セクションで、関連MVをオンデマンドで取得するために使用される。
+    目的: 楽曲の検索と、その楽曲に対応するミュージックビデオの検索を、一定回数の通信でまとめて行う。
+    役割: 「楽曲」と「MV」の検索を並列に1回ずつ行い、取得したMVを手元でアーティスト名・曲名と照合する。
+         1曲ごとにMVを検索する方式では (楽曲数 + 1) 回の通信が必要だったが、この関数では常に2回で済む。
+         offset を指定すると、楽曲の検索結果の2ページ目以降を取得して照合する。
+
+    Returns:
+        tuple: (楽曲検索の QueryResult, trackIdをキーとしたMVの辞書)
     """
-    results = _run_async(_fetch_music, term, entity="musicVideo", limit=1)
-    if results:
-        return results[0] # 結果リストの最初の要素を返す。
-    return None # 見つからなかった場合はNoneを返す。
+    song_query, mv_query = search_music_batch(search_page_specs(term, limit, offset))
+    # プレビュー再生できないMVは表示に使えないため、照合の対象から外す。
+    music_videos = [mv for mv in mv_query.results if mv.preview_url]
+    return song_query, build_mv_index(song_query.results, music_videos)
 
 
-async def _fetch_genres_async(genres: list) -> list:
+def search_first_mv(term: str) -> Track | None:
     """
-    目的: ホーム画面に表示する複数のジャンルの代表曲を「並列」で一括検索する内部関数。
-    役割: ホーム画面の初回表示速度を向上させる。例えば8つのジャンルを一つずつ順番に検索すると
-         8回分の通信時間がかかるが、asyncio.gatherで同時にリクエストを投げることで、
-         最も時間のかかったリクエスト1回分程度の時間で全ジャンルの検索を完了させる。
+    目的: キーワードでミュージックビデオを1件だけ検索し、見つからなければNoneを返す。
+    役割: 検索結果画面の詳細セクションで、関連MVをオンデマンドで取得するために使用される。
+         結果はレスポンスキャッシュに保存されるため、他のユーザーが同じ曲を開いていれば通信は発生しない。
+         「見つからなかった」結果は CACHE_EMPTY_TTL の間だけキャッシュされ、期限が切れると再検索される。
+         通信エラーの場合は、「見つからなかった」と区別できるよう ApiError を送出する。
     """
-    # 各ジャンルについて、代表曲を1曲だけ検索するための非同期タスクのリストを作成する。
-    tasks = [_fetch_music(genre.get("term", ""), entity="song", limit=1) for genre in genres]
-    # asyncio.gather()を使い、リスト内の全てのタスクを同時に実行し、全ての結果が返ってくるまで待つ。
-    results_of_lists = await asyncio.gather(*tasks)
-    return results_of_lists
+    query = _run_async(_fetch_music, term, entity="musicVideo", limit=1)
+    if not query.ok:
+        raise ApiError(query.error)
+    if query.results:
+        return query.results[0] # 結果リストの最初の要素を返す。
+    return None # 見つからなかった場合はNoneを返す。
 
 
-@st.cache_data
 def search_genres_concurrently(genres: list) -> list:
     """
-    目的: ホーム画面のジャンルカード用のアートワークを効率的に検索するための、キャッシュ付き公開関数。
-    役割: ホーム画面が必要とする全てのジャンル情報を、この関数一発で高速に取得できるようにする。
+    目的: ホーム画面のジャンルカード用のアートワークを効率的に検索するための公開関数。
+    役割: 各ジャンルの代表曲を1曲ずつ、一括検索APIを使って並列に取得する。
+         失敗したジャンルは空のリストになるため、呼び出し側は結果の有無だけを確認すればよい。
     """
-    return _run_async(_fetch_genres_async, genres)
\ No newline at end of file
+    # ユーザーの検索を優先させるため、裏側での取得として低い優先度で送信する。
+    return [query.results for query in search_music_batch(genre_specs(genres), priority=PRIORITY_BACKGROUND)]
+
+
+def genre_specs(genres: list) -> list:
+    """ジャンルカードのアートワーク用に送る (キーワード, entity, 件数) の組を返す。キャッシュウォーマーとも共有する。"""
+    return [(genre.get("term", ""), "song", 1) for genre in genres]
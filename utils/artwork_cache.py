@@ -0,0 +1,147 @@
+# utils/artwork_cache.py
+"""
+アートワーク（ジャケット画像）を一度だけダウンロードし、表示する大きさごとに縮小してディスクに保存しておくモジュール。
+
+画面の各所で表示するアートワークは、これまで利用者のブラウザがAppleのサーバーから直接取得していた。
+同じ画像でも表示のたびにダウンロードが発生し、表示枠より大きな画像を取得してしまうこともあった。
+ここでは
+- 元の画像を1回だけダウンロードし、表示枠ごとの大きさ（行: 80px、詳細: 150px、カード: 300px）に縮小して保存する。
+- 保存したファイルは「元のURL + 大きさ」から決まる名前で管理し、合計サイズが上限を超えたら最も長く使われていないものから削除する。
+ダウンロードと縮小はAPIクライアント側のバックグラウンドで行い、このモジュールはディスク上の保存と管理だけを担当する。
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+class ArtworkCache:
+    """
+    アートワークの縮小画像を、ディスク容量の上限付きで保存するキャッシュ。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, sizes: tuple, quality: int = 85):
+        """
+        Args:
+            directory (str): 縮小画像を保存するディレクトリ。
+            max_bytes (int): 保存する画像の合計サイズの上限(バイト)。
+            sizes (tuple): 作成する縮小画像の大きさ(px)の一覧。
+            quality (int): JPEGの画質(1〜95)。
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sizes = tuple(sorted(sizes))
+        self.quality = quality
+        self._files = OrderedDict()  # ファイル名 -> バイト数。末尾ほど最近使われたもの
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        # 前回までに保存したファイルを、更新時刻の古い順に読み込む（古いものから削除される）。
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+
+    @staticmethod
+    def filename(url: str, size: int) -> str:
+        """元のURLと大きさから、保存するファイルの名前を作成する。"""
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:24]
+        return f"{digest}_{size}.jpg"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def lookup(self, url: str, size: int) -> str | None:
+        """
+        保存済みの縮小画像のファイル名を返す。まだ保存されていなければNoneを返す。
+
+        Args:
+            url (str): 元のアートワークのURL。
+            size (int): 表示する大きさ(px)。
+
+        Returns:
+            str | None: ファイル名（directory からの相対パス）。
+        """
+        name = self.filename(url, size)
+        # 他のワーカープロセスが保存・削除したファイルもあるため、一覧にあるかどうかに関わらずディスク上の有無を確かめる。
+        try:
+            file_size = os.path.getsize(self._path(name))
+        except OSError:
+            with self._lock:
+                # 他のプロセスが削除していた場合は一覧からも外す（呼び出し元はAppleのURLで表示し、ダウンロードし直す）。
+                self._bytes -= self._files.pop(name, 0)
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+                self._stats["hits"] += 1
+                return name
+            # 他のプロセスが保存したファイルは、一覧に加えてサイズの上限の計算に含める。
+            self._files[name] = file_size
+            self._bytes += file_size
+            self._stats["hits"] += 1
+        return name
+
+    def path(self, name: str) -> str:
+        """lookup() が返したファイル名から、ファイルのパスを返す。"""
+        return self._path(name)
+
+    def store(self, url: str, data: bytes) -> None:
+        """
+        ダウンロードした元の画像から、全ての大きさの縮小画像を作成して保存する。
+
+        Args:
+            url (str): 元のアートワークのURL。
+            data (bytes): ダウンロードした画像のバイト列。
+        """
+        image = Image.open(io.BytesIO(data)).convert("RGB")
+        for size in self.sizes:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+            name = self.filename(url, size)
+            # 書き込み途中のファイルが表示されないよう、一時ファイルに書いてから置き換える。
+            temporary = self._path(f"{name}.{os.getpid()}.tmp")
+            with open(temporary, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(temporary, self._path(name))
+            with self._lock:
+                self._bytes += buffer.tell() - self._files.pop(name, 0)
+                self._files[name] = buffer.tell()
+                self._stats["stored"] += 1
+        self._evict()
+
+    def _evict(self) -> None:
+        """合計サイズが上限を超えている間、最も長く使われていないファイルから削除する。"""
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes or len(self._files) <= 1:
+                    return
+                name, size = self._files.popitem(last=False)
+                self._bytes -= size
+                self._stats["evictions"] += 1
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                # 他のプロセスが先に削除していた場合など。
+                pass
+
+    def stats(self) -> dict:
+        """ヒット数・ミス数、保存しているファイル数と合計サイズなどを返す。"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["files"] = len(self._files)
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
@@ -0,0 +1,129 @@
+# utils/background_refresh.py
+"""
+一定時間ごとに作り直す必要のあるデータを、「古いデータを返しつつ裏側で更新する」方式で管理するモジュール。
+
+ホーム画面のカルーセルのように、有効期限が切れた直後に訪れた利用者だけが
+全データの再取得を待たされるのを防ぐために使う。
+- 一度取得できたデータ（スナップショット）は、常に待ち時間なしで返す。
+- 更新時刻を過ぎていれば、裏側のスレッドで新しいデータを作り直し、完成したら差し替える。
+- 作り直しに失敗した場合は、前回のスナップショットをそのまま使い続け、少し時間をおいて再挑戦する。
+- 初回の読み込みに失敗した場合も、再挑戦の時刻までは読み込まずに同じエラーを返す（障害中に毎回読み込みを待たせない）。
+"""
+
+import threading
+import time
+
+
+class RefreshingSnapshot:
+    """
+    読み込み関数(loader)の結果を保持し、期限が来たらバックグラウンドで作り直すスナップショット。
+    """
+
+    def __init__(self, loader, refresh_interval: float, retry_interval: float, name: str = ""):
+        """
+        Args:
+            loader (callable): 引数なしで呼び出し、新しいデータを返す関数。失敗時は例外を送出する。
+            refresh_interval (float): データを作り直す間隔(秒)。
+            retry_interval (float): 作り直しに失敗した場合に、再挑戦するまでの秒数。
+            name (str): 統計情報に表示する名前。
+        """
+        self.name = name
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._value = None
+        self._loaded_at = None  # スナップショットを作成した時刻。Noneならまだ一度も取得できていない
+        self._next_refresh_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()  # 状態の読み書きを保護するロック
+        self._load_lock = threading.Lock()  # 読み込み関数が同時に複数実行されないようにするロック
+        self._stats = {"refreshes": 0, "failures": 0, "last_error": None}
+        self._last_exception = None  # 最後に失敗した時の例外。初回の読み込みの再挑戦を待つ間、これを送出する
+
+    def get(self):
+        """
+        現在のスナップショットを返す。
+        まだ一度も取得できていない場合だけは、その場で読み込んで結果を待つ（読み込みに失敗した場合は例外を送出する）。
+        初回の読み込みに失敗してから retry_interval 秒の間は、読み込まずに前回と同じ例外を送出する。
+        更新時刻を過ぎている場合は、裏側で作り直しを開始したうえで、今あるスナップショットをすぐに返す。
+        """
+        start_refresh = False
+        with self._lock:
+            loaded = self._loaded_at is not None
+            if loaded and not self._refreshing and time.time() >= self._next_refresh_at:
+                self._refreshing = True
+                start_refresh = True
+            value = self._value
+        if not loaded:
+            return self._load_now()
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, name=f"refresh-{self.name}", daemon=True).start()
+        return value
+
+    def _load_now(self):
+        """初回の読み込み。複数のスレッドが同時に呼び出しても、読み込みは1回だけ行われる。"""
+        self._raise_if_backing_off()
+        with self._load_lock:
+            with self._lock:
+                if self._loaded_at is not None:
+                    # 待っている間に、他のスレッドが読み込みを終えていた。
+                    return self._value
+            # 待っている間に他のスレッドの読み込みが失敗していれば、続けて読み込まずに同じ例外を送出する。
+            self._raise_if_backing_off()
+            self._run_loader()
+            with self._lock:
+                return self._value
+
+    def _raise_if_backing_off(self):
+        """初回の読み込みに失敗し、まだ再挑戦の時刻になっていなければ、前回の例外を送出する。"""
+        with self._lock:
+            error = self._last_exception
+            if error is None or time.time() >= self._next_refresh_at:
+                return
+        # 同じ例外を何度も送出するため、前回までのトレースバックを付けたままにしない。
+        raise error.with_traceback(None)
+
+    def _refresh_in_background(self):
+        """裏側のスレッドでデータを作り直す。失敗しても前回のスナップショットは残る。"""
+        try:
+            with self._load_lock:
+                self._run_loader()
+        except Exception as e:
+            print(f"{self.name or 'snapshot'} の更新に失敗しました。前回のデータを使い続けます: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _run_loader(self):
+        """読み込み関数を実行し、成功すればスナップショットを差し替える。失敗時は再挑戦の時刻を設定して例外を送出する。"""
+        try:
+            value = self._loader()
+        except Exception as e:
+            with self._lock:
+                self._stats["failures"] += 1
+                self._stats["last_error"] = str(e) or type(e).__name__
+                self._last_exception = e
+                self._next_refresh_at = time.time() + self.retry_interval
+            raise
+        now = time.time()
+        with self._lock:
+            self._value = value
+            self._loaded_at = now
+            self._last_exception = None
+            self._next_refresh_at = now + self.refresh_interval
+            self._stats["refreshes"] += 1
+
+    def invalidate(self):
+        """次回の get() で作り直しが始まるよう、更新時刻を現在にする（データ自体はそのまま残る）。"""
+        with self._lock:
+            self._next_refresh_at = 0.0
+
+    def stats(self) -> dict:
+        """作成からの経過秒数、更新・失敗の回数、最後のエラーなどを返す。"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["name"] = self.name
+            stats["age_seconds"] = time.time() - self._loaded_at if self._loaded_at is not None else None
+            stats["refreshing"] = self._refreshing
+            stats["next_refresh_in"] = max(0.0, self._next_refresh_at - time.time())
+        return stats
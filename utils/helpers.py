@@ -4,77 +4,186 @@
 データ処理など、アプリケーションの様々な場所で再利用される可能性のあるロジックをここに記述する。
 """
 
-# localeモジュールは、地域（国や言語）に合わせた数値や文字列の扱いを可能にする。
-# ここでは日本語の50音ソートに利用する。
-import locale
+import re
+import unicodedata
+
+from utils.metrics import timer
+from utils.search_index import normalize_for_search
+
+# 曲名の末尾に付く「(Music Video)」「[MV]」などの括弧書きを取り除くための正規表現。
+_BRACKETED = re.compile(r"[\(\[（【〔].*?[\)\]）】〕]")
+# 照合に関係のない記号や空白を取り除くための正規表現（英数字・かな・漢字だけを残す）。
+_NON_WORD = re.compile(r"[\W_]+")
+# 50音順で比較する時に無視する文字（濁点・半濁点の結合文字と長音記号）。「か」と「が」、「ケーキ」と「けき」を同じ位置に並べる。
+_KANA_IGNORABLE = dict.fromkeys(map(ord, "\u3099\u309aー"))
+
+
+def is_japanese_first_char(name: str) -> bool:
+    """文字列の先頭一文字が日本語（ひらがな、カタカナ、漢字）かどうかを判定する"""
+    if not name:
+        return False
+    c = name[0]
+    # Unicodeの文字コード範囲を使って判定する。
+    return (
+        "\u3040" <= c <= "\u309F"  # ひらがな
+        or "\u30A0" <= c <= "\u30FF"  # カタカナ
+        or "\u4E00" <= c <= "\u9FFF"  # CJK統合漢字
+    )
+
+
+def collation_keys(name: str) -> tuple:
+    """
+    曲名から、並べ替えに使う比較用のキーを作成する。
+
+    楽曲のレコードを作成する時に一度だけ呼び出し、並べ替えのたびに計算し直さなくて済むようにする。
+    50音順のキーはロケール（OSの言語設定）に依存せずに作成するため、どの環境でも同じ順番になり、
+    複数のセッションから同時に並べ替えても互いに影響しない。
+    - ひらがな・カタカナ・全角・半角を揃えた読み（カタカナはひらがなに揃える）で比較する。
+    - 濁点・半濁点と長音記号は無視して比較し、同じ位置に並んだもの同士は無視する前の文字列で比較する。
+    - 漢字は読みが分からないため、文字コードの順に並ぶ。
+
+    Args:
+        name (str): 曲名。
+
+    Returns:
+        tuple: (アルファベット順のキー, 50音順のキー)
+    """
+    name = name or ""
+    alpha_key = name.lower()
+    reading = normalize_for_search(name)
+    if is_japanese_first_char(reading):
+        primary = unicodedata.normalize("NFD", reading).translate(_KANA_IGNORABLE)
+        # 日本語の曲名は、それ以外の曲名より前に並ぶ。
+        kana_key = (0, primary, reading)
+    else:
+        kana_key = (1, alpha_key, "")
+    return alpha_key, kana_key
+
 
 def sort_results(results, sort_mode="アルファベット", order="昇順"):
     """
     楽曲リストを指定されたルールに基づいてソートする。
 
+    比較用のキーはレコードの作成時に計算済み(Track.sort_keys)なので、ここではキーを取り出して並べるだけ。
+
     Args:
-        results (list): ソート対象の楽曲情報の辞書のリスト。
+        results (list): ソート対象の楽曲のレコード(Track)のリスト。
         sort_mode (str): "アルファベット" または "50音"。
         order (str): "昇順" または "降順"。
 
     Returns:
         list: ソート後の楽曲リスト。
     """
-    # 50音ソートのために、システムの地域設定（ロケール）を日本語に設定する。
-    # Streamlit Cloudなどのサーバー環境では日本語ロケールがインストールされていない場合があるため、
-    # try-exceptブロックでエラーを捕捉し、失敗してもプログラムが停止しないようにする。
-    try:
-        locale.setlocale(locale.LC_ALL, 'ja_JP.UTF-8')
-    except locale.Error:
-        print("Warning: Could not set locale to ja_JP.UTF-8. 50-on sorting might not work as expected.")
-
     # orderが"降順"ならTrue、そうでなければFalseになる。sorted関数のreverse引数に使用する。
     reverse = (order == "降順")
 
-    def sort_key_alpha(item):
-        """アルファベットソート（辞書順）のためのキーを返す関数"""
-        # 曲名を小文字に変換して返す。これにより大文字・小文字を区別せずにソートされる。
-        return item.get("trackName", "").lower()
-
-    def sort_key_japanese(item):
-        """50音ソートのためのキーを返す関数"""
-        try:
-            # locale.strxfrmは、現在のロケール設定に従って文字列を比較可能な形式に変換する。
-            # これにより、ひらがな・カタカナが正しく50音順にソートされる。
-            return locale.strxfrm(item.get("trackName", ""))
-        except locale.Error:
-            # ロケール設定に失敗した場合は、フォールバックとしてアルファベットソートのキーを返す。
-            return item.get("trackName", "").lower()
-
-
-    if sort_mode == "50音":
-        # 50音ソートの場合、日本語の曲名とそれ以外（アルファベットなど）を分けてソートし、後で結合する。
-        # これにより、「あ→い→…→A→B→…」のような自然な並び順を実現する。
-        def is_japanese_first_char(name: str) -> bool:
-            """文字列の先頭一文字が日本語（ひらがな、カタカナ、漢字）かどうかを判定する"""
-            if not name:
-                return False
-            c = name[0]
-            # Unicodeの文字コード範囲を使って判定する。
-            return (
-                "\u3040" <= c <= "\u309F"  # ひらがな
-                or "\u30A0" <= c <= "\u30FF"  # カタカナ
-                or "\u4E00" <= c <= "\u9FFF"  # CJK統合漢字
-            )
-
-        # リスト内包表記を使って、日本語の曲とそれ以外の曲に振り分ける。
-        japanese = [r for r in results if is_japanese_first_char(r.get("trackName", ""))]
-        others = [r for r in results if not is_japanese_first_char(r.get("trackName", ""))]
-
-        # それぞれのリストを適切なキーでソートする。
-        japanese_sorted = sorted(japanese, key=sort_key_japanese, reverse=reverse)
-        others_sorted = sorted(others, key=sort_key_alpha, reverse=reverse)
-
-        # 降順の場合は、その他→日本語の順で結合する。
-        if reverse:
-            return others_sorted + japanese_sorted
+    with timer("sort_results_seconds", mode=sort_mode):
+        if sort_mode == "50音":
+            # 50音ソートの場合、日本語の曲名→それ以外（アルファベットなど）の順に並ぶ。
+            # これにより、「あ→い→…→A→B→…」のような自然な並び順を実現する。降順の場合は全体が逆になる。
+            return sorted(results, key=lambda item: item.sort_keys[1], reverse=reverse)
         else:
-            return japanese_sorted + others_sorted
-    else:
-        # アルファベットソートの場合は、単純にリスト全体をソートする。
-        return sorted(results, key=sort_key_alpha, reverse=reverse)
\ No newline at end of file
+            # アルファベットソートの場合は、曲名を小文字にしたキーでリスト全体をソートする。
+            return sorted(results, key=lambda item: item.sort_keys[0], reverse=reverse)
+
+
+class SortedViews:
+    """
+    1つの楽曲リストについて、並び順ごとのソート結果を保存しておくクラス。
+
+    並び順のラジオボタンを切り替えるたびにソートし直さず、一度作った並びを使い回す。
+    """
+
+    def __init__(self, items: list):
+        """
+        Args:
+            items (list): 楽曲のレコード(Track)のリスト。
+        """
+        self.items = items
+        self._views = {}  # (sort_mode, order) -> ソート済みのリスト
+
+    def get(self, sort_mode: str, order: str) -> list:
+        """指定された並び順のリストを返す。初めての並び順の場合だけソートする。"""
+        view = self._views.get((sort_mode, order))
+        if view is None:
+            view = sort_results(self.items, sort_mode, order)
+            self._views[(sort_mode, order)] = view
+        return view
+
+
+def clean_query(term: str) -> str:
+    """
+    検索キーワードの全角・半角を統一(NFKC)し、前後の空白の除去と連続する空白の1つへの置き換えを行う。
+    大文字・小文字はそのまま残すため、APIに送るキーワードに使う（例えば「ＹＯＡＳＯＢＩ 」は「YOASOBI」になる）。
+
+    Args:
+        term (str): 利用者が入力した検索キーワード。
+
+    Returns:
+        str: 整えた検索キーワード。
+    """
+    return " ".join(unicodedata.normalize("NFKC", term or "").split())
+
+
+def normalize_query(term: str) -> str:
+    """
+    検索キーワードを、キャッシュと重複リクエストの判定に使う正規の形に変換する。
+
+    clean_query() に加えて、大文字・小文字の統一を行う。
+    例えば「YOASOBI」「yoasobi 」「ＹＯＡＳＯＢＩ」は全て「yoasobi」になる。
+    キャッシュのキーにだけ使い、APIには利用者の表記を clean_query() で整えたキーワードを送る。
+
+    Args:
+        term (str): 利用者が入力した検索キーワード。
+
+    Returns:
+        str: 正規化された検索キーワード。
+    """
+    return clean_query(term).casefold()
+
+
+def normalize_title(text: str) -> str:
+    """
+    曲名やアーティスト名を、表記ゆれを吸収した照合用の文字列に変換する。
+
+    全角・半角の統一(NFKC)、大文字・小文字の統一、括弧書き・記号・空白の除去を行う。
+    例えば「夜に駆ける (Music Video)」と「夜に駆ける」は同じ文字列になる。
+
+    Args:
+        text (str): 変換する文字列。
+
+    Returns:
+        str: 照合用に正規化された文字列。
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _BRACKETED.sub("", text)
+    return _NON_WORD.sub("", text)
+
+
+def build_mv_index(songs, music_videos):
+    """
+    楽曲リストとミュージックビデオのリストを、アーティスト名と曲名で突き合わせる。
+
+    1曲ごとにMVを検索する代わりに、まとめて取得したMVを手元で照合するために使う。
+
+    Args:
+        songs (list): 楽曲のレコード(Track)のリスト。
+        music_videos (list): ミュージックビデオのレコード(Track)のリスト。
+
+    Returns:
+        dict: 楽曲のtrackIdをキー、対応するMVのレコードを値とする辞書。
+    """
+    # (アーティスト名, 曲名) の正規化キーからMVを引けるようにする。同じキーなら最初のMVを優先する。
+    mv_by_key = {}
+    for mv in music_videos:
+        key = (normalize_title(mv.artist_name), normalize_title(mv.track_name))
+        if key[1]:
+            mv_by_key.setdefault(key, mv)
+
+    index = {}
+    for song in songs:
+        key = (normalize_title(song.artist_name), normalize_title(song.track_name))
+        mv = mv_by_key.get(key)
+        if mv is not None and song.track_id is not None:
+            index[song.track_id] = mv
+    return index
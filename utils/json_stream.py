@@ -0,0 +1,194 @@
+# utils/json_stream.py
+"""
+iTunes APIのレスポンスを、届いた分から少しずつ読み込むためのモジュール。
+
+これまではレスポンスの本文を全て受け取ってから response.json() で1つの大きな辞書にしていたため、
+本文全体の文字列と、全件・全項目の辞書が同時にメモリに載っていた。画面で使うのは1件あたり10個程度の項目だけである。
+ここでは
+- 受け取った本文の断片(バイト列)を順に渡してもらい、"results" の配列の要素を1件ずつ読み込む。
+- 読み込んだ1件から、指定された項目だけを取り出した小さな辞書を残し、元の辞書はすぐに捨てる。
+ことで、メモリに載るのは未処理の断片と、1件分の辞書と、取り出した項目だけになる。
+1件ごとの読み込みには標準ライブラリの json のスキャナー（C言語で実装されている）を使うため、追加のライブラリは不要。
+"""
+
+import codecs
+import json
+import json.scanner
+import re
+
+# JSONの空白文字
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# 読み込みの状態
+_START = 0  # 先頭の { を待っている
+_KEY = 1  # キー、または（最初の項目の前なら）} を待っている
+_COLON = 2  # キーの後の : を待っている
+_VALUE = 3  # 値を待っている
+_AFTER_VALUE = 4  # 値の後の , または } を待っている
+_ITEM = 5  # "results" の要素、または（最初の要素の前なら）] を待っている
+_AFTER_ITEM = 6  # "results" の要素の後の , または ] を待っている
+_DONE = 7  # 最後の } まで読み込んだ
+
+
+class ResultStreamDecoder:
+    """
+    {"resultCount": n, "results": [{...}, ...]} の形のJSONを、断片ごとに読み込むデコーダー。
+    feed() で本文の断片を渡し、最後に finish() で結果のリストを受け取る。
+    """
+
+    def __init__(self, fields: tuple):
+        """
+        Args:
+            fields (tuple): "results" の各要素から残す項目の名前。ここにない項目は読み捨てる。
+        """
+        self.fields = tuple(fields)
+        self.results = []
+        # JSONDecoder.raw_decode と同じスキャナーを直接使い、1件ごとの呼び出しの負担を減らす。
+        self._scan = json.scanner.make_scanner(json.JSONDecoder())
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._text = ""  # まだ読み込んでいない文字列
+        self._state = _START
+        self._key = None  # 最後に読み込んだ最上位のキー
+        self._first = True  # 最初のキー・要素の前なら True（直後の } / ] を受け付ける）
+
+    def feed(self, chunk: bytes) -> None:
+        """本文の断片を渡す。読み込める要素があれば、その場で項目を取り出して results に加える。"""
+        # マルチバイト文字が断片の境目で分かれていても、続きが届くまで保留される。
+        self._text += self._utf8.decode(chunk)
+        self._parse(final=False)
+
+    def finish(self) -> list:
+        """
+        本文を全て渡した後に呼び出し、取り出した結果のリストを返す。
+
+        Raises:
+            json.JSONDecodeError: 本文が途中で終わっている、最後の } の後ろに余分なデータがある、
+                またはJSONとして正しくない場合。
+        """
+        self._text += self._utf8.decode(b"", final=True)
+        self._parse(final=True)
+        if self._state != _DONE:
+            raise json.JSONDecodeError("レスポンスの本文が途中で終わっています", self._text, len(self._text))
+        return self.results
+
+    def _value(self, text: str, pos: int, final: bool):
+        """
+        pos から始まるJSONの値を1つ読み込み、(値, 終わりの位置) を返す。続きが届いていなければNoneを返す。
+        """
+        try:
+            value, end = self._scan(text, pos)
+        except (StopIteration, json.JSONDecodeError) as e:
+            if final:
+                raise e if isinstance(e, json.JSONDecodeError) else json.JSONDecodeError("Expecting value", text, pos)
+            return None
+        if end == len(text) and not final:
+            # 数値は断片の境目で切れていても読み込めてしまう（"123" が "12" になる）ため、後ろに続きが届くまで待つ。
+            return None
+        return value, end
+
+    def _parse(self, final: bool) -> None:
+        """未処理の文字列を、読み込める所まで読み込む。"""
+        text = self._text
+        pos = 0
+        state = self._state
+        while True:
+            pos = _WHITESPACE.match(text, pos).end()
+            if pos >= len(text):
+                break
+            if state == _DONE:
+                # json.loads と同じく、最後の } の後ろには空白しか許さない（壊れた・連結されたレスポンスを受け付けない）。
+                raise json.JSONDecodeError("最後の '}' の後ろに余分なデータがあります", text, pos)
+            char = text[pos]
+            if state == _START:
+                if char != "{":
+                    raise json.JSONDecodeError("オブジェクトではありません", text, pos)
+                pos += 1
+                state, self._first = _KEY, True
+            elif state == _KEY:
+                if char == "}" and self._first:
+                    pos += 1
+                    state = _DONE
+                    continue
+                decoded = self._value(text, pos, final)
+                if decoded is None:
+                    break
+                self._key, pos = decoded
+                state = _COLON
+            elif state == _COLON:
+                if char != ":":
+                    raise json.JSONDecodeError("':' がありません", text, pos)
+                pos += 1
+                state = _VALUE
+            elif state == _VALUE:
+                if self._key == "results" and char == "[":
+                    pos += 1
+                    state, self._first = _ITEM, True
+                    continue
+                # "resultCount" など、"results" 以外の値は読み捨てる。
+                decoded = self._value(text, pos, final)
+                if decoded is None:
+                    break
+                pos = decoded[1]
+                state = _AFTER_VALUE
+            elif state == _AFTER_VALUE:
+                if char == ",":
+                    pos += 1
+                    state, self._first = _KEY, False
+                elif char == "}":
+                    pos += 1
+                    state = _DONE
+                else:
+                    raise json.JSONDecodeError("',' または '}' がありません", text, pos)
+            else:
+                pos, state = self._items(text, pos, state, final)
+                if state != _AFTER_VALUE:
+                    # 続きが届くまで待つ。
+                    break
+        self._state = state
+        # 読み込んだ部分を捨て、未処理の部分だけを残す。
+        self._text = text[pos:]
+
+    def _items(self, text: str, pos: int, state: int, final: bool) -> tuple:
+        """
+        "results" の配列の要素を、読み込める所まで続けて読み込み、(次の位置, 状態) を返す。
+        要素の数だけ繰り返す部分のため、区切りの , や空白もここでまとめて処理し、1件あたりの処理を少なくする。
+        配列を読み終えた場合、状態は _AFTER_VALUE になる。
+        """
+        scan = self._scan
+        fields = self.fields
+        append = self.results.append
+        length = len(text)
+        # 要素は辞書なので、最後の } より後ろから始まる要素はまだ届き切っていない。読み込みを試す前に判定し、無駄な読み込みを省く。
+        last_brace = text.rfind("}")
+        while pos < length:
+            char = text[pos]
+            if char in " \t\n\r":
+                pos = _WHITESPACE.match(text, pos).end()
+                continue
+            if state == _AFTER_ITEM:
+                if char == ",":
+                    pos += 1
+                    state, self._first = _ITEM, False
+                    continue
+                if char == "]":
+                    return pos + 1, _AFTER_VALUE
+                raise json.JSONDecodeError("',' または ']' がありません", text, pos)
+            if char == "]" and self._first:
+                return pos + 1, _AFTER_VALUE
+            if pos > last_brace and not final:
+                break
+            try:
+                item, end = scan(text, pos)
+            except (StopIteration, json.JSONDecodeError) as e:
+                if not final:
+                    break
+                raise e if isinstance(e, json.JSONDecodeError) else json.JSONDecodeError("Expecting value", text, pos)
+            if end == length and not final:
+                # 要素の後ろに続きが届いていなければ、数値が途中で切れている可能性があるため待つ。
+                break
+            if type(item) is dict:
+                # 必要な項目だけを取り出し、元の辞書は捨てる。
+                append({name: item[name] for name in fields if name in item})
+            pos, state = end, _AFTER_ITEM
+        return pos, state
+
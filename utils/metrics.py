@@ -0,0 +1,326 @@
+# utils/metrics.py
+"""
+処理時間と回数を計測し、管理者用のパネルやPrometheus形式のテキストで確認できるようにするモジュール。
+
+ページの表示が遅い時に、原因がiTunes APIの応答なのか、キャッシュのミスなのか、並べ替えなのか、画面の描画なのかを
+切り分けられるよう、主要な処理（APIの取得、キャッシュの確認、並べ替え、アプリ全体の再実行）の時間を記録する。
+- 時間はヒストグラム（あらかじめ決めた区間ごとの回数と合計）として、ラベル（entity、ページなど）ごとに集計する。
+- 回数はカウンターとして集計する。
+- サーキットブレーカーの状態のように、増えも減りもする現在の値はゲージとして記録する。
+- 計測を無効にしている場合(METRICS_ENABLED = False)、timer() は何もしない共通のオブジェクトを返すだけなので、
+  計測している箇所の負担はほぼない。
+"""
+
+import atexit
+import os
+import threading
+import time
+
+from config import METRICS_ENABLED, METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL
+
+# ヒストグラムの区間の上限(秒)。Prometheusの既定値に、キャッシュの確認や並べ替えのような1ミリ秒未満の処理用の区間を加えたもの。
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class _Histogram:
+    """1つのラベルの組についての、区間ごとの回数と合計値。"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size  # 区間ごとの回数（累積ではない）。最後の要素は最大の区間を超えた回数
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """
+    ヒストグラム・カウンター・ゲージを、名前とラベルの組ごとに保存するクラス。
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets (tuple): ヒストグラムの区間の上限(秒)の一覧（昇順）。
+        """
+        self.buckets = tuple(buckets)
+        self._histograms = {}  # (名前, ラベルの組) -> _Histogram
+        self._counters = {}  # (名前, ラベルの組) -> 値
+        self._gauges = {}  # (名前, ラベルの組) -> 現在の値
+        self._lock = threading.Lock()
+        self._dumped_at = time.monotonic()
+
+    def observe(self, name: str, value: float, labels: dict) -> None:
+        """ヒストグラムに値(秒)を1つ記録する。"""
+        key = (name, tuple(sorted(labels.items())))
+        # 値が入る区間の番号を探す。区間の数は少ないため、先頭から順に比べれば十分に速い。
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets) + 1)
+            histogram.counts[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def inc(self, name: str, value: float, labels: dict) -> None:
+        """カウンターを value だけ増やす。"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: dict) -> None:
+        """ゲージを value に設定する。"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def summary(self) -> dict:
+        """
+        管理者用のパネルに表示するため、記録した値を名前ごとにまとめて返す。
+
+        Returns:
+            dict: {"histograms": [...], "counters": [...], "gauges": [...]}。
+                  ヒストグラムの各要素は name, labels, count, mean, p50, p95, p99（いずれも秒）を持つ。
+        """
+        with self._lock:
+            histograms = [
+                (name, labels, list(h.counts), h.sum, h.count) for (name, labels), h in self._histograms.items()
+            ]
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+        rows = []
+        for name, labels, counts, total, count in sorted(histograms):
+            rows.append({
+                "name": name,
+                "labels": dict(labels),
+                "count": count,
+                "mean": total / count if count else 0.0,
+                "p50": self._quantile(counts, count, 0.50),
+                "p95": self._quantile(counts, count, 0.95),
+                "p99": self._quantile(counts, count, 0.99),
+            })
+        return {
+            "histograms": rows,
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(counters)
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(gauges)
+            ],
+        }
+
+    def _quantile(self, counts: list, count: int, q: float) -> float:
+        """区間ごとの回数から、分位点を区間の中での直線補間で見積もる。"""
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(counts):
+            if index == len(self.buckets):
+                # 最大の区間を超えた値は、最大の区間の上限として扱う。
+                return self.buckets[-1]
+            upper = self.buckets[index]
+            if bucket_count and seen + bucket_count >= target:
+                return lower + (upper - lower) * (target - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return self.buckets[-1]
+
+    def render_prometheus(self) -> str:
+        """記録した値を、Prometheusのテキスト形式(exposition format)で返す。"""
+        with self._lock:
+            histograms = [
+                (name, labels, list(h.counts), h.sum, h.count) for (name, labels), h in self._histograms.items()
+            ]
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+        lines = []
+        declared = set()
+        for name, labels, counts, total, count in sorted(histograms):
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, le=repr(bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in sorted(values):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} {kind}")
+                    declared.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def claim_dump(self, interval: float) -> bool:
+        """
+        前回のファイル出力から interval 秒以上が経っていればTrueを返す。
+        Trueを返した時点で出力の時刻を更新するため、同時に呼び出しても出力を始めるのは1回だけになる。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._dumped_at < interval:
+                return False
+            self._dumped_at = now
+            return True
+
+    def dump(self, path: str) -> None:
+        """Prometheus形式のテキストをファイルに書き出す（node_exporter の textfile collector などで読み込める）。"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 書き込み途中のファイルが読まれないよう、一時ファイルに書いてから置き換える。
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temporary, path)
+
+    def reset(self) -> None:
+        """記録した値を全て消す。"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+def _format_labels(labels: tuple, **extra) -> str:
+    """ラベルの組を、Prometheusのテキスト形式の {name="value",...} に変換する。"""
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _escape_label_value(value) -> str:
+    """ラベルの値の中のバックスラッシュ・ダブルクォート・改行をエスケープする。"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Timer:
+    """with文のブロックの実行時間をヒストグラムに記録する。"""
+
+    __slots__ = ("_registry", "_name", "_labels", "_start")
+
+    def __init__(self, registry: MetricsRegistry, name: str, labels: dict):
+        self._registry = registry
+        self._name = name
+        self._labels = labels
+
+    def set(self, **labels) -> None:
+        """計測の途中で分かったラベル（キャッシュにあったかどうかなど）を追加する。"""
+        self._labels.update(labels)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._registry.observe(self._name, time.perf_counter() - self._start, self._labels)
+        return False
+
+
+class _NullTimer:
+    """計測が無効な場合に使う、何もしないタイマー。"""
+
+    __slots__ = ()
+
+    def set(self, **labels) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+# --- プロセス全体で共有するレジストリ ---
+# Noneなら計測しない。METRICS_ENABLED で初期値を決め、set_metrics() で差し替えられる。
+_registry: MetricsRegistry | None = MetricsRegistry() if METRICS_ENABLED else None
+
+
+def get_metrics() -> MetricsRegistry | None:
+    """計測の記録先を返す。計測が無効ならNone。"""
+    return _registry
+
+
+def set_metrics(registry: MetricsRegistry | None) -> None:
+    """計測の記録先を差し替える。Noneを渡すと計測を止める（ベンチマークで計測を有効にする時などに使う）。"""
+    global _registry
+    _registry = registry
+
+
+def timer(name: str, **labels):
+    """
+    with文のブロックの実行時間を、名前とラベルごとのヒストグラムに記録する。
+
+    例:
+        with timer("itunes_fetch_seconds", entity="song", page=0) as timing:
+            ...
+            timing.set(source="cache")
+
+    Args:
+        name (str): ヒストグラムの名前（Prometheusの命名規則に従い、単位の _seconds で終える）。
+        **labels: 集計を分けるラベル。
+
+    Returns:
+        計測が有効なら時間を記録するタイマー、無効なら何もしないタイマー。
+    """
+    registry = _registry
+    if registry is None:
+        return _NULL_TIMER
+    return _Timer(registry, name, labels)
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """カウンターを value だけ増やす。計測が無効なら何もしない。"""
+    registry = _registry
+    if registry is not None:
+        registry.inc(name, value, labels)
+
+
+def gauge(name: str, value: float, **labels) -> None:
+    """ゲージを value に設定する。計測が無効なら何もしない。"""
+    registry = _registry
+    if registry is not None:
+        registry.set_gauge(name, value, labels)
+
+
+def maybe_dump() -> None:
+    """前回から METRICS_DUMP_INTERVAL 秒以上が経っていれば、METRICS_DUMP_PATH にPrometheus形式で書き出す。"""
+    registry = _registry
+    if registry is None or not METRICS_DUMP_PATH or not registry.claim_dump(METRICS_DUMP_INTERVAL):
+        return
+    _dump(registry)
+
+
+def _dump(registry: MetricsRegistry) -> None:
+    """ファイルに書き出す。失敗してもアプリの動作には影響しないため、ログを出すだけにする。"""
+    try:
+        registry.dump(METRICS_DUMP_PATH)
+    except OSError as e:
+        print(f"メトリクスの書き出しに失敗しました: {e}")
+
+
+def _dump_at_exit() -> None:
+    """プロセスの終了時に、最後の値を書き出す。"""
+    registry = _registry
+    if registry is not None and METRICS_DUMP_PATH:
+        _dump(registry)
+
+
+# Pythonプロセスが終了する際に、自動で最後の値が書き出されるように登録する。
+atexit.register(_dump_at_exit)
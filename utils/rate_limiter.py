@@ -0,0 +1,164 @@
+# utils/rate_limiter.py
+"""
+iTunes Search APIへのリクエスト頻度を、プロセス全体で制限するためのモジュール。
+
+iTunes Search APIは1つのIPアドレスあたり毎分20回程度で制限がかかり、
+制限されると403/429が返ってきて、全ての利用者の画面が空になってしまう。
+ここではトークンバケット方式でリクエストの送信ペースを抑え、
+- 優先度（ユーザーの検索 > ホーム画面の裏側での取得）の高い順に送信枠を割り当てる
+- 403/429を受け取ったら、ゆらぎ（ジッター）を加えながら待ち時間を倍々に延ばす
+ことで、制限にかかりにくく、かかっても早く回復できるようにする。
+
+全ての処理はAPIクライアントのバックグラウンドのイベントループ上で動くことを前提としているため、ロックは使わない。
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+# --- 優先度 ---
+# 数値が小さいほど優先される。
+PRIORITY_INTERACTIVE = 0  # ユーザーの操作による検索（検索結果画面、MVの検索など）
+PRIORITY_BACKGROUND = 1  # ホーム画面のカルーセルやジャンルのアートワークなど、裏側での取得
+
+
+class RateLimiter:
+    """
+    優先度付きのトークンバケット。acquire() で送信枠（トークン）を1つ受け取るまで待つ。
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, backoff_base: float = 5.0, backoff_max: float = 120.0):
+        self.rate = max(rate_per_minute, 1e-9) / 60.0  # 1秒あたりに補充されるトークン数
+        self.capacity = max(1, burst)  # バケットに貯められるトークンの上限（連続して送れる回数）
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0  # 403/429を受け取った後、この時刻までは送信しない
+        self._backoff = 0.0  # 現在の待ち時間の基準値（成功が続くと0に戻っていく）
+        self._waiters = []  # (優先度, 到着順, Future) のヒープ
+        self._sequence = itertools.count()
+        self._timer = None
+        self._stats = {
+            "acquired": 0,
+            "waited": 0,  # すぐに送信できず、待ちが発生した回数
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "throttled": 0,  # 403/429を受け取った回数
+        }
+
+    def _refill(self, now: float) -> None:
+        """前回からの経過時間に応じてトークンを補充する。送信を停止している間は補充しない。"""
+        since = max(self._updated, self._blocked_until)
+        if now > since:
+            self._tokens = min(self.capacity, self._tokens + (now - since) * self.rate)
+        self._updated = max(self._updated, now)
+
+    def _record_wait(self, waited: float) -> None:
+        self._stats["acquired"] += 1
+        if waited > 0:
+            self._stats["waited"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """
+        送信枠を1つ受け取るまで待つ。
+
+        Args:
+            priority (int): PRIORITY_INTERACTIVE または PRIORITY_BACKGROUND。
+
+        Returns:
+            float: 待った秒数。
+        """
+        now = time.monotonic()
+        self._refill(now)
+        # 待っている人がおらず、制限中でもなく、トークンが残っていればすぐに送信できる。
+        if not self._waiters and now >= self._blocked_until and self._tokens >= 1:
+            self._tokens -= 1
+            self._record_wait(0.0)
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # キャンセルされた待ちはヒープに残るが、_dispatch() で読み飛ばされる。
+            self._schedule()
+            raise
+        waited = time.monotonic() - now
+        self._record_wait(waited)
+        return waited
+
+    def try_acquire(self) -> bool:
+        """
+        すぐに送信できる場合だけ送信枠を1つ受け取ってTrueを返す。待っている人がいる、制限中、トークンがない場合はFalse。
+        ヘッジリクエストのように、送らなくても困らない追加の送信に使う（通常の送信の順番を追い越さない）。
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self._waiters or now < self._blocked_until or self._tokens < 1:
+            return False
+        self._tokens -= 1
+        self._record_wait(0.0)
+        return True
+
+    def _schedule(self) -> None:
+        """次にトークンを割り当てられる時刻に、_dispatch() が呼ばれるよう予約する。"""
+        if self._timer is not None or not self._waiters:
+            return
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        # 送信停止中であれば、停止が明けてからトークンが1つ貯まるまで待つ。
+        ready_at = max(now, self._blocked_until) + max(0.0, 1 - self._tokens) / self.rate
+        self._timer = loop.call_later(max(0.0, ready_at - now), self._dispatch)
+
+    def _dispatch(self) -> None:
+        """トークンがある限り、優先度の高い順に待っている呼び出し元へ送信枠を渡す。"""
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and now >= self._blocked_until and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # キャンセル済みの待ちは読み飛ばす。
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        # キャンセル済みの待ちだけが残っている場合は取り除く。
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        self._schedule()
+
+    def on_throttled(self, retry_after: float | None = None) -> float:
+        """
+        403/429を受け取った時に呼び出す。送信を一時停止し、停止する秒数を返す。
+        サーバーから Retry-After が指定されていればそれに従い、なければ待ち時間を倍々に延ばす。
+        複数のプロセスが同時に再開して再び制限されないよう、待ち時間にはゆらぎ（ジッター）を加える。
+        """
+        self._stats["throttled"] += 1
+        self._backoff = min(self.backoff_max, self._backoff * 2 if self._backoff else self.backoff_base)
+        delay = retry_after if retry_after is not None else self._backoff * random.uniform(0.5, 1.5)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        # 停止が明けた直後に一斉に送信しないよう、バケットを空にする。
+        self._tokens = 0.0
+        return delay
+
+    def on_success(self) -> None:
+        """リクエストが成功した時に呼び出す。待ち時間の基準値を少しずつ元に戻す。"""
+        if self._backoff:
+            self._backoff = self._backoff / 2 if self._backoff / 2 >= self.backoff_base else 0.0
+
+    def stats(self) -> dict:
+        """待ち行列の長さ、待ち時間、制限を受けた回数などを返す。"""
+        stats = dict(self._stats)
+        stats["queue_depth"] = sum(1 for _, _, future in self._waiters if not future.done())
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["waited"] if stats["waited"] else 0.0
+        stats["tokens"] = self._tokens
+        stats["backoff_seconds"] = self._backoff
+        stats["blocked_for"] = max(0.0, self._blocked_until - time.monotonic())
+        return stats
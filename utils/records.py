@@ -0,0 +1,115 @@
+# utils/records.py
+"""
+iTunes APIの検索結果（JSONの辞書）を、画面表示に必要な項目だけを持つ小さなレコードに変換するモジュール。
+
+iTunes APIの1件の結果には数十個の項目が含まれるが、画面で使うのはそのうちの10個程度しかない。
+全項目を持つ辞書をセッションごとに保存すると、同時に利用している人数に比例してメモリが増えてしまう。
+ここでは
+- 必要な項目だけを __slots__ を使った変更不可のレコード(Track)に詰め替え、
+- 同じ内容のレコードはプロセス内で1つだけ作ってセッション間で共有する
+ことで、各セッションが持つのはレコードへの参照（ポインタ）だけになるようにする。
+"""
+
+import threading
+import weakref
+from dataclasses import dataclass, field, fields
+
+from utils.helpers import collation_keys
+
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+class Track:
+    """
+    画面表示に必要な項目だけを持つ、楽曲・ミュージックビデオ・アルバムのレコード。
+    frozen=True により作成後は変更できないため、複数のセッションから安全に共有できる。
+    """
+    track_id: int | None = None  # trackId（アルバムの場合はNone）
+    collection_id: int | None = None  # collectionId
+    track_name: str = ""  # trackName（曲名・MV名）
+    artist_name: str = ""  # artistName
+    collection_name: str = ""  # collectionName（アルバム名）
+    artwork_url: str = ""  # artworkUrl100（100x100のアートワーク）
+    preview_url: str | None = None  # previewUrl（試聴・プレビュー用のURL）
+    track_view_url: str | None = None  # trackViewUrl（Apple Musicの楽曲ページ）
+    collection_view_url: str | None = None  # collectionViewUrl（Apple Musicのアルバムページ）
+    track_price: float | None = None  # trackPrice
+    # 曲名の並べ替え用のキー (アルファベット順, 50音順)。作成時に一度だけ計算し、比較には使わない。
+    sort_keys: tuple = field(default=(), init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        # frozen=True のため通常の代入はできないので、object.__setattr__ で設定する。
+        object.__setattr__(self, "sort_keys", collation_keys(self.track_name))
+
+
+# iTunes APIの項目名と、Trackの属性名の対応表。ここにない項目は読み捨てる。
+FIELD_MAP = {
+    "trackId": "track_id",
+    "collectionId": "collection_id",
+    "trackName": "track_name",
+    "artistName": "artist_name",
+    "collectionName": "collection_name",
+    "artworkUrl100": "artwork_url",
+    "previewUrl": "preview_url",
+    "trackViewUrl": "track_view_url",
+    "collectionViewUrl": "collection_view_url",
+    "trackPrice": "track_price",
+}
+
+# Trackの属性名 -> 既定値。APIの結果に項目がない場合に、共有中のレコードの値と比べるために使う。
+_DEFAULTS = {f.name: f.default for f in fields(Track) if f.init}
+
+# 同じ内容のレコードを使い回すための置き場。どのセッションからも参照されなくなったレコードは自動で消える。
+_pool = weakref.WeakValueDictionary()
+_pool_lock = threading.Lock()
+
+
+def _matches(track: Track, values: dict) -> bool:
+    """レコードの各項目が、APIの結果から取り出した値（ない項目は既定値）と同じならTrueを返す。"""
+    return all(getattr(track, attr) == values.get(attr, default) for attr, default in _DEFAULTS.items())
+
+
+def project_track(raw: dict) -> Track:
+    """
+    iTunes APIの1件分の辞書を Track に変換する。
+    同じ内容のレコードが既にあれば、新しく作らずにそれを返す。
+
+    Args:
+        raw (dict): iTunes APIの1件分の結果。
+
+    Returns:
+        Track: 変換したレコード。
+    """
+    values = {attr: raw[key] for key, attr in FIELD_MAP.items() if raw.get(key) is not None}
+    key = (values.get("track_id"), values.get("collection_id"))
+    with _pool_lock:
+        shared = _pool.get(key)
+    # 共有中のレコードと項目の値が同じなら、Trackを作らずに（並べ替え用のキーも計算せずに）それを返す。
+    if shared is not None and _matches(shared, values):
+        return shared
+    track = Track(**values)
+    with _pool_lock:
+        shared = _pool.get(key)
+        if shared is not None and shared == track:
+            return shared
+        # 内容が変わっていた場合（価格の変更など）は新しいレコードに置き換える。古いレコードを参照しているセッションはそのまま使える。
+        _pool[key] = track
+    return track
+
+
+def project_results(results: list) -> list:
+    """
+    iTunes APIの結果のリストを Track のリストに変換する。
+
+    Args:
+        results (list): iTunes APIの結果（辞書）のリスト。
+
+    Returns:
+        list: Track のリスト。
+    """
+    return [project_track(raw) for raw in results]
+
+
+def pool_size() -> int:
+    """現在プロセス内で共有されているレコードの数を返す。"""
+    with _pool_lock:
+        return len(_pool)
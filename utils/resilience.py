@@ -0,0 +1,131 @@
+# utils/resilience.py
+"""
+iTunes APIの応答が遅い・失敗が続く時に、画面の表示が長く待たされないようにするための仕組みを提供するモジュール。
+
+- LatencyTracker: 直近の応答時間を記録し、分位点(p95など)を返す。ヘッジリクエストを送るまでの待ち時間に使う。
+- CircuitBreaker: 直近のリクエストの失敗の割合が閾値を超えたら、しばらくの間APIへの送信を止める（回路を開く）。
+                  止めている間はAPIの応答を待たずにすぐに失敗させ、呼び出し元はキャッシュの古いデータなどで表示を続ける。
+                  一定時間が経ったら1件だけ試しに送信し、成功すれば元に戻す。
+
+全ての処理はAPIクライアントのバックグラウンドのイベントループ上で動くことを前提としているため、ロックは使わない。
+"""
+
+import time
+from collections import deque
+
+# 回路の状態
+STATE_CLOSED = "closed"  # 通常どおり送信する
+STATE_OPEN = "open"  # 送信せず、すぐに失敗させる
+STATE_HALF_OPEN = "half_open"  # 試しに1件だけ送信し、結果で closed / open に戻す
+
+# メトリクスに出力する時の、状態ごとの数値
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class LatencyTracker:
+    """
+    直近の応答時間を一定件数だけ保存し、分位点を返す。
+    """
+
+    def __init__(self, window: int):
+        """
+        Args:
+            window (int): 保存する応答時間の件数。古いものから捨てる。
+        """
+        self._samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        """応答時間(秒)を1件記録する。"""
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """保存している応答時間の q 分位点を返す。記録がなければNone。"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    失敗の割合に応じて送信を止める、1つのエンドポイント用のサーキットブレーカー。
+    """
+
+    def __init__(self, failure_ratio: float, min_requests: int, window_seconds: float, open_seconds: float):
+        """
+        Args:
+            failure_ratio (float): 回路を開く失敗の割合(0〜1)。
+            min_requests (int): 失敗の割合を判定するのに必要な、直近のリクエスト数の下限。
+            window_seconds (float): 失敗の割合を数える期間(秒)。これより古い結果は数えない。
+            open_seconds (float): 回路を開いてから、試しに送信するまでの秒数。
+        """
+        self.failure_ratio = failure_ratio
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self._results = deque()  # (時刻, 成功ならTrue)
+        self._opened_at = 0.0
+        self._probing = False  # 半開の状態で、試しの送信を実行中ならTrue
+        self._stats = {"rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """
+        送信してよければTrueを返す。回路が開いている間はFalse。
+        開いてから open_seconds が経っていれば半開の状態に移り、最初の1件だけTrueを返す。
+        """
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self.state = STATE_HALF_OPEN
+        if self.state == STATE_HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self._stats["rejected"] += 1
+        return False
+
+    def record(self, success: bool) -> None:
+        """送信した結果を記録し、必要なら回路の状態を変える。"""
+        now = time.monotonic()
+        if self.state == STATE_HALF_OPEN:
+            self._probing = False
+            if success:
+                # 試しの送信が成功したので、これまでの失敗を忘れて通常に戻す。
+                self.state = STATE_CLOSED
+                self._results.clear()
+            else:
+                self._open(now)
+            return
+        self._results.append((now, success))
+        while self._results and now - self._results[0][0] > self.window_seconds:
+            self._results.popleft()
+        if self.state == STATE_CLOSED and len(self._results) >= self.min_requests:
+            failures = sum(1 for _, ok in self._results if not ok)
+            if failures / len(self._results) >= self.failure_ratio:
+                self._open(now)
+
+    def release(self) -> None:
+        """
+        allow() で許可された送信が、キャンセルなどで結果を記録せずに終わった時に呼び出す。
+        半開の状態なら試しの送信を取り消し、次の allow() で改めて試しの送信ができるようにする。
+        """
+        self._probing = False
+
+    def _open(self, now: float) -> None:
+        self.state = STATE_OPEN
+        self._opened_at = now
+        self._results.clear()
+        self._stats["opened"] += 1
+
+    def stats(self) -> dict:
+        """現在の状態、送信を止めた回数、回路を開いた回数などを返す。"""
+        stats = dict(self._stats)
+        stats["state"] = self.state
+        stats["recent_requests"] = len(self._results)
+        stats["recent_failures"] = sum(1 for _, ok in self._results if not ok)
+        if self.state == STATE_OPEN:
+            stats["retry_in"] = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        return stats
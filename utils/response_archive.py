@@ -0,0 +1,197 @@
+# utils/response_archive.py
+"""
+iTunes APIへのリクエストとレスポンスの組を記録し、後から同じレスポンスを再生するためのアーカイブを提供するモジュール。
+
+- 記録(record): APIに送ったリクエストのパラメータと、返ってきたステータスコード・本文・応答時間をSQLiteファイルに保存する。
+                本文はzlibで圧縮して保存するため、ファイルは小さく保てる。
+- 再生(replay): ネットワークに一切接続せず、保存しておいたレスポンスを返す。
+                ベンチマークを毎回同じ条件で実行したり、APIに接続できない環境でホーム画面などを表示したりするために使う。
+
+再生時のリクエストとの照合には2つの方式がある。
+- exact:      パラメータが完全に一致するレスポンスだけを返す。
+- normalized: キーワードを正規化(normalize_query)し、entity・国・取得開始位置(offset)が同じで、
+              件数(limit)が要求以上のレスポンスを返す（要求より多ければ先頭から limit 件に切り詰める）。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from utils.helpers import normalize_query
+
+# 動作モード
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# 再生時の照合方式
+MATCH_EXACT = "exact"
+MATCH_NORMALIZED = "normalized"
+
+# 再生時の応答時間に、記録した時の応答時間を使う場合の指定
+LATENCY_RECORDED = "recorded"
+
+
+class ArchiveMiss(Exception):
+    """再生モードで、リクエストに対応するレスポンスがアーカイブになかった場合に送出される例外。"""
+
+
+class ResponseArchive:
+    """
+    iTunes APIのリクエストとレスポンスの組を保存・再生するアーカイブ。
+    複数のスレッド・プロセスから同じファイルを使える。
+    """
+
+    def __init__(self, path: str, mode: str, match: str = MATCH_NORMALIZED, latency: float | str = 0.0):
+        """
+        Args:
+            path (str): アーカイブのSQLiteファイルのパス。
+            mode (str): MODE_RECORD または MODE_REPLAY。
+            match (str): 再生時の照合方式。MATCH_EXACT または MATCH_NORMALIZED。
+            latency (float | str): 再生時にレスポンスを返すまでに待つ秒数。
+                                   LATENCY_RECORDED を指定すると、記録した時の応答時間だけ待つ。
+        """
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"不明なアーカイブのモードです: {mode}")
+        if match not in (MATCH_EXACT, MATCH_NORMALIZED):
+            raise ValueError(f"不明な照合方式です: {match}")
+        self.path = path
+        self.mode = mode
+        self.match = match
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 複数スレッドから使うため check_same_thread=False とし、アクセスはロックで直列化する。
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS exchanges (
+                exact_key TEXT PRIMARY KEY,
+                normalized_key TEXT NOT NULL,
+                result_limit INTEGER NOT NULL,
+                status INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                latency REAL NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_exchanges_normalized ON exchanges (normalized_key, result_limit)"
+        )
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    @staticmethod
+    def exact_key(params: dict) -> str:
+        """パラメータを順番に依存しない文字列にして、完全一致の照合に使うキーを作成する。"""
+        return json.dumps({name: str(value) for name, value in params.items()}, sort_keys=True, ensure_ascii=False)
+
+    @staticmethod
+    def normalized_key(params: dict) -> str:
+        """件数以外のパラメータを正規化して、正規化した照合に使うキーを作成する。"""
+        return json.dumps(
+            [
+                normalize_query(str(params.get("term", ""))),
+                str(params.get("entity", "")),
+                str(params.get("country", "")).upper(),
+                int(params.get("offset", 0)),
+            ],
+            ensure_ascii=False,
+        )
+
+    def record(self, params: dict, status: int, body: bytes, latency: float) -> None:
+        """
+        リクエストとレスポンスの組を保存する。同じパラメータのリクエストは新しいもので上書きする。
+
+        Args:
+            params (dict): APIに送ったクエリパラメータ。
+            status (int): HTTPステータスコード。
+            body (bytes): レスポンスの本文（展開済みのもの）。
+            latency (float): 応答時間(秒)。
+        """
+        row = (
+            self.exact_key(params),
+            self.normalized_key(params),
+            int(params.get("limit", 0)),
+            status,
+            zlib.compress(body, 6),
+            latency,
+            time.time(),
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exchanges"
+                " (exact_key, normalized_key, result_limit, status, body, latency, recorded_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._stats["recorded"] += 1
+
+    def lookup(self, params: dict) -> tuple:
+        """
+        リクエストに対応する、保存されたレスポンスを返す。
+
+        Args:
+            params (dict): APIに送るクエリパラメータ。
+
+        Returns:
+            tuple: (ステータスコード, 本文, 記録した時の応答時間(秒))。
+
+        Raises:
+            ArchiveMiss: 対応するレスポンスが保存されていない場合。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, body, latency, result_limit FROM exchanges WHERE exact_key = ?",
+                (self.exact_key(params),),
+            ).fetchone()
+            if row is None and self.match == MATCH_NORMALIZED:
+                # 要求以上の件数で記録されたもののうち、最も件数の少ないものを使う。
+                row = self._conn.execute(
+                    "SELECT status, body, latency, result_limit FROM exchanges"
+                    " WHERE normalized_key = ? AND result_limit >= ? ORDER BY result_limit LIMIT 1",
+                    (self.normalized_key(params), int(params.get("limit", 0))),
+                ).fetchone()
+            self._stats["replayed" if row is not None else "misses"] += 1
+        if row is None:
+            raise ArchiveMiss(f"アーカイブに記録されていないリクエストです: {params.get('term')!r} ({params.get('entity')})")
+        status, body, latency, recorded_limit = row
+        body = zlib.decompress(body)
+        limit = int(params.get("limit", 0))
+        if status == 200 and recorded_limit > limit:
+            # 要求より多い件数で記録されていれば、先頭から limit 件に切り詰める。
+            payload = json.loads(body)
+            payload["results"] = payload.get("results", [])[:limit]
+            payload["resultCount"] = len(payload["results"])
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return status, body, latency
+
+    def replay_delay(self, recorded_latency: float) -> float:
+        """再生時にレスポンスを返すまでに待つ秒数を返す。"""
+        if self.latency == LATENCY_RECORDED:
+            return recorded_latency
+        return float(self.latency or 0.0)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        """記録・再生した回数、見つからなかった回数、保存件数とファイル上のバイト数を返す。"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM exchanges"
+            ).fetchone()
+            stats = dict(self._stats)
+        stats.update({"mode": self.mode, "match": self.match, "path": self.path, "entries": entries, "bytes": total})
+        return stats
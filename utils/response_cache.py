@@ -0,0 +1,369 @@
+# utils/response_cache.py
+"""
+iTunes APIのレスポンスを保存しておくキャッシュ層を提供するモジュール。
+
+保存先（バックエンド）は差し替え可能になっている。
+- MemoryLRUBackend: プロセス内のメモリに保存する。容量(バイト数)の上限を超えると、最も長く使われていないものから破棄する。
+- SQLiteBackend: ディスク上のSQLiteファイルに保存する。複数のStreamlitワーカープロセスから共有でき、
+                 再起動やデプロイ後もキャッシュが残る。
+
+どちらのバックエンドも、値はJSONをUTF-8でエンコードしたバイト列として保存するため、
+保存されているデータ量を正確に数えることができる。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class CacheBackend(ABC):
+    """
+    キャッシュの保存先が実装すべきメソッドを定めた基底クラス。
+    実装していないメソッドがあるバックエンドは、作成した時点で TypeError になる。
+    値はバイト列、有効期限はUNIX時刻(秒)で受け渡しする。
+    """
+
+    # ディスクなどへの入出力で待たされることがあればTrue。APIクライアントは、Trueのバックエンドを
+    # イベントループを止めないようスレッドプールから呼び出す。
+    blocking = True
+
+    @abstractmethod
+    def get(self, key: str) -> tuple | None:
+        """キーに対応する (値, 有効期限) を返す。存在しなければNoneを返す。"""
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, expires_at: float) -> None:
+        """キーに値を保存する。"""
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """キーに対応する値を削除する。"""
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        """全ての値を削除する。"""
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """保存件数、合計バイト数、破棄した件数などを返す。"""
+        ...
+
+
+class MemoryLRUBackend(CacheBackend):
+    """プロセス内メモリに保存する、バイト数上限付きのLRUキャッシュ。"""
+
+    # メモリ上の辞書の操作だけで待たされることはないため、イベントループから直接呼び出してよい。
+    blocking = False
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, expires_at)。末尾ほど最近使われたもの
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(key: str, value: bytes) -> int:
+        return len(key.encode("utf-8")) + len(value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                # 使われたものを末尾に移動し、破棄される順番を後ろにする。
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(key, old[0])
+            self._data[key] = (value, expires_at)
+            self._bytes += self._size(key, value)
+            # 上限を超えている間、最も長く使われていないもの（先頭）から破棄する。
+            while self._bytes > self.max_bytes and len(self._data) > 1:
+                old_key, (old_value, _) = self._data.popitem(last=False)
+                self._bytes -= self._size(old_key, old_value)
+                self._evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(key, old[0])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+            }
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    SQLiteファイルに保存するキャッシュ。複数のプロセスから同じファイルを共有できる。
+    合計サイズが上限を超えると、最後に参照された時刻が古いものから破棄する。
+    合計サイズは書き込みのたびに全件を数え直さず、このプロセスでの増減を足し合わせた見積もりで判定する。
+    他のプロセスの書き込みは見積もりに入らないため、RECOUNT_INTERVAL 回の書き込みごとに数え直して補正する。
+    最後に参照された時刻は、読み込みのたびに書き込むとプロセス間で書き込みのロックを奪い合うため、
+    メモリにためておき、数え直し・破棄の前か ACCESS_FLUSH_SIZE 件たまった時にまとめて書き込む。
+    """
+
+    RECOUNT_INTERVAL = 256
+    ACCESS_FLUSH_SIZE = 256
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._evictions = 0
+        self._writes = 0  # 前回数え直してからの書き込み回数
+        self._accessed = {}  # キー -> まだファイルに書き込んでいない、最後に参照された時刻
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 複数スレッドから使うため check_same_thread=False とし、アクセスはロックで直列化する。
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        # WALモードにすると、あるプロセスが書き込み中でも他のプロセスが読み込みを続けられる。
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self._bytes = self._count_bytes()  # 合計サイズの見積もり
+
+    def _count_bytes(self) -> int:
+        """保存されているデータの合計サイズを数える（全件を読むため、必要な時だけ呼び出す）。"""
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _flush_accessed_locked(self):
+        """ためておいた参照時刻を、1つのトランザクションでまとめて書き込む。"""
+        if not self._accessed:
+            return
+        updates = [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+        self._accessed.clear()
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?", updates)
+            self._conn.execute("COMMIT")
+        except sqlite3.Error:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.ACCESS_FLUSH_SIZE:
+                self._flush_accessed_locked()
+            return bytes(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        size = len(key.encode("utf-8")) + len(value)
+        with self._lock:
+            # 上書きする場合は、元のサイズを見積もりから差し引く（主キーでの検索なので速い）。
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, expires_at, size, time.time()),
+            )
+            self._bytes += size - (old[0] if old else 0)
+            self._accessed.pop(key, None)
+            self._writes += 1
+            if self._writes >= self.RECOUNT_INTERVAL:
+                self._flush_accessed_locked()
+                self._bytes = self._count_bytes()
+                self._writes = 0
+            if self._bytes > self.max_bytes:
+                self._evict_locked()
+
+    def _evict_locked(self):
+        """合計サイズが上限以下になるまで、期限切れのもの→参照が古いものの順に削除する。"""
+        # 見積もりが上限を超えた時だけ、正確な合計サイズを数え直してから判定する。
+        total = self._count_bytes()
+        if total <= self.max_bytes:
+            self._bytes, self._writes = total, 0
+            return
+        # 参照が古いものから破棄するため、ためておいた参照時刻を先に書き込む。
+        self._flush_accessed_locked()
+        removed = self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+        self._evictions += removed
+        total = self._count_bytes()
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        victims = []
+        for key, size in rows:
+            if total <= self.max_bytes or len(rows) - len(victims) <= 1:
+                break
+            victims.append((key,))
+            total -= size
+        if victims:
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self._evictions += len(victims)
+        self._bytes, self._writes = total, 0
+
+    def delete(self, key):
+        with self._lock:
+            self._accessed.pop(key, None)
+            old = self._conn.execute("DELETE FROM responses WHERE key = ? RETURNING size", (key,)).fetchone()
+            if old is not None:
+                self._bytes -= old[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._accessed.clear()
+            self._bytes, self._writes = 0, 0
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush_accessed_locked()
+            except sqlite3.Error:
+                pass  # 参照時刻は破棄の順番にしか使わないため、書き込めなくても閉じる処理を続ける。
+            self._conn.close()
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+        }
+
+
+class ResponseCache:
+    """
+    バックエンドの上に、JSONへの変換・種類(entity)ごとの有効期限・ヒット率の集計を加えたキャッシュ。
+    """
+
+    def __init__(
+        self, backend: CacheBackend, ttls: dict | None = None, default_ttl: float = 3600, stale_ttl: float = 0
+    ):
+        """
+        Args:
+            backend (CacheBackend): 保存先。
+            ttls (dict | None): 種類(entity)ごとの有効期限(秒)。
+            default_ttl (float): ttls に設定がない種類の有効期限(秒)。
+            stale_ttl (float): 有効期限が切れた後も、APIの障害時の代わりとして get_stale() で返せるよう残しておく秒数。
+        """
+        self.backend = backend
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "sets": 0, "stale_hits": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def ttl_for(self, entity: str | None) -> float:
+        """種類(entity)ごとに設定された有効期限(秒)を返す。設定がなければデフォルト値を返す。"""
+        return self.ttls.get(entity, self.default_ttl)
+
+    def get(self, key: str):
+        """
+        キーに対応する値を返す。存在しない、または有効期限が切れている場合はNoneを返す。
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count("misses")
+            return None
+        value, expires_at = entry
+        now = time.time()
+        if expires_at <= now:
+            # 期限切れのデータは見つからなかったものとして扱う。
+            # stale_ttl の間は get_stale() で使えるよう残し、それを過ぎたものは削除する。
+            if now - expires_at >= self.stale_ttl:
+                self.backend.delete(key)
+            self._count("expired")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(value)
+
+    def get_stale(self, key: str):
+        """
+        有効期限が切れていても、切れてから stale_ttl 秒以内の値なら返す。APIに接続できない時の代わりに使う。
+        存在しない、または stale_ttl を過ぎている場合はNoneを返す。
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.time() - expires_at >= self.stale_ttl:
+            return None
+        self._count("stale_hits")
+        return json.loads(value)
+
+    def set(self, key: str, value, entity: str | None = None, ttl: float | None = None) -> None:
+        """値を保存する。ttlを省略した場合は、entityに応じた有効期限が使われる。"""
+        if ttl is None:
+            ttl = self.ttl_for(entity)
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.backend.set(key, payload, time.time() + ttl)
+        self._count("sets")
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        """ヒット数・ミス数・ヒット率と、バックエンドの統計情報をまとめて返す。"""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats.update(self.backend.stats())
+        return stats
+
+
+def create_backend(name: str, max_bytes: int, path: str | None = None) -> CacheBackend:
+    """
+    設定値の名前からバックエンドを作成する。
+
+    Args:
+        name (str): "memory" または "sqlite"。
+        max_bytes (int): 保存するデータ量の上限(バイト)。
+        path (str | None): SQLiteファイルのパス（"sqlite" の場合のみ使用）。
+
+    Returns:
+        CacheBackend: 作成したバックエンド。
+    """
+    if name == "memory":
+        return MemoryLRUBackend(max_bytes)
+    if name == "sqlite":
+        return SQLiteBackend(path or ".cache/responses.sqlite3", max_bytes)
+    raise ValueError(f"Unknown cache backend: {name}")
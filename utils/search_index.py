@@ -0,0 +1,111 @@
+# utils/search_index.py
+"""
+検索結果の中を、キーワードで素早く絞り込むための索引（転置インデックス）を提供するモジュール。
+
+サイドバーの「結果内を検索」は1文字入力するたびに再描画されるため、
+毎回全ての楽曲の曲名・アーティスト名・アルバム名を変換して部分一致を調べると、件数に比例して遅くなる。
+ここでは検索結果を保存する時に一度だけ
+- 全角・半角(NFKC)、大文字・小文字、カタカナ・ひらがなの違いを揃えた文字列を作り、
+- その文字列に含まれる1文字・2文字の並び(n-gram)から、それを含む楽曲の番号を引ける索引を作る。
+絞り込みは索引を引いて候補を得てから、候補だけを部分一致で確認するため、件数が増えても速い。
+"""
+
+import unicodedata
+
+# カタカナ（ァ〜ヶ）をひらがなに変換するための対応表。「ヨアソビ」と「よあそび」を同じ文字列として扱う。
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+# 1件分の文字列の中で、曲名・アーティスト名・アルバム名を区切る文字。
+# キーワードは正規化で改行を含まなくなるため、この文字をまたいで一致することはない。
+_FIELD_SEPARATOR = "\n"
+
+
+def normalize_for_search(text: str) -> str:
+    """
+    絞り込みの比較に使う文字列に変換する。
+
+    全角・半角の統一(NFKC。半角カナも全角になる)、大文字・小文字の統一、カタカナのひらがな化、
+    連続する空白の1つの半角スペースへの置き換えを行う。
+
+    Args:
+        text (str): 変換する文字列。
+
+    Returns:
+        str: 比較用に正規化された文字列。
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold().translate(_KATAKANA_TO_HIRAGANA)
+    return " ".join(text.split())
+
+
+def _ngrams(text: str) -> set:
+    """文字列に含まれる1文字と2文字の並び(n-gram)の集合を返す。"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class ResultIndex:
+    """
+    楽曲のレコード(Track)のリストに対する、曲名・アーティスト名・アルバム名の転置インデックス。
+    """
+
+    def __init__(self, items: list):
+        """
+        Args:
+            items (list): 索引を作る楽曲のレコード(Track)のリスト。
+        """
+        self.items = items
+        # 各楽曲の比較用の文字列（曲名・アーティスト名・アルバム名を区切り文字でつないだもの）
+        self._texts = [
+            _FIELD_SEPARATOR.join(
+                normalize_for_search(value) for value in (item.track_name, item.artist_name, item.collection_name)
+            )
+            for item in items
+        ]
+        # n-gram -> それを含む楽曲の番号の集合
+        self._postings = {}
+        for position, text in enumerate(self._texts):
+            for gram in _ngrams(text):
+                self._postings.setdefault(gram, set()).add(position)
+        # 直前の絞り込みのキーワードと結果。1文字ずつ入力を続けた場合は、前回の結果の中だけを調べればよい。
+        self._last_keyword = None
+        self._last_positions = None
+
+    def _lookup(self, keyword: str) -> set:
+        """正規化済みのキーワードを含む楽曲の番号の集合を、索引を引いて返す。"""
+        grams = [keyword] if len(keyword) == 1 else [keyword[i:i + 2] for i in range(len(keyword) - 1)]
+        candidates = None
+        # 含まれる楽曲の少ないn-gramから順に絞り込み、候補が尽きたらすぐに終える。
+        for gram in sorted(grams, key=lambda g: len(self._postings.get(g, ()))):
+            postings = self._postings.get(gram)
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return candidates
+        if len(keyword) <= 2:
+            return candidates
+        # 2文字ずつの並びが全て含まれていても、連続しているとは限らないため、候補だけを部分一致で確認する。
+        return {position for position in candidates if keyword in self._texts[position]}
+
+    def search(self, keyword: str) -> list:
+        """
+        キーワードを曲名・アーティスト名・アルバム名のいずれかに含む楽曲を、元の順番のまま返す。
+
+        Args:
+            keyword (str): 絞り込みのキーワード。
+
+        Returns:
+            list: 一致した楽曲のレコード(Track)のリスト。キーワードが空なら全ての楽曲。
+        """
+        keyword = normalize_for_search(keyword)
+        if not keyword:
+            return self.items
+
+        if self._last_keyword and keyword.startswith(self._last_keyword):
+            # 前回のキーワードに文字を書き足しただけなら、一致する楽曲は前回の結果に含まれているので、
+            # 索引を引き直さず、前回の結果だけを部分一致で確認する。
+            positions = {position for position in self._last_positions if keyword in self._texts[position]}
+        else:
+            positions = self._lookup(keyword)
+
+        self._last_keyword, self._last_positions = keyword, positions
+        return [self.items[position] for position in sorted(positions)]
@@ -0,0 +1,111 @@
+# utils/session_store.py
+"""
+セッション（利用者）ごとに保存する補助的なデータを、件数とメモリ量の上限付きで管理するモジュール。
+
+st.session_state にキーを追加していくだけだと、検索を繰り返すほどキーが増え続け、
+長時間使われるセッションのメモリ使用量が際限なく増えてしまう。
+ここでは1つのセッションにつき1つのLRU（最も長く使われていないものから捨てる）ストアを st.session_state に置き、
+関連MVの検索結果やカルーセルのページ番号などを「名前空間 + キー」で保存する。
+件数またはメモリ量の上限を超えると古いものから破棄されるため、セッションの使用量は一定以下に保たれる。
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from config import SESSION_STORE_MAX_ENTRIES, SESSION_STORE_MAX_BYTES
+
+# st.session_state の中でストアを保存するキー
+SESSION_STORE_KEY = "_session_store"
+
+# 全セッションを合計した統計情報（管理画面などから参照する）
+_global_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_global_lock = threading.Lock()
+
+
+def _estimate_bytes(key, value) -> int:
+    """
+    1件分のおおよそのメモリ使用量を返す。
+    値の中身（共有されているレコードなど）までは数えず、このセッションが保持している分だけを見積もる。
+    """
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _global_lock:
+        _global_stats[name] += amount
+
+
+class SessionStore:
+    """件数とメモリ量（見積もり）の上限を持つ、セッションごとのLRUストア。"""
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # (名前空間, キー) -> (値, 見積もりバイト数)。末尾ほど最近使われたもの
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __contains__(self, item) -> bool:
+        return item in self._data
+
+    def get(self, namespace: str, key, default=None):
+        """値を返す。見つからなければ default を返す。見つかった値は「最近使われた」ものとして扱う。"""
+        entry = self._data.get((namespace, key), self._MISSING)
+        if entry is self._MISSING:
+            self._stats["misses"] += 1
+            _count("misses")
+            return default
+        self._data.move_to_end((namespace, key))
+        self._stats["hits"] += 1
+        _count("hits")
+        return entry[0]
+
+    def set(self, namespace: str, key, value) -> None:
+        """値を保存し、上限を超えた分を古いものから破棄する。"""
+        item = (namespace, key)
+        old = self._data.pop(item, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = _estimate_bytes(item, value)
+        self._data[item] = (value, size)
+        self._bytes += size
+        evicted = 0
+        while len(self._data) > 1 and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, old_size) = self._data.popitem(last=False)
+            self._bytes -= old_size
+            evicted += 1
+        if evicted:
+            self._stats["evictions"] += evicted
+            _count("evictions", evicted)
+
+    def stats(self) -> dict:
+        """このセッションの保存件数・見積もりバイト数・ヒット数などを返す。"""
+        stats = dict(self._stats)
+        stats["entries"] = len(self._data)
+        stats["bytes"] = self._bytes
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+def get_session_store() -> SessionStore:
+    """
+    目的: 現在のセッションのストアを取得する。
+    役割: まだ作成されていなければ、config.py の SESSION_STORE_* の上限で作成して st.session_state に保存する。
+    """
+    store = st.session_state.get(SESSION_STORE_KEY)
+    if store is None:
+        store = SessionStore(SESSION_STORE_MAX_ENTRIES, SESSION_STORE_MAX_BYTES)
+        st.session_state[SESSION_STORE_KEY] = store
+    return store
+
+
+def get_global_session_stats() -> dict:
+    """全セッションを合計したヒット数・ミス数・破棄数を返す。"""
+    with _global_lock:
+        return dict(_global_stats)
@@ -0,0 +1,220 @@
+# utils/typeahead.py
+"""
+これまでにAPIから取得したアーティスト名・曲名から、入力中のキーワードの候補を返すためのモジュール。
+
+候補はAPIに問い合わせずに、プロセス内の前方一致の索引から返す。
+- 正規化した名前をソート済みの配列に保存し、キーワードで始まる範囲を二分探索で探すため、
+  名前1件あたりのメモリは名前の文字列とタプル1つ分で済む。
+- 名前の数が上限に達したら、最も長く取得されていない名前から削除する（LRU）。
+  そのため、新しく取得した結果のアーティスト名・曲名も常に候補に出る。
+- 索引の内容はレスポンスキャッシュと同じディレクトリのJSONファイルに保存し、再起動後も引き継ぐ。
+"""
+
+import bisect
+import heapq
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.search_index import normalize_for_search
+
+# 候補の種類
+KIND_ARTIST = "artist"
+KIND_TRACK = "track"
+
+
+class SuggestionIndex:
+    """
+    アーティスト名・曲名の前方一致の索引（ソート済みの配列）。
+    """
+
+    def __init__(self, max_names: int, top_k: int = 8, max_key_length: int = 40):
+        """
+        Args:
+            max_names (int): 索引に登録する名前の数の上限。上限に達したら、最も長く取得されていない名前から削除する。
+            top_k (int): 返す候補の数の上限の既定値。
+            max_key_length (int): 索引に使う名前の先頭からの文字数の上限。これより長い部分は前方一致に使わない。
+        """
+        self.max_names = max_names
+        self.top_k = top_k
+        self.max_key_length = max_key_length
+        # 表示用の名前 -> [種類, 登場回数, 正規化した名前]。最後に取得された順に並べる（先頭が最も古い）。
+        self._entries = OrderedDict()
+        self._keys = []  # (正規化した名前, 表示用の名前) のタプルのソート済みのリスト
+        self._lock = threading.Lock()
+        self._dirty = False  # 最後に保存してから変更があればTrue
+        self._saved_at = time.monotonic()
+        self._evicted = 0  # 上限を超えたために削除した名前の数
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, name: str, kind: str, weight: int, key: str) -> None:
+        """新しい名前を登録し、上限を超えた分を最も長く取得されていない名前から削除する。ロックを持って呼び出す。"""
+        self._entries[name] = [kind, weight, key]
+        bisect.insort(self._keys, (key, name))
+        while len(self._entries) > self.max_names:
+            old_name, (_, _, old_key) = self._entries.popitem(last=False)
+            position = bisect.bisect_left(self._keys, (old_key, old_name))
+            del self._keys[position]
+            self._evicted += 1
+
+    def add(self, name: str, kind: str, weight: int = 1) -> None:
+        """
+        名前を索引に登録する。既に登録されている名前なら登場回数を増やし、最後に取得された名前として扱う。
+
+        Args:
+            name (str): アーティスト名または曲名。
+            kind (str): KIND_ARTIST または KIND_TRACK。
+            weight (int): 増やす登場回数。
+        """
+        key = normalize_for_search(name)[:self.max_key_length]
+        if not key:
+            return
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self._insert(name, kind, weight, key)
+            else:
+                entry[1] += weight
+                self._entries.move_to_end(name)
+            self._dirty = True
+
+    def add_results(self, results: list) -> None:
+        """iTunes APIの結果（辞書）のリストから、アーティスト名と曲名を登録する。"""
+        for raw in results:
+            if raw.get("artistName"):
+                self.add(raw["artistName"], KIND_ARTIST)
+            if raw.get("trackName"):
+                self.add(raw["trackName"], KIND_TRACK)
+
+    def suggest(self, prefix: str, limit: int | None = None) -> list:
+        """
+        キーワードで始まる名前を、登場回数の多い順に返す。
+
+        Args:
+            prefix (str): 入力中のキーワード。全角・半角、大文字・小文字、カタカナ・ひらがなの違いは区別しない。
+            limit (int | None): 返す候補の数の上限。省略した場合は top_k 件。
+
+        Returns:
+            list: (名前, 種類) のタプルのリスト。
+        """
+        key = normalize_for_search(prefix)[:self.max_key_length]
+        if not key:
+            return []
+        with self._lock:
+            # キーワードで始まる名前は、ソート済みの配列の中で連続した範囲に並んでいる。
+            start = bisect.bisect_left(self._keys, (key,))
+            stop = start
+            while stop < len(self._keys) and self._keys[stop][0].startswith(key):
+                stop += 1
+            # 正規化すると同じになる名前（"YOASOBI" と "yoasobi" など）は、登場回数の多い表記を1つだけ返す。
+            # 並び順には、同じ名前にまとめた全ての表記の登場回数の合計を使う。
+            best = {}  # 正規化した名前 -> [表示する名前, その表記の登場回数, 合計の登場回数]
+            for name_key, name in self._keys[start:stop]:
+                weight = self._entries[name][1]
+                entry = best.get(name_key)
+                if entry is None:
+                    best[name_key] = [name, weight, weight]
+                    continue
+                if weight > entry[1]:
+                    entry[0], entry[1] = name, weight
+                entry[2] += weight
+            top = heapq.nlargest(limit or self.top_k, best.values(), key=lambda entry: entry[2])
+            return [(name, self._entries[name][0]) for name, _, _ in top]
+
+    def did_you_mean(self, term: str, limit: int | None = None, min_length: int = 2) -> list:
+        """
+        キーワードで始まる名前がなければ、末尾から1文字ずつ削ったキーワードで候補を探す。
+        打ち間違えたキーワード（例: "yoasbi"）でも、正しく入力できた部分（"yoas"）から候補を返せる。
+        """
+        key = normalize_for_search(term)
+        for length in range(len(key), min_length - 1, -1):
+            suggestions = self.suggest(key[:length], limit)
+            if suggestions:
+                return suggestions
+        return []
+
+    # --- 保存と読み込み ---
+    def claim_save(self, interval: float) -> bool:
+        """
+        前回の保存から interval 秒以上が経ち、変更があればTrueを返す。
+        Trueを返した時点で保存の時刻を更新するため、同時に呼び出しても保存を始めるのは1回だけになる。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._dirty or now - self._saved_at < interval:
+                return False
+            self._saved_at = now
+            return True
+
+    def save(self, path: str) -> None:
+        """
+        索引の内容をJSONファイルに保存する。
+        複数のワーカープロセスが同じファイルに保存するため、既存のファイルの内容と合わせてから書き込む。
+        ファイルには古い順に並べ、上限を超える分は古い名前から書き込まない。
+        """
+        with self._lock:
+            current = [(name, [kind, weight]) for name, (kind, weight, _) in self._entries.items()]
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        # このプロセスの索引にない名前は、このプロセスで取得した名前より古いものとして先頭に置く。
+        entries = _read_entries(path)
+        for name, entry in current:
+            stored = entries.pop(name, None)
+            if stored is not None:
+                entry[1] = max(entry[1], stored[1])
+        entries.update(current)
+        names = list(entries)[-self.max_names:] if self.max_names > 0 else []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 書き込み途中のファイルを他のプロセスが読まないよう、一時ファイルに書いてから置き換える。
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({name: entries[name] for name in names}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    def load(self, path: str) -> int:
+        """
+        JSONファイルから索引の内容を読み込み、読み込んだ名前の数を返す。ファイルがなければ何もしない。
+        読み込みの前に登録された名前の方が新しいものとして扱い、まとめて並べ直すため、1件ずつ登録するより速い。
+        """
+        entries = _read_entries(path)
+        loaded = OrderedDict()
+        for name, (kind, weight) in entries.items():
+            key = normalize_for_search(name)[:self.max_key_length]
+            if key:
+                loaded[name] = [kind, weight, key]
+        with self._lock:
+            for name, entry in self._entries.items():
+                stored = loaded.pop(name, None)
+                if stored is not None:
+                    entry[1] = max(entry[1], stored[1])
+            loaded.update(self._entries)
+            while len(loaded) > self.max_names:
+                loaded.popitem(last=False)
+            self._entries = loaded
+            self._keys = sorted((key, name) for name, (_, _, key) in loaded.items())
+        return len(entries)
+
+    def stats(self) -> dict:
+        """登録されている名前の数、削除した名前の数と、未保存の変更があるかを返す。"""
+        with self._lock:
+            return {
+                "names": len(self._entries),
+                "max_names": self.max_names,
+                "evicted": self._evicted,
+                "dirty": self._dirty,
+            }
+
+
+def _read_entries(path: str) -> dict:
+    """保存されたJSONファイルを読み込む。ファイルがない、または壊れている場合は空の辞書を返す。"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
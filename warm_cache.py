@@ -0,0 +1,114 @@
+# warm_cache.py
+"""
+デプロイ直後の最初の利用者が、空のキャッシュのせいで待たされないようにするためのコマンド。
+
+ホーム画面のジャンルのアートワーク、カルーセルで使う全てのキーワード、
+そして任意で指定した「よく検索されるキーワード」のファイルを読み込み、
+APIクライアントのレスポンスキャッシュへ事前に取得しておく。
+送信はAPIクライアントのレートリミッターを通るため、iTunes APIの制限を超えることはない。
+
+実行方法（プロジェクトのルートディレクトリで）:
+    python warm_cache.py
+    python warm_cache.py --queries popular_queries.txt
+
+キーワードのファイルは1行に1キーワードを書く。空行と「#」で始まる行は無視される。
+"""
+
+import argparse
+import time
+
+from config import GENRES, CAROUSEL_FIXED_TERMS, CACHE_BACKEND
+from components.home import carousel_specs
+from utils import api_client
+from utils.api_client import PRIORITY_BACKGROUND, STATUS_OK, STATUS_EMPTY, STATUS_ERROR
+
+
+def read_queries(path: str) -> list:
+    """キーワードのファイルを読み込み、重複を除いたリストを返す。"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            query = line.strip()
+            if query and not query.startswith("#") and query not in queries:
+                queries.append(query)
+    return queries
+
+
+def build_specs(queries: list) -> list:
+    """
+    ジャンル、カルーセル、よく検索されるキーワードについて、アプリが実際に送るのと同じ検索条件を作成する。
+    検索条件が画面側と一致していないとキャッシュのキーも一致しないため、画面側と同じ関数を使って作る。
+    """
+    specs = list(api_client.genre_specs(GENRES))
+    # カルーセルはジャンルをランダムに選ぶため、全てのジャンルのキーワードを対象にする。
+    specs += carousel_specs([genre["term"] for genre in GENRES] + list(CAROUSEL_FIXED_TERMS))
+    for query in queries:
+        specs += api_client.search_page_specs(query)
+    # 同じ検索条件が重複している場合は1つにまとめる。
+    return list(dict.fromkeys(specs))
+
+
+def warm_cache(queries: list) -> dict:
+    """
+    目的: 検索条件を並列に取得してレスポンスキャッシュに保存し、その結果を集計して返す。
+    役割: 既にキャッシュにあるものは通信せずにヒットとして数えるため、2回目以降の実行はすぐに終わる。
+    """
+    specs = build_specs(queries)
+    # 統計情報は累計値なので、実行前の値との差分をこの実行の結果とする。
+    cache_before = api_client.get_cache_stats()
+    issued_before = api_client.get_coalescing_stats()["issued"]
+    start = time.perf_counter()
+    results = api_client.search_music_batch(specs, priority=PRIORITY_BACKGROUND)
+    elapsed = time.perf_counter() - start
+
+    statuses = {STATUS_OK: 0, STATUS_EMPTY: 0, STATUS_ERROR: 0}
+    for result in results:
+        statuses[result.status] += 1
+    cache_after = api_client.get_cache_stats()
+    hits = cache_after["hits"] - cache_before["hits"]
+    misses = cache_after["misses"] - cache_before["misses"]
+    return {
+        "specs": len(specs),
+        "elapsed_seconds": elapsed,
+        "statuses": statuses,
+        "cache_hits": hits,
+        "cache_misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        "requests_issued": api_client.get_coalescing_stats()["issued"] - issued_before,
+        "rate_limiter": api_client.get_rate_limiter_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="よく検索されるキーワードを1行に1つずつ書いたファイル")
+    args = parser.parse_args()
+
+    if CACHE_BACKEND == "memory":
+        print("Warning: CACHE_BACKEND is 'memory'. The warmed cache will not be shared with the app process.")
+
+    queries = read_queries(args.queries) if args.queries else []
+    try:
+        report = warm_cache(queries)
+    finally:
+        api_client.shutdown()
+
+    statuses = report["statuses"]
+    limiter = report["rate_limiter"]
+    print(f"検索条件: {report['specs']}件 ({len(queries)}件のキーワードを含む)")
+    print(f"所要時間: {report['elapsed_seconds']:.2f}秒")
+    print(f"結果: 成功 {statuses[STATUS_OK]} / 該当なし {statuses[STATUS_EMPTY]} / エラー {statuses[STATUS_ERROR]}")
+    print(
+        f"キャッシュ: ヒット {report['cache_hits']} / ミス {report['cache_misses']} "
+        f"(ヒット率 {report['hit_ratio']:.1%}), API送信 {report['requests_issued']}回"
+    )
+    if limiter.get("enabled", True):
+        print(
+            f"レート制限: 待ち {limiter['waited']}回 "
+            f"(平均 {limiter['wait_seconds_avg']:.2f}秒, 最大 {limiter['wait_seconds_max']:.2f}秒), "
+            f"制限を受けた回数 {limiter['throttled']}"
+        )
+
+
+if __name__ == "__main__":
+    main()